@@ -5,6 +5,8 @@ from .emc_sio import (
     scaleio_from_configuration, DEFAULT_STORAGE_POOL,
     DEFAULT_PROTECTION_DOMAIN, DEFAULT_PORT, DEBUG
 )
+from .transport import DEFAULT_POOL_SIZE
+from .startup_cache import STARTUP_CACHE_PATH
 
 def api_factory(cluster_id, **kwargs):
 
@@ -28,10 +30,34 @@ def api_factory(cluster_id, **kwargs):
     if "certificate" in kwargs:
        certificate= kwargs[u"certificate"]
 
+    profiles = None
+    if "profiles" in kwargs:
+       profiles = kwargs[u"profiles"]
+
+    connection_pool_size = DEFAULT_POOL_SIZE
+    if "connection_pool_size" in kwargs:
+       connection_pool_size = kwargs[u"connection_pool_size"]
+
+    warm_pool = None
+    if "warm_pool" in kwargs:
+       warm_pool = kwargs[u"warm_pool"]
+
+    shared_read = False
+    if "shared_read" in kwargs:
+       shared_read = kwargs[u"shared_read"]
+
+    startup_cache = STARTUP_CACHE_PATH
+    if "startup_cache" in kwargs:
+       startup_cache = kwargs[u"startup_cache"]
+
     return scaleio_from_configuration(cluster_id=cluster_id, username=kwargs[u"username"],
                         password=kwargs[u"password"], mdm_ip=kwargs[u"mdm"], port=port,
                         protection_domain=protection_domain, storage_pool=storage_pool,
-                        certificate=certificate, ssl=kwargs[u"ssl"], debug=debug)
+                        certificate=certificate, ssl=kwargs[u"ssl"], debug=debug,
+                        profiles=profiles,
+                        connection_pool_size=connection_pool_size,
+                        warm_pool=warm_pool, shared_read=shared_read,
+                        startup_cache=startup_cache)
 
 FLOCKER_BACKEND = BackendDescription(
     name=u"scaleio_flocker_driver",
@@ -0,0 +1,152 @@
+# Copyright 2015 EMC Corporation
+
+"""
+Benchmark of the driver against the gateway simulator.
+
+For each inventory size, the driver creates, attaches, lists, detaches
+and destroys volumes, and the gateway requests and latency of each
+operation are reported::
+
+    python -m scaleio_flocker_driver.benchmark --volumes 10,1000,10000
+"""
+
+import argparse
+import sys
+import time
+from uuid import uuid4
+
+from bitmath import GiB
+
+from .emc_sio import (
+    EMCScaleIOBlockDeviceAPI, scaleio_client, DEBUG
+)
+from .simulator import GatewayInventory, GatewaySimulator
+from .transport import percentile
+
+DEFAULT_INVENTORY_SIZES = (10, 1000, 10000)
+DEFAULT_ITERATIONS = 20
+
+# The share of the volumes in the system belonging to the benchmarked
+# cluster.
+CLUSTER_SHARE = 0.05
+
+OPERATIONS = ('create_volume', 'attach_volume', 'list_volumes',
+              'detach_volume', 'destroy_volume')
+
+
+class _BenchmarkBlockDeviceAPI(EMCScaleIOBlockDeviceAPI):
+    """
+    The driver, with the instance id of a simulated SDC instead of the
+    one of the local SDC.
+    """
+    def __init__(self, instance_id, *args, **kwargs):
+        self._simulated_instance_id = instance_id
+        EMCScaleIOBlockDeviceAPI.__init__(self, *args, **kwargs)
+
+    def compute_instance_id(self):
+        return self._simulated_instance_id
+
+
+def _measure(simulator, results, operation, function, *args):
+    requests = simulator.request_count()
+    start = time.time()
+    result = function(*args)
+    results[operation]['latencies'].append(time.time() - start)
+    results[operation]['requests'].append(
+        simulator.request_count() - requests)
+    return result
+
+
+def run(inventory_size, iterations=DEFAULT_ITERATIONS, latency=0.0):
+    """
+    Benchmark the driver against a simulated system holding
+    ``inventory_size`` volumes.
+
+    :param int inventory_size: The number of volumes in the system
+    :param int iterations: The number of volumes to go through the
+        create, attach, list, detach and destroy cycle.
+    :param float latency: Seconds the simulator waits before each
+        answer.
+    :return dict: For each operation, the ``requests`` and
+        ``latencies`` of each call.
+    """
+    cluster_id = uuid4()
+    inventory = GatewayInventory()
+    pool_id = inventory.storage_pool_id("default")
+    sdc = inventory.add_sdc()
+    for _ in xrange(99):
+        inventory.add_sdc()
+    owned = int(inventory_size * CLUSTER_SHARE)
+    inventory.populate(inventory_size - owned, pool_id)
+    for _ in xrange(owned):
+        inventory.add_volume(
+            'f%s%s' % (EMCScaleIOBlockDeviceAPI.id_to_short(uuid4()),
+                       str(cluster_id)[:8]),
+            8 * 1024 * 1024, pool_id)
+
+    simulator = GatewaySimulator(inventory, latency=latency)
+    simulator.start()
+    try:
+        client, pdomain, spool = scaleio_client(
+            simulator.username, simulator.password, simulator.address,
+            ssl=False, debug_level=DEBUG)
+        api = _BenchmarkBlockDeviceAPI(
+            sdc['sdcGuid'].lower(), client, cluster_id, pdomain, spool)
+
+        results = dict((operation, {'requests': [], 'latencies': []})
+                       for operation in OPERATIONS)
+        size = int(GiB(8).to_Byte().value)
+        for _ in xrange(iterations):
+            volume = _measure(simulator, results, 'create_volume',
+                              api.create_volume, uuid4(), size)
+            _measure(simulator, results, 'attach_volume',
+                     api.attach_volume, volume.blockdevice_id,
+                     api.compute_instance_id())
+            _measure(simulator, results, 'list_volumes', api.list_volumes)
+            _measure(simulator, results, 'detach_volume',
+                     api.detach_volume, volume.blockdevice_id)
+            _measure(simulator, results, 'destroy_volume',
+                     api.destroy_volume, volume.blockdevice_id)
+        return results
+    finally:
+        simulator.stop()
+
+
+def report(inventory_size, results, out=sys.stdout):
+    """
+    Write the requests per call and the p50 and p99 latencies of each
+    operation.
+    """
+    out.write("%d volumes\n" % (inventory_size,))
+    out.write("  %-16s %10s %10s %10s\n"
+              % ("operation", "requests", "p50 ms", "p99 ms"))
+    for operation in OPERATIONS:
+        latencies = sorted(results[operation]['latencies'])
+        requests = results[operation]['requests']
+        out.write("  %-16s %10.1f %10.1f %10.1f\n" % (
+            operation, float(sum(requests)) / len(requests),
+            percentile(latencies, 50) * 1000,
+            percentile(latencies, 99) * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ScaleIO driver against a simulated "
+                    "gateway.")
+    parser.add_argument(
+        '--volumes', default=",".join(map(str, DEFAULT_INVENTORY_SIZES)),
+        help="Comma separated numbers of volumes in the system.")
+    parser.add_argument(
+        '--iterations', type=int, default=DEFAULT_ITERATIONS,
+        help="Volumes created and destroyed per inventory size.")
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help="Milliseconds the simulator waits before each answer.")
+    options = parser.parse_args(argv)
+    for inventory_size in [int(n) for n in options.volumes.split(",")]:
+        report(inventory_size, run(inventory_size, options.iterations,
+                                   options.latency / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
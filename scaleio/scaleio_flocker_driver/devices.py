@@ -0,0 +1,176 @@
+# -*- test-case-name: scaleio_flocker_driver.test_devices -*-
+# Copyright 2015 EMC Corporation
+
+"""
+Waiting for device links, such as the ones udev creates under
+``/dev/disk/by-id``, to show up.
+
+inotify is used through libc when available, so a waiter wakes up as
+soon as the link is created instead of listing the directory over and
+over. Polling is used otherwise.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+# From <sys/inotify.h>
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event header: wd, mask, cookie, len
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Seconds between directory listings when inotify is unavailable.
+POLL_INTERVAL = 0.1
+
+
+def _load_libc():
+    """
+    :return: libc if it provides inotify, otherwise ``None``.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+    except OSError:
+        return None
+    if not (hasattr(libc, 'inotify_init1') and
+            hasattr(libc, 'inotify_add_watch')):
+        return None
+    return libc
+
+_libc = _load_libc()
+
+
+class _DirectoryWatch(object):
+    """
+    An inotify watch for entries created in, or moved into, a
+    directory.
+    """
+    def __init__(self, fd):
+        self._fd = fd
+
+    @classmethod
+    def open(cls, directory):
+        """
+        :param str directory: The directory to watch
+        :return: A ``_DirectoryWatch``, or ``None`` if inotify is not
+            available or the directory cannot be watched.
+        """
+        if _libc is None:
+            return None
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if not isinstance(directory, bytes):
+            directory = directory.encode('utf-8')
+        if _libc.inotify_add_watch(
+                fd, directory, IN_CREATE | IN_MOVED_TO) < 0:
+            os.close(fd)
+            return None
+        return cls(fd)
+
+    def read(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for new entries.
+
+        :return list: The names of the new entries. ``None`` in the
+            list means events were lost and the directory has to be
+            listed again.
+        """
+        try:
+            readable = select.select([self._fd], [], [], timeout)[0]
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        names = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                names.append(None)
+            else:
+                names.append(name.decode('utf-8', 'replace'))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+def find_device_link(directory, matches):
+    """
+    :param str directory: The directory to look in
+    :param matches: A callable taking an entry name and returning
+        whether it is the one looked for.
+    :return: The path of the first matching entry, or ``None``.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    for name in names:
+        if matches(name):
+            return os.path.join(directory, name)
+    return None
+
+
+def wait_for_device_link(directory, matches, time_limit,
+                         poll_interval=POLL_INTERVAL):
+    """
+    Wait for an entry accepted by ``matches`` to exist in
+    ``directory``.
+
+    :param str directory: The directory to watch
+    :param matches: A callable taking an entry name and returning
+        whether it is the one looked for.
+    :param float time_limit: The maximum time, in seconds, to wait.
+    :param float poll_interval: Seconds between directory listings
+        when inotify is unavailable.
+    :return: The path of the entry, or ``None`` if it did not show up
+        within ``time_limit``.
+    """
+    start_time = time.time()
+    # Watch before the first listing so a link created in between is
+    # not missed.
+    watch = _DirectoryWatch.open(directory)
+    try:
+        path = find_device_link(directory, matches)
+        while path is None:
+            remaining = time_limit - (time.time() - start_time)
+            if remaining <= 0:
+                return None
+            if watch is None:
+                time.sleep(min(poll_interval, remaining))
+                path = find_device_link(directory, matches)
+                continue
+            for name in watch.read(remaining):
+                if name is None:
+                    path = find_device_link(directory, matches)
+                elif matches(name):
+                    path = os.path.join(directory, name)
+                if path is not None:
+                    break
+        return path
+    finally:
+        if watch is not None:
+            watch.close()
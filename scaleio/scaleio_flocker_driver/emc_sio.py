@@ -18,25 +18,32 @@ limitations under the License.
 import time
 from uuid import UUID
 import logging
-import requests
 import json
 
-from subprocess import check_output
-
 from bitmath import Byte, GiB, MiB, KiB
 
 from scaleiopy import ScaleIO
+from scaleiopy.scaleio import ScaleIO_Volume, ScaleIO_SDC
 
 from eliot import Message, Logger
-from zope.interface import implementer, Interface
+from zope.interface import implementer, Interface, Attribute
 from twisted.python.filepath import FilePath
-from characteristic import attributes
 
 from flocker.node.agents.blockdevice import (
-    AlreadyAttachedVolume, IBlockDeviceAPI,
+    AlreadyAttachedVolume, IBlockDeviceAPI, IProfiledBlockDeviceAPI,
     BlockDeviceVolume, UnknownVolume, UnattachedVolume
 )
 
+from .gateway import (
+    ScaleIOGatewaySession, ScaleIOGatewayError, VOLUME_NOT_FOUND_ERRORS
+)
+from .devices import find_device_link, wait_for_device_link
+from .pool_scheduler import StoragePool, CapacityPoolScheduler
+from .transport import ScaleIOHTTPSession, DEFAULT_POOL_SIZE
+from .warm_pool import WarmVolumePool, warm_volume_prefix
+from .sdc import query_guid, local_volume_mappings
+from .startup_cache import StartupCache, verify_in_background
+
 # Eliot is transitioning away from the "Logger instances all over the place"
 # approach.  And it's hard to put Logger instances on PRecord subclasses which
 # we have a lot of.  So just use this global logger for now.
@@ -81,6 +88,22 @@ ScaleIO_1_31 = '1.1'
 # ScaleIO_1_32 = '1.2'
 SUPPORTED_API_VERSIONS = [ScaleIO_1_31]
 
+# ScaleIO volume and SDC ids are 16 hex digits.
+SCALEIO_ID_LENGTH = 16
+
+# ``errorCode`` of mapping a volume to an SDC it is already mapped to.
+VOLUME_ALREADY_MAPPED_ERROR = 81
+
+# Seconds between listings of every volume in the ScaleIO system, which
+# find the storage pools holding volumes of the cluster. Other listings
+# only fetch the volumes of these pools.
+POOL_DISCOVERY_INTERVAL = 600
+
+# The profile attributes limiting each mapping of a volume: IOPS, and
+# bandwidth in MB/s. 0 means unlimited.
+IOPS_LIMIT = "iops_limit"
+BANDWIDTH_LIMIT = "bandwidth_limit"
+
 
 class IScaleIOVolumeManager(Interface):
     """
@@ -202,6 +225,14 @@ class IScaleIOVolumeManager(Interface):
         :param: unicode guid: is the kernel module on the host id
         """
 
+    _session = Attribute(
+        "The ``requests.Session`` used to talk to the MDM Gateway, "
+        "carrying the authentication token.")
+
+    _api_url = Attribute("The base URL of the MDM Gateway REST API.")
+
+    _verify_ssl = Attribute("Whether to verify the gateway certificate.")
+
     def _login(self):
         """
         Logs in the ScaleIO instance the the MDM Gateway
@@ -214,21 +245,33 @@ class IScaleIOVolumeManager(Interface):
         """
 
 
-def emc_scaleio_api(scaleio_client, cluster_id, pdomain, spool):
+def emc_scaleio_api(scaleio_client, cluster_id, pdomain, spool,
+                    profiles=None, warm_pool=None, shared_read=False,
+                    startup_cache=None):
     """
     :param scaleiopy.sclaeio.ScaleIO scaleio_client: The ScaleIO API client
     :param UUID cluster_id: A Flocker cluster ID.
+    :param dict profiles: Optional storage pools per storage profile.
+    :param dict warm_pool: Optional number of pre-created volumes
+        per size in GiB.
+    :param bool shared_read: Whether volumes may be attached to
+        several nodes at once.
+    :param StartupCache startup_cache: Optional results of the checks
+        made on the last start.
     :returns: A ``EMCScaleIOBlockDeviceAPI``.
     """
     return EMCScaleIOBlockDeviceAPI(
         scaleio_client,
         cluster_id,
         pdomain,
-        spool
+        spool,
+        profiles=profiles,
+        warm_pool=warm_pool,
+        shared_read=shared_read,
+        startup_cache=startup_cache
     )
 
 
-@attributes(["protection_domain"])
 class UnknownProtectionDomain(Exception):
     """
     The protection domain could not be found.
@@ -245,7 +288,6 @@ class UnknownProtectionDomain(Exception):
         self.protection_domain = protection_domain
 
 
-@attributes(["storage_pool"])
 class UnknownStoragePool(Exception):
     """
     The storage pool could not be found.
@@ -262,6 +304,23 @@ class UnknownStoragePool(Exception):
         self.storage_pool = storage_pool
 
 
+class ConflictingMappingLimits(Exception):
+    """
+    Profiles sharing a storage pool set different IOPS or bandwidth
+    limits.
+    :param str storage_pool: The storage pool
+    """
+    def __init__(self, storage_pool):
+        if not isinstance(storage_pool, str):
+            raise TypeError(
+                'Unexpected storage_pool type. '
+                'Expected str. '
+                'Got {!r}.'.format(storage_pool)
+            )
+        Exception.__init__(self, storage_pool)
+        self.storage_pool = storage_pool
+
+
 class UnsupportedVolumeSize(Exception):
     """
     The volume size is not supported
@@ -311,7 +370,7 @@ def check_supported_volume_size(
         raise UnsupportedVolumeSize(dataset_id=dataset_id)
 
 
-def _check_api_version(api, usr, passw, verify_ssl=False):
+def _check_api_version(api, usr, passw, session, verify_ssl=False):
     """
     Version check against supported API versions
     :param string api: the full api string
@@ -321,6 +380,7 @@ def _check_api_version(api, usr, passw, verify_ssl=False):
     :param string passw: The username for ScaleIO Driver, this will be
             used to login and enable requests to be made to the underlying
             ScaleIO BlockDeviceAPI
+    :param requests.Session session: The session to send the request with
     :param bool verfy_ssl: True | False to verify SSL
 
     """
@@ -329,8 +389,8 @@ def _check_api_version(api, usr, passw, verify_ssl=False):
     # user and password only. API version calls don't
     # need token auth requests.
     request = (api + "/version")
-    r = requests.get(request, auth=(usr, passw),
-                     verify=verify_ssl)
+    r = session.get(request, auth=(usr, passw),
+                    verify=verify_ssl)
     version_response = json.dumps(r.json())
     # Check Version from JSON object
     api_version = version_response.strip('"')
@@ -339,15 +399,31 @@ def _check_api_version(api, usr, passw, verify_ssl=False):
     return api_version
 
 
-# TODO Right now the driver can only handle one protection domain
-# and one storage pool. In order to take advantage of more, flocker
-# would need to supply metadata about how a container wants a volume.
-# E.g. Gold or "SSD" for storage pool and protection=high
-# for protection domains.
+def _verify_api_version(cache, api, usr, passw, session, verify_ssl=False):
+    """
+    Check the API version again and update the startup cache, which
+    forgets the gateway if the version is no longer supported.
+
+    :param StartupCache cache: The startup cache
+    See ``_check_api_version`` for the other parameters.
+    """
+    try:
+        version = _check_api_version(api, usr, passw, session,
+                                     verify_ssl=verify_ssl)
+    except UnsupportedAPIVersion:
+        cache.forget(api)
+        raise
+    cache.set_api_version(api, version)
+
+
+# The protection domain and storage pool checked here are the
+# defaults. Storage profiles (e.g. gold, silver, bronze) can map
+# to further storage pools, see ``EMCScaleIOBlockDeviceAPI``.
 def scaleio_client(usr, passw, mdm, port=DEFAULT_PORT,
                    pdomain=DEFAULT_PROTECTION_DOMAIN,
                    spool=DEFAULT_STORAGE_POOL,
-                   crt=None, ssl=False, debug_level=DEBUG):
+                   crt=None, ssl=False, debug_level=DEBUG,
+                   pool_size=DEFAULT_POOL_SIZE, cache=None):
     """
     Client for calling operations on ScaleIO API.
 
@@ -368,6 +444,12 @@ def scaleio_client(usr, passw, mdm, port=DEFAULT_PORT,
             certificate will change verify to True inside the requests.
         :param boolean ssl: use SSL?
         :param boolean debug: verbosity
+        :param integer pool_size: The number of connections to the
+            MDM Gateway kept open.
+        :param StartupCache cache: Optional results of the checks made
+            on the last start. The API version, protection domain and
+            storage pool found there are checked again in the
+            background instead of before returning.
     """
 
     proto = HTTP
@@ -388,9 +470,22 @@ def scaleio_client(usr, passw, mdm, port=DEFAULT_PORT,
     Message.new(Info="Debug Level: "
                 + debug_level).write(_logger)
 
+    # All gateway traffic shares one pool of kept-alive connections.
+    session = ScaleIOHTTPSession(pool_size=pool_size)
+
     # Check if version supported
     api = "%s://%s/api" % (proto, mdm)
-    version = _check_api_version(api, usr, passw, verify_ssl=verify)
+    version = None
+    if cache is not None:
+        version = cache.api_version(api)
+    if version in SUPPORTED_API_VERSIONS:
+        verify_in_background("API Version", _verify_api_version, cache,
+                             api, usr, passw, session, verify_ssl=verify)
+    else:
+        version = _check_api_version(api, usr, passw, session,
+                                     verify_ssl=verify)
+        if cache is not None:
+            cache.set_api_version(api, version)
     Message.new(Info="Using API Version %s" % version).write(_logger)
 
     # Version checks out, get scaleio object.
@@ -398,11 +493,23 @@ def scaleio_client(usr, passw, mdm, port=DEFAULT_PORT,
                   verify_ssl=verify,
                   debugLevel=debug_level)
 
+    # scaleiopy logs in with a session of its own, replace it before
+    # verifying the login so the token lands on the shared one.
+    sio._session.close()
+    sio._session = session
+
     # Verify login
     sio._login()
     Message.new(Info="Logged In to ScaleIO: %s://%s/api"
                 % (proto, mdm)).write(_logger)
 
+    # The driver checks cached storage pools again in the background.
+    if (cache is not None and
+            cache.storage_pool(api, pdomain, spool) is not None):
+        Message.new(Info="Using Cached Storage Pool " + str(pdomain)
+                    + "/" + str(spool)).write(_logger)
+        return sio, pdomain, spool
+
     # Check for protection domain configured.
     pdomain_found = False
     for domain in sio.protection_domains:
@@ -433,6 +540,20 @@ def scaleio_client(usr, passw, mdm, port=DEFAULT_PORT,
     return sio, pdomain, spool
 
 
+def _is_scaleio_id(blockdevice_id):
+    """
+    :param unicode blockdevice_id: The id to check
+    :return boolean: True if this could be a ScaleIO object id
+    """
+    if len(blockdevice_id) != SCALEIO_ID_LENGTH:
+        return False
+    try:
+        int(blockdevice_id, 16)
+    except ValueError:
+        return False
+    return True
+
+
 def bytes_to_mbytes(size):
         """
         :param bytes size: byte size of the volume
@@ -449,9 +570,8 @@ def _blockdevicevolume_from_scaleio_volume(
     :returns: ``BlockDeviceVolume```
     """
 
-    # TODO only put one mapping per volume, however
-    # ScaleIO can multi-map, should attached_to
-    # consider being a list?
+    # Flocker only knows of one attachment per volume, the other
+    # mappings of shared read volumes are given by ``list_attachments``.
 
     # Return a ``BlockDeviceVolume``
     return BlockDeviceVolume(
@@ -464,23 +584,32 @@ def _blockdevicevolume_from_scaleio_volume(
     )
 
 
-# This fixes https://github.com/ClusterHQ/flocker-emc/issues/14
-# but this is hacky and redundant because it logs into the
-# SIO object and the gateway before every Flocker API call
-# which fixed requests getting SSL errors becuase of
-# communication errors with the gateway.
+# This used to log into the gateway before every Flocker API call
+# to work around https://github.com/ClusterHQ/flocker-emc/issues/14,
+# requests getting SSL errors because of communication errors with
+# the gateway. The gateway session now reuses its token and only
+# logs in again when it expires, is rejected or the connection fails.
 def check_login(api_func):
     """
     Decorator to check local SIO object login
     status.
     """
     def wrap(self, *args, **kwargs):
-        self._client._login()
-        return api_func(self, *args, **kwargs)
+        return self._gateway.call(api_func, self, *args, **kwargs)
     return wrap
 
 
-@implementer(IBlockDeviceAPI)
+def check_login_once(api_func):
+    """
+    Like ``check_login``, for calls that change volumes or mappings
+    and must not be sent to the gateway twice.
+    """
+    def wrap(self, *args, **kwargs):
+        return self._gateway.call_once(api_func, self, *args, **kwargs)
+    return wrap
+
+
+@implementer(IBlockDeviceAPI, IProfiledBlockDeviceAPI)
 class EMCScaleIOBlockDeviceAPI(object):
     """
     A ``IBlockDeviceAPI`` which uses EMC ScaleIO block devices
@@ -488,19 +617,243 @@ class EMCScaleIOBlockDeviceAPI(object):
     """
 
     def __init__(self, sio_client, cluster_id,
-                 pdomain, spool):
+                 pdomain, spool, profiles=None, warm_pool=None,
+                 shared_read=False, startup_cache=None):
         """
         :param ScaleIO sio_client: An instance of ScaleIO requests
             client.
         :param UUID cluster_id: An ID that will be included in the
             names of ScaleIO volumes to identify cluster
+        :param string pdomain: The default protection domain
+        :param string spool: The default storage pool
+        :param dict profiles: Maps storage profile names (e.g. gold,
+            silver, bronze) to a dict whose ``storage_pools`` lists
+            the pools volumes of that profile may be placed in, each
+            given as a dict of ``storage_pool`` and optionally
+            ``protection_domain`` (defaults to ``pdomain``). The
+            optional ``iops_limit`` and ``bandwidth_limit`` (MB/s) are
+            set on every mapping of the volumes in these pools.
+        :param dict warm_pool: Maps volume sizes in GiB, multiples of
+            ``ALLOCATION_GRANULARITY``, to the number of volumes of
+            that size kept pre-created in the default storage pool.
+            Volumes of these sizes in the default storage pool are
+            then created by renaming a pre-created one.
+        :param bool shared_read: Map volumes to every node they are
+            attached to rather than to a single node, so that several
+            nodes can read the same dataset. Each node sees volumes
+            mapped to it as attached to itself and only removes its
+            own mapping on detach.
+        :param StartupCache startup_cache: Keeps the SDC GUID and the
+            ids of the storage pools across restarts. Cached values are
+            used right away and checked again in a background thread.
         :returns: A ``BlockDeviceVolume``.
         """
         self._client = sio_client
+        self._gateway = ScaleIOGatewaySession(sio_client)
+        self._scheduler = CapacityPoolScheduler(self._gateway)
         self._cluster_id = cluster_id
         self._pdomain = pdomain
         self._spool = spool
+        self._shared_read = shared_read
+        self._startup_cache = startup_cache
+        # The ids of the storage pools known to hold volumes of the
+        # cluster, besides the configured ones
+        self._volume_pool_ids = set()
+        self._next_pool_discovery = None
+        self._clock = time.time
+        guid_cached = (startup_cache is not None and
+                       startup_cache.sdc_guid() is not None)
         self._instance_id = self.compute_instance_id()
+        pools = self._cached_storage_pools(profiles or {})
+        pools_cached = pools is not None
+        if not pools_cached:
+            pools = self._gateway.call(
+                self._load_storage_pools, profiles or {})
+            self._cache_storage_pools(*pools)
+        self._default_pool, self._profiles = pools
+        self._limits = self._mapping_limits(profiles or {})
+        self._warm_pool = None
+        if warm_pool:
+            # Pool volumes are named after this node so nodes never
+            # claim each other's.
+            self._warm_pool = WarmVolumePool(
+                self._gateway, self._default_pool,
+                warm_volume_prefix(cluster_id, self._instance_id),
+                warm_pool)
+            self._gateway.call(self._warm_pool.load)
+            self._warm_pool.start()
+        # The checks update the state set up above, so they start last.
+        if guid_cached:
+            verify_in_background("SDC GUID", self._verify_sdc_guid)
+        if pools_cached:
+            verify_in_background("Storage Pools",
+                                 self._verify_storage_pools, profiles or {})
+
+    def _load_storage_pools(self, profiles):
+        """
+        Resolve the default storage pool and the pools of each
+        storage profile to their ScaleIO ids.
+
+        :param dict profiles: See ``__init__``.
+        :raises UnknownProtectionDomain: If a pool names a protection
+            domain that does not exist.
+        :raises UnknownStoragePool: If a storage pool does not exist
+            in its protection domain.
+        :return tuple: The default ``StoragePool`` and a ``dict``
+            mapping lower case profile names to ``StoragePool`` lists.
+        """
+        domains = dict(
+            (domain['name'], domain['id']) for domain in
+            self._gateway.request('GET', 'types/ProtectionDomain/instances'))
+        domain_pools = {}
+
+        def resolve(pdomain, spool):
+            pdomain, spool = str(pdomain), str(spool)
+            if pdomain not in domains:
+                Message.new(Error="Protection Domain Not Found "
+                            + pdomain).write(_logger)
+                raise UnknownProtectionDomain(pdomain)
+            if pdomain not in domain_pools:
+                # Storage pool names are only unique within their
+                # protection domain.
+                domain_pools[pdomain] = dict(
+                    (pool['name'], pool['id']) for pool in
+                    self._gateway.request(
+                        'GET', 'instances/ProtectionDomain::%s'
+                        '/relationships/StoragePool' % domains[pdomain]))
+            if spool not in domain_pools[pdomain]:
+                Message.new(Error="Storage Pool Not Found "
+                            + spool).write(_logger)
+                raise UnknownStoragePool(spool)
+            return StoragePool(
+                name=spool, id=domain_pools[pdomain][spool],
+                protection_domain=pdomain,
+                protection_domain_id=domains[pdomain])
+
+        default_pool = resolve(self._pdomain, self._spool)
+        profile_pools = {}
+        for profile_name, profile in profiles.items():
+            profile_pools[profile_name.lower()] = [
+                resolve(pool.get('protection_domain', self._pdomain),
+                        pool['storage_pool'])
+                for pool in profile['storage_pools']]
+            Message.new(Info="Profile " + profile_name + " uses "
+                        + ", ".join(pool.name for pool in
+                                    profile_pools[profile_name.lower()])
+                        ).write(_logger)
+        return default_pool, profile_pools
+
+    def _cached_storage_pools(self, profiles):
+        """
+        Resolve the default storage pool and the pools of each storage
+        profile from the startup cache.
+
+        :param dict profiles: See ``__init__``.
+        :return: See ``_load_storage_pools``, ``None`` if there is no
+            startup cache or any pool is missing from it.
+        """
+        if self._startup_cache is None:
+            return None
+
+        def cached(pdomain, spool):
+            return self._startup_cache.storage_pool(
+                self._client._api_url, str(pdomain), str(spool))
+
+        default_pool = cached(self._pdomain, self._spool)
+        profile_pools = {}
+        for profile_name, profile in profiles.items():
+            profile_pools[profile_name.lower()] = [
+                cached(pool.get('protection_domain', self._pdomain),
+                       pool['storage_pool'])
+                for pool in profile['storage_pools']]
+        if default_pool is None or any(
+                None in pools for pools in profile_pools.values()):
+            return None
+        Message.new(Info="Using Cached Storage Pools").write(_logger)
+        return default_pool, profile_pools
+
+    def _cache_storage_pools(self, default_pool, profile_pools):
+        """
+        Keep the resolved storage pools in the startup cache, if any.
+
+        :param StoragePool default_pool: The default storage pool
+        :param dict profile_pools: The pools of each storage profile
+        """
+        if self._startup_cache is None:
+            return
+        pools = [default_pool]
+        for pool in sum(profile_pools.values(), []):
+            if pool not in pools:
+                pools.append(pool)
+        self._startup_cache.set_storage_pools(self._client._api_url, pools)
+
+    def _verify_storage_pools(self, profiles):
+        """
+        Resolve the storage pools with the gateway again, updating the
+        startup cache, this driver and its warm pool if they changed
+        since they were cached.
+
+        :param dict profiles: See ``__init__``.
+        """
+        pools = self._gateway.call(self._load_storage_pools, profiles)
+        self._cache_storage_pools(*pools)
+        if pools != (self._default_pool, self._profiles):
+            Message.new(Error="Cached Storage Pools Were Outdated"
+                        ).write(_logger)
+            self._default_pool, self._profiles = pools
+            self._limits = self._mapping_limits(profiles)
+            if (self._warm_pool is not None and
+                    self._warm_pool.pool != self._default_pool):
+                self._gateway.call(self._warm_pool.move, self._default_pool)
+
+    def _verify_sdc_guid(self):
+        """
+        Query the SDC GUID again, updating the startup cache and this
+        driver if it changed since it was cached.
+        """
+        guid = query_guid()
+        self._startup_cache.set_sdc_guid(guid)
+        if guid != self._instance_id:
+            Message.new(Error="Cached SDC GUID Was Outdated "
+                        + guid).write(_logger)
+            self._instance_id = guid
+
+    def _mapping_limits(self, profiles):
+        """
+        The limits to set on the mappings of volumes, by storage pool.
+
+        Volumes do not record the profile they were created for, so
+        the limits of a profile apply to the volumes of its pools.
+
+        :param dict profiles: See ``__init__``.
+        :raises ConflictingMappingLimits: If profiles sharing a storage
+            pool set different limits.
+        :return dict: The IOPS and bandwidth limits in KB/s by storage
+            pool id, for the pools of profiles setting limits.
+        """
+        limits = {}
+        for profile_name, profile in profiles.items():
+            if (IOPS_LIMIT not in profile and
+                    BANDWIDTH_LIMIT not in profile):
+                continue
+            profile_limits = (int(profile.get(IOPS_LIMIT, 0)),
+                              int(profile.get(BANDWIDTH_LIMIT, 0)) * 1024)
+            for pool in self._profiles[profile_name.lower()]:
+                if limits.setdefault(pool.id, profile_limits) \
+                        != profile_limits:
+                    raise ConflictingMappingLimits(
+                        storage_pool=str(pool.name))
+        return limits
+
+    def gateway_statistics(self):
+        """
+        Gateway request counts and latencies, for monitoring.
+
+        :return dict: The number of requests, failed requests and the
+            50th, 90th and 99th latency percentiles in seconds, per
+            endpoint and in total.
+        """
+        return self._gateway.statistics()
 
     def allocation_unit(self):
         """
@@ -557,13 +910,22 @@ class EMCScaleIOBlockDeviceAPI(object):
             ScaleIO Volume
         :return boolean
         """
+        return cls._is_cluster_volume_name(cluster_id, scaleio_volume.name)
+
+    @classmethod
+    def _is_cluster_volume_name(cls, cluster_id, volume_name):
+        """
+        :param UUID cluster_id: UUID of the flocker cluster
+        :param unicode volume_name: The name of a ScaleIO volume
+        :return boolean
+        """
         # TODO it would be nice to be able to store metadata
         # in flocker in some k/v store or database so we can
         # name volumes and take our cluster/datase IDs that are
         # in the name seperate.
-        if scaleio_volume.name.startswith("f"):
+        if volume_name and volume_name.startswith("f"):
             actual_clusterid = cls.volumename_to_datasetid(
-                str(scaleio_volume.name))
+                str(volume_name))
             if actual_clusterid is not None:
                 if actual_clusterid in str(cluster_id):
                     return True
@@ -571,22 +933,45 @@ class EMCScaleIOBlockDeviceAPI(object):
 
     def compute_instance_id(self):
         """
-        ScaleIO Stored a UUID in the SDC kernel module.
+        ScaleIO Stored a UUID in the SDC kernel module. It is taken
+        from the startup cache when there is one holding it.
         """
-        return unicode(check_output(
-            ["/bin/emc/scaleio/drv_cfg",
-             "--query_guid"]).rstrip('\r\n')).lower()
+        if self._startup_cache is None:
+            return query_guid()
+        guid = self._startup_cache.sdc_guid()
+        if guid is None:
+            guid = query_guid()
+            self._startup_cache.set_sdc_guid(guid)
+        return guid
 
-    @check_login
+    @check_login_once
     def create_volume(self, dataset_id, size):
         """
-        Create a new volume.
+        Create a new volume in the default storage pool.
 
         :param UUID dataset_id: The Flocker dataset ID of the dataset on this
             volume.
         :param int size: The size of the new volume in bytes.
         :returns: A ``BlockDeviceVolume``.
         """
+        return self.create_volume_with_profile(dataset_id, size, None)
+
+    @check_login_once
+    def create_volume_with_profile(self, dataset_id, size, profile_name):
+        """
+        Create a new volume in the storage pool of ``profile_name`` with
+        the most free capacity.
+
+        :param UUID dataset_id: The Flocker dataset ID of the dataset on this
+            volume.
+        :param int size: The size of the new volume in bytes.
+        :param unicode profile_name: The storage profile of the volume,
+            the default storage pool is used if it is ``None`` or has
+            no storage pools configured.
+        :raises NoStoragePoolAvailable: If none of the storage pools of
+            the profile has room for the volume.
+        :returns: A ``BlockDeviceVolume``.
+        """
 
         # Convert dataset_id into base64 so we can
         # store it as part of the name.
@@ -605,23 +990,43 @@ class EMCScaleIOBlockDeviceAPI(object):
         # Flocker volumes start with and f again,
         # we only have 32 chars to work with in the ```name```
         volume_name = 'f%s%s' % (slug, str(self._cluster_id)[:8])
-        volume = self._client.create_volume(
-            volume_name,
-            scaleio_size,
-            self._client.get_pd_by_name(self._pdomain),
-            self._client.get_storage_pool_by_name(self._spool))
-
-        siovolume = self._client.get_volume_by_name(
-            volume_name)
+
+        pools = None
+        if profile_name is not None:
+            pools = self._profiles.get(profile_name.lower())
+            if pools is None:
+                Message.new(Info="No Storage Pools for Profile "
+                            + profile_name + ", using default"
+                            ).write(_logger)
+        if pools is None:
+            pools = [self._default_pool]
+
+        # Renaming a pre-created volume is much quicker than creating one.
+        if self._warm_pool is not None and pools == [self._warm_pool.pool]:
+            volume_id = self._warm_pool.claim(scaleio_size * 1024,
+                                              volume_name)
+            if volume_id is not None:
+                self._volume_pool_ids.add(self._warm_pool.pool.id)
+                return self._lookup(volume_id)[1]
+
+        pool = self._scheduler.filter_one(pools, scaleio_size * 1024)
+        volume_id = self._gateway.create_volume(
+            pool, volume_name, scaleio_size * 1024)
+        self._volume_pool_ids.add(pool.id)
+        Message.new(Info="Placed Volume " + volume_name
+                    + " in Storage Pool " + pool.name).write(_logger)
+
+        # The create request answers with the id, fetch the volume by
+        # it rather than searching every volume for the name.
+        siovolume, volume = self._lookup(volume_id)
         Message.new(Info="Created Volume "
                     + siovolume.name).write(_logger)
         Message.new(vol=siovolume.id,
                     size=siovolume.size_kb).write(_logger)
 
-        return _blockdevicevolume_from_scaleio_volume(
-            self._client.get_volume_by_name(volume_name))
+        return volume
 
-    @check_login
+    @check_login_once
     def destroy_volume(self, blockdevice_id):
         """
         Destroy an existing volume.
@@ -634,25 +1039,109 @@ class EMCScaleIOBlockDeviceAPI(object):
 
         :return: ``None``
         """
-        # Check if the volume exists, this snippet
-        # was taken from blockdevice.LoopBackBlockDeviceAPI
-        # should this be a common/reusable function?
-        volume = self._get(blockdevice_id)
+        # Raises UnknownVolume
+        sio_volume = self._lookup(blockdevice_id)[0]
 
         # remove the volume if everything is good.
-        self._client.delete_volume(
-            self._client.get_volume_by_id(str(blockdevice_id)))
+        self._client.delete_volume(sio_volume)
+
+    def _get_sdc(self, sdc_id):
+        """
+        Fetch a single SDC from the gateway.
+
+        :param unicode sdc_id: The ScaleIO id of the SDC
+        :return ``ScaleIO_SDC``: The SDC
+        """
+        return ScaleIO_SDC.from_dict(
+            self._gateway.request('GET', 'instances/Sdc::%s' % sdc_id))
+
+    def _lookup(self, blockdevice_id):
+        """
+        Fetch a single volume of this cluster and the SDC it is
+        mapped to from the gateway, without listing every volume.
+
+        :param unicode blockdevice_id: The ScaleIO id of the volume
+        :raises UnknownVolume: If the volume does not exist or does
+            not belong to this cluster.
+        :return tuple: The ``ScaleIO_Volume`` and the matching
+            ``BlockDeviceVolume``.
+        """
+        sio_volume = None
+        if _is_scaleio_id(blockdevice_id):
+            try:
+                sio_volume = ScaleIO_Volume.from_dict(self._gateway.request(
+                    'GET', 'instances/Volume::%s' % blockdevice_id))
+            except ScaleIOGatewayError as e:
+                if e.error_code not in VOLUME_NOT_FOUND_ERRORS:
+                    raise
+        if (sio_volume is None or
+                not self._is_cluster_volume(self._cluster_id, sio_volume)):
+            Message.new(Error="Could Not Find Volume "
+                        + str(blockdevice_id)).write(_logger)
+            raise UnknownVolume(blockdevice_id)
+
+        return sio_volume, _blockdevicevolume_from_scaleio_volume(
+            sio_volume,
+            attached_to=self._attached_to(self._mappings(sio_volume)))
+
+    def _mappings(self, sio_volume, sdc_guids=None):
+        """
+        The SDCs a volume is mapped to.
+
+        :param ScaleIO_Volume sio_volume: The volume
+        :param dict sdc_guids: The GUIDs of the SDCs by id, if already
+            fetched.
+        :return list: A ``tuple`` of the id and lower case GUID of each
+            SDC the volume is mapped to.
+        """
+        sdc_ids = [sdc["sdcId"] for sdc in sio_volume.mapped_sdcs or []]
+        if len(sdc_ids) > 1 and sdc_guids is None:
+            # One request for every SDC instead of one per mapping.
+            sdc_guids = self._sdc_guids()
+        mappings = []
+        for sdc_id in sdc_ids:
+            guid = (sdc_guids or {}).get(sdc_id)
+            if guid is None:
+                # Registered after we listed the SDCs.
+                guid = self._get_sdc(sdc_id).guid.lower()
+            mappings.append((sdc_id, guid))
+        return mappings
+
+    def _attached_to(self, mappings):
+        """
+        :param list mappings: The SDCs a volume is mapped to, see
+            ``_mappings``.
+        :return unicode: The node Flocker should see the volume attached
+            to, this node if the volume is mapped to it, ``None`` if it
+            is not mapped.
+        """
+        guids = [guid for _, guid in mappings]
+        if self._instance_id in guids:
+            return self._instance_id
+        if guids:
+            return guids[0]
+        return None
 
     @check_login
-    def _get(self, blockdevice_id):
-        for volume in self.list_volumes():
-            if volume.blockdevice_id == blockdevice_id:
-                return volume
-        Message.new(Error="Could Not Find Volume "
-                    + str(blockdevice_id)).write(_logger)
-        raise UnknownVolume(blockdevice_id)
+    def list_attachments(self, blockdevice_id):
+        """
+        List every node a volume is attached to, several for shared
+        read volumes.
+
+        :param unicode blockdevice_id: The unique identifier for the
+            volume.
+        :raises UnknownVolume: If the supplied ``blockdevice_id`` does
+            not exist.
+        :return list: The compute instance ids of the nodes.
+        """
+        sio_volume = self._lookup(blockdevice_id)[0]
+        return [guid for _, guid in self._mappings(sio_volume)]
 
     @check_login
+    def _get(self, blockdevice_id):
+        return self._lookup(blockdevice_id)[1]
+
+    @check_login_once
     def attach_volume(self, blockdevice_id, attach_to):
         """
         Attach ``blockdevice_id`` to ``host``.
@@ -670,7 +1159,9 @@ class EMCScaleIOBlockDeviceAPI(object):
             ``host``.
         """
         # Raises UnknownVolume
-        volume = self._get(blockdevice_id)
+        sio_volume, volume = self._lookup(blockdevice_id)
+        if self._shared_read:
+            return self._attach_shared(sio_volume, volume)
         # raises AlreadyAttachedVolume
         if volume.attached_to is not None:
             Message.new(Error="Could Not Destroy Volume "
@@ -692,20 +1183,105 @@ class EMCScaleIOBlockDeviceAPI(object):
         # volume at a time","httpStatusCode":500,"errorCode":306}``
         try:
             self._client.map_volume_to_sdc(
-                self._client.get_volume_by_id(
-                    str(blockdevice_id)), sdcObj=sdc,
+                sio_volume, sdcObj=sdc,
                 allowMultipleMappings=False)
         except Exception as e:
             # TODO real errors need to be returned by scaleio-py
             Message.new(Error=str(blockdevice_id) + " "
                         + str(e)).write(_logger)
             raise AlreadyAttachedVolume(blockdevice_id)
+        self._limit_mapping(sio_volume, sdc.id)
 
         attached_volume = volume.set(
             attached_to=self._instance_id)
         return attached_volume
 
+    def _limit_mapping(self, sio_volume, sdc_id):
+        """
+        Set the IOPS and bandwidth limits of the profile of a volume on
+        its new mapping to an SDC. The mapping is removed again if they
+        cannot be set, so that a volume is never attached without its
+        limits.
+
+        :param ScaleIO_Volume sio_volume: The volume
+        :param unicode sdc_id: The ScaleIO id of the SDC
+        """
+        limits = self._limits.get(sio_volume.storage_pool_id)
+        if limits is None:
+            return
+        iops, bandwidth_kbps = limits
+        try:
+            self._gateway.request(
+                'POST', 'instances/Volume::%s/action/setMappedSdcLimits'
+                % sio_volume.id,
+                json={'sdcId': sdc_id, 'iopsLimit': str(iops),
+                      'bandwidthLimitInKbps': str(bandwidth_kbps)})
+        except ScaleIOGatewayError as e:
+            Message.new(Error="Could Not Limit Volume "
+                        + str(sio_volume.id) + " " + str(e)
+                        ).write(_logger)
+            self._gateway.request(
+                'POST', 'instances/Volume::%s/action/removeMappedSdc'
+                % sio_volume.id, json={'sdcId': sdc_id})
+            raise
+
     @check_login
+    def mapping_limits(self, blockdevice_id):
+        """
+        Read back the limits in effect on each mapping of a volume.
+
+        :param unicode blockdevice_id: The unique identifier for the
+            volume.
+        :raises UnknownVolume: If the supplied ``blockdevice_id`` does
+            not exist.
+        :return dict: The ``iops_limit`` and ``bandwidth_limit`` (MB/s)
+            of the mapping to each node, by compute instance id. 0
+            means unlimited.
+        """
+        sio_volume = self._lookup(blockdevice_id)[0]
+        limits = dict(
+            (mapping['sdcId'],
+             {IOPS_LIMIT: int(mapping.get('limitIops') or 0),
+              BANDWIDTH_LIMIT: int(mapping.get('limitBwInMbps') or 0)})
+            for mapping in sio_volume.mapped_sdcs or [])
+        return dict((guid, limits[sdc_id])
+                    for sdc_id, guid in self._mappings(sio_volume))
+
+    def _attach_shared(self, sio_volume, volume):
+        """
+        Map a volume to this node in addition to the nodes it is
+        already mapped to.
+
+        :param ScaleIO_Volume sio_volume: The volume
+        :param BlockDeviceVolume volume: The volume, as Flocker sees it
+        :raises AlreadyAttachedVolume: If the volume is already mapped
+            to this node.
+        :raises ScaleIOGatewayError: If the gateway refuses the mapping
+            for another reason.
+        :returns: A ``BlockDeviceVolume`` attached to this node.
+        """
+        if volume.attached_to == self._instance_id:
+            Message.new(Error="Could Not Attach Volume "
+                        + str(volume.blockdevice_id)
+                        + " is already attached here").write(_logger)
+            raise AlreadyAttachedVolume(volume.blockdevice_id)
+        sdc = self._client.get_sdc_by_guid(self._instance_id.upper())
+        try:
+            self._gateway.request(
+                'POST',
+                'instances/Volume::%s/action/addMappedSdc' % sio_volume.id,
+                json={'sdcId': sdc.id, 'allowMultipleMappings': 'TRUE'})
+        except ScaleIOGatewayError as e:
+            Message.new(Error=str(volume.blockdevice_id) + " "
+                        + str(e)).write(_logger)
+            if e.error_code != VOLUME_ALREADY_MAPPED_ERROR:
+                raise
+            # Mapped here since we looked the volume up.
+            raise AlreadyAttachedVolume(volume.blockdevice_id)
+        self._limit_mapping(sio_volume, sdc.id)
+        return volume.set(attached_to=self._instance_id)
+
+    @check_login_once
     def detach_volume(self, blockdevice_id):
         """
         Detach ``blockdevice_id`` from whatever host it is attached to.
@@ -720,7 +1296,7 @@ class EMCScaleIOBlockDeviceAPI(object):
         :returns: ``None``
         """
         # raises UnknownVolume
-        volume = self._get(blockdevice_id)
+        sio_volume, volume = self._lookup(blockdevice_id)
         # raises UnattachedVolume
         if volume.attached_to is None:
             Message.new(Error="Could Not Attach Volume "
@@ -728,23 +1304,46 @@ class EMCScaleIOBlockDeviceAPI(object):
                         + "is unattached").write(_logger)
             raise UnattachedVolume(blockdevice_id)
 
+        if self._shared_read:
+            return self._detach_shared(sio_volume, volume)
+
         # This list should consist of only one SDC, however
         # future versions of this may use mappingToAllSdcsEnabled
         # or ``allowMultipleMappings`` in the above function
         # which we would need to remove potentially all SDC mappings
         # if we initially map a volume to all SDCs
-        sio_volume = self._client.get_volume_by_id(str(blockdevice_id))
         sdcs = self._client.get_sdc_for_volume(sio_volume)
         if len(sdcs) > 0:
             for sdc in sdcs:
-                sdc = self._client.get_sdc_by_id(sdc['sdcId'])
+                sdc = self._get_sdc(sdc['sdcId'])
                 self._client.unmap_volume_from_sdc(sio_volume, sdcObj=sdc)
         else:
             # raises UnattachedVolume (is this needed?)
             raise UnattachedVolume(blockdevice_id)
         volume.set(attached_to=None)
 
-    @check_login
+    def _detach_shared(self, sio_volume, volume):
+        """
+        Remove the mapping of a volume to this node, leaving the
+        mappings to other nodes in place.
+
+        :param ScaleIO_Volume sio_volume: The volume
+        :param BlockDeviceVolume volume: The volume, as Flocker sees it
+        :raises UnattachedVolume: If the volume is not mapped to this
+            node.
+        """
+        if volume.attached_to != self._instance_id:
+            Message.new(Error="Could Not Detach Volume "
+                        + str(volume.blockdevice_id)
+                        + " is not attached here").write(_logger)
+            raise UnattachedVolume(volume.blockdevice_id)
+        for sdc_id, guid in self._mappings(sio_volume):
+            if guid == self._instance_id:
+                self._gateway.request(
+                    'POST', 'instances/Volume::%s/action/removeMappedSdc'
+                    % sio_volume.id, json={'sdcId': sdc_id})
+
+    @check_login_once
     def resize_volume(self, blockdevice_id, size):
         """
         Resize an unattached ``blockdevice_id``.
@@ -775,10 +1374,13 @@ class EMCScaleIOBlockDeviceAPI(object):
                         + "is attached").write(_logger)
             raise AlreadyAttachedVolume(blockdevice_id)
 
-        sio_volume = self._client.get_volume_by_id(str(blockdevice_id))
-
+        # scaleiopy's resize_volume looks the volume up again in
+        # the list of all volumes, so ask the gateway directly.
         size_in_gb = int(Byte(size).to_GiB().value)
-        self._client.resize_volume(sio_volume, size_in_gb)
+        self._gateway.request(
+            'POST',
+            'instances/Volume::%s/action/setVolumeSize' % blockdevice_id,
+            json={'sizeInGB': str(size_in_gb)})
 
     @check_login
     def list_volumes(self):
@@ -788,84 +1390,159 @@ class EMCScaleIOBlockDeviceAPI(object):
         :returns: A ``list`` of ``BlockDeviceVolume``s.
         """
         volumes = []
-        for scaleio_volume in self._client.volumes:
-            guid = None
-            if scaleio_volume.mapped_sdcs is not None:
-                # Flocker assumes one attachment, even though
-                # scaleio can multi-map to SDC's lets assume its 1
-                sdc_id = scaleio_volume.mapped_sdcs[0]["sdcId"]
-                guid = self._client.get_sdc_by_id(sdc_id).guid.lower()
-            if self._is_cluster_volume(self._cluster_id, scaleio_volume):
-                volumes.append(
-                    _blockdevicevolume_from_scaleio_volume(
-                        scaleio_volume, attached_to=guid)
-                )
+        sdc_guids = None
+        for scaleio_volume in self._cluster_volumes():
+            if scaleio_volume.mapped_sdcs and sdc_guids is None:
+                sdc_guids = self._sdc_guids()
+            volumes.append(
+                _blockdevicevolume_from_scaleio_volume(
+                    scaleio_volume,
+                    attached_to=self._attached_to(
+                        self._mappings(scaleio_volume, sdc_guids)))
+            )
         return volumes
 
+    def _storage_pools(self):
+        """
+        :return list: The ``StoragePool``s this driver creates volumes
+            in, each once.
+        """
+        pools = [self._default_pool]
+        for profile_pools in self._profiles.values():
+            for pool in profile_pools:
+                if pool not in pools:
+                    pools.append(pool)
+        return pools
+
+    def _cluster_volumes(self):
+        """
+        Fetch the volumes of this cluster, mostly without listing every
+        volume in the ScaleIO system.
+
+        The gateway cannot filter volumes by name, so the volumes of the
+        configured storage pools and of the pools known to hold volumes
+        of the cluster are fetched. Every volume of the system is listed
+        on the first call and then every ``POOL_DISCOVERY_INTERVAL``
+        seconds, so volumes in pools that are no longer configured, or
+        that other nodes created volumes in, are still found. Volumes of
+        other clusters are dropped before being decoded.
+
+        :return list: The ``ScaleIO_Volume``s of this cluster.
+        """
+        now = self._clock()
+        if (self._next_pool_discovery is None or
+                now >= self._next_pool_discovery):
+            volumes = [
+                volume for volume in self._gateway.request(
+                    'GET', 'types/Volume/instances')
+                if self._is_cluster_volume_name(self._cluster_id,
+                                                volume.get('name'))]
+            self._volume_pool_ids.update(
+                volume['storagePoolId'] for volume in volumes)
+            self._next_pool_discovery = now + POOL_DISCOVERY_INTERVAL
+        else:
+            pool_ids = self._volume_pool_ids.union(
+                pool.id for pool in self._storage_pools())
+            volumes = [
+                volume for pool_id in sorted(pool_ids)
+                for volume in self._gateway.request(
+                    'GET', 'instances/StoragePool::%s/relationships/Volume'
+                    % pool_id)
+                if self._is_cluster_volume_name(self._cluster_id,
+                                                volume.get('name'))]
+        return [ScaleIO_Volume.from_dict(volume) for volume in volumes]
+
+    def _sdc_guids(self):
+        """
+        Fetch every SDC from the gateway in a single request.
+
+        :return dict: The lower case GUID of each SDC by SDC id.
+        """
+        return dict(
+            (sdc['id'], sdc['sdcGuid'].lower())
+            for sdc in self._gateway.request('GET', 'types/Sdc/instances'))
+
     @classmethod
     def _get_dev_from_blockdeviceid(cls, blockdevice_id):
         """
         Get the real device path from blockdevice_id
         """
-        # get the devices path for linux
-        devs_path = FilePath(DEVICE_FILEPATH)
-
-        cls.wait_for_volume(blockdevice_id)
-        devs = devs_path.globChildren("%s*" % DEVICE_PREFIX)
-        for dev in devs:
-            if str(blockdevice_id) in dev.path:
-                return dev.realpath()
+        return cls.wait_for_volume(blockdevice_id).realpath()
 
     @staticmethod
-    def _dev_exists_from_blockdeviceid(blockdevice_id):
+    def _device_link_matcher(blockdevice_id):
+        """
+        :param unicode blockdevice_id: The ScaleIO volume id
+        :return: A callable telling whether a ``DEVICE_FILEPATH``
+            entry is the link of the volume, named
+            ``emc-vol-<mdm id>-<volume id>``.
+        """
+        suffix = "-%s" % (blockdevice_id,)
+
+        def matches(name):
+            return name.startswith(DEVICE_PREFIX) and name.endswith(suffix)
+        return matches
+
+    @classmethod
+    def _dev_exists_from_blockdeviceid(cls, blockdevice_id):
         """
         Check if the device exists before continuing
         """
-        # get the devices path for linux
-        devs_path = FilePath(DEVICE_FILEPATH)
-        devs = devs_path.globChildren("%s*" % DEVICE_PREFIX)
-        for dev in devs:
-            if str(blockdevice_id) in dev.path:
-                return True
-        return False
+        return find_device_link(
+            DEVICE_FILEPATH,
+            cls._device_link_matcher(blockdevice_id)) is not None
 
     @classmethod
     def wait_for_volume(cls, blockdevice_id, time_limit=60):
         """
-        Wait for a ``Volume`` with the same ``id`` as ``expected_volume`` to be
-        listed
+        Wait for the device link of ``blockdevice_id`` to show up in
+        ``DEVICE_FILEPATH``. inotify wakes us up as soon as udev
+        creates it, the directory is polled if inotify is unavailable.
 
-        :param Volume expected_volume: The ``Volume`` to wait for.
-        :param int time_limit: The maximum time, in seconds, to wait for the
-            ``expected_volume`` to have ``expected_status``.
-        :raises Exception: If ``expected_volume`` is not
-            listed within ``time_limit``.
-        :returns: The listed ``Volume`` that matches ``expected_volume``.
+        :param unicode blockdevice_id: The volume to wait for.
+        :param int time_limit: The maximum time, in seconds, to wait for
+            the device.
+        :raises Exception: If the device does not show up within
+            ``time_limit``.
+        :returns: A ``FilePath`` for the device link.
         """
         start_time = time.time()
-        while True:
-            exists = cls._dev_exists_from_blockdeviceid(
-                blockdevice_id)
-            if exists:
-                return
-
+        path = wait_for_device_link(
+            DEVICE_FILEPATH, cls._device_link_matcher(blockdevice_id),
+            time_limit)
+        if path is None:
             elapsed_time = time.time() - start_time
-            if elapsed_time < time_limit:
-                time.sleep(0.1)
-            else:
-                Message.new(Error="Could Find Device for Volume "
-                            + "Timeout on: "
-                            + str(blockdevice_id)).write(_logger)
-                raise Exception(
-                    'Timed out while waiting for volume. '
-                    'Expected Volume: {!r}, '
-                    'Elapsed Time: {!r}, '
-                    'Time Limit: {!r}.'.format(
-                        blockdevice_id, elapsed_time, time_limit
-                    )
+            Message.new(Error="Could Find Device for Volume "
+                        + "Timeout on: "
+                        + str(blockdevice_id)).write(_logger)
+            raise Exception(
+                'Timed out while waiting for volume. '
+                'Expected Volume: {!r}, '
+                'Elapsed Time: {!r}, '
+                'Time Limit: {!r}.'.format(
+                    blockdevice_id, elapsed_time, time_limit
                 )
+            )
+        return FilePath(path)
+
+    @staticmethod
+    def local_device_link(blockdevice_id):
+        """
+        Ask the SDC of this node, not the gateway, whether a volume is
+        mapped here.
+
+        :param unicode blockdevice_id: The ScaleIO volume id
+        :return: A ``FilePath`` for the device link the volume has or
+            will get in ``DEVICE_FILEPATH``, ``None`` if the volume is
+            not mapped to this node or the SDC could not be asked.
+        """
+        mappings = local_volume_mappings()
+        if mappings is None or blockdevice_id not in mappings:
+            return None
+        return FilePath(DEVICE_FILEPATH).child(
+            "%s%s-%s" % (DEVICE_PREFIX, mappings[blockdevice_id],
+                         blockdevice_id))
 
-    @check_login
     def get_device_path(self, blockdevice_id):
         """
         Return the device path that has been allocated to the block device on
@@ -879,7 +1556,20 @@ class EMCScaleIOBlockDeviceAPI(object):
             not attached to a host.
         :returns: A ``FilePath`` for the device.
         """
-        # raises UnknownVolume
+        # The SDC knows the volumes mapped here, which is all that
+        # mounting needs, so the gateway is left alone unless the
+        # volume is not mapped here.
+        link = self.local_device_link(blockdevice_id)
+        if link is not None:
+            if link.exists():
+                return link.realpath()
+            return self._get_dev_from_blockdeviceid(blockdevice_id)
+        return self._get_device_path_from_gateway(blockdevice_id)
+
+    @check_login
+    def _get_device_path_from_gateway(self, blockdevice_id):
+        # raises UnknownVolume, the volume and its mappings
+        # are fetched fresh from the gateway.
         volume = self._get(blockdevice_id)
 
         # raises UnattachedVolume
@@ -889,23 +1579,16 @@ class EMCScaleIOBlockDeviceAPI(object):
                         + "is not attached").write(_logger)
             raise UnattachedVolume(blockdevice_id)
 
-        # Check the "actual volume" for attachment
-        sio_volume = self._client.get_volume_by_id(
-            str(blockdevice_id))
-        sdcs = self._client.get_sdc_for_volume(sio_volume)
-        if len(sdcs) == 0:
-            Message.new(Error="Could get Device Path "
-                        + str(blockdevice_id)
-                        + "is not attached").write(_logger)
-            raise UnattachedVolume(blockdevice_id)
-
         # return the real path of the device
         return self._get_dev_from_blockdeviceid(volume.blockdevice_id)
 
 
 def scaleio_from_configuration(cluster_id, username, password, mdm_ip, port,
                                protection_domain, storage_pool,
-                               certificate, ssl, debug):
+                               certificate, ssl, debug, profiles=None,
+                               connection_pool_size=DEFAULT_POOL_SIZE,
+                               warm_pool=None, shared_read=False,
+                               startup_cache=None):
     """
     Returns Flocker ScaleIO BlockDeviceAPI from plugin config yml.
         :param uuid cluster_id: The UUID of the cluster
@@ -929,14 +1612,32 @@ def scaleio_from_configuration(cluster_id, username, password, mdm_ip, port,
             to True inside the requests.
         :param boolean ssl: use SSL?
         :param boolean debug: verbosity
+        :param dict profiles: Optional storage pools per storage
+            profile, see ``EMCScaleIOBlockDeviceAPI``.
+        :param integer connection_pool_size: The number of connections
+            to the MDM Gateway kept open.
+        :param dict warm_pool: Optional number of pre-created volumes
+            per size in GiB, see ``EMCScaleIOBlockDeviceAPI``.
+        :param boolean shared_read: Attach volumes to several nodes at
+            once, see ``EMCScaleIOBlockDeviceAPI``.
+        :param string startup_cache: Optional path of the file keeping
+            the results of the startup checks across restarts.
     """
+    cache = None
+    if startup_cache:
+        cache = StartupCache(startup_cache)
     client, pd, sp = scaleio_client(
         username, password, mdm_ip, port, pdomain=protection_domain,
-        spool=storage_pool, crt=certificate, ssl=ssl, debug_level=debug
+        spool=storage_pool, crt=certificate, ssl=ssl, debug_level=debug,
+        pool_size=connection_pool_size, cache=cache
     )
     return emc_scaleio_api(
         client,
         cluster_id,
         pd,
-        sp
+        sp,
+        profiles=profiles,
+        warm_pool=warm_pool,
+        shared_read=shared_read,
+        startup_cache=cache
     )
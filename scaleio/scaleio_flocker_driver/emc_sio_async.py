@@ -0,0 +1,741 @@
+# -*- test-case-name: scaleio_flocker_driver.test_emc_sio_async -*-
+# Copyright 2015 EMC Corporation
+
+"""
+A non-blocking variant of the ScaleIO driver for use from the Twisted
+reactor. Every operation returns a ``Deferred``, gateway requests are
+made with ``treq`` and device links are polled with ``deferLater``
+instead of sleeping.
+"""
+
+import json
+import os
+
+import treq
+from treq.client import HTTPClient
+
+from bitmath import GiB
+
+from eliot import Message, Logger
+from zope.interface import implementer
+
+from twisted.internet.defer import (
+    DeferredSemaphore, Deferred, FirstError, gatherResults, maybeDeferred,
+    succeed
+)
+from twisted.internet.ssl import CertificateOptions
+from twisted.internet.task import deferLater
+from twisted.internet.utils import getProcessOutput
+from twisted.python.failure import Failure
+from twisted.python.filepath import FilePath
+from twisted.web.client import (
+    Agent, BrowserLikePolicyForHTTPS, HTTPConnectionPool
+)
+from twisted.web.iweb import IPolicyForHTTPS
+
+from scaleiopy.scaleio import ScaleIO_Volume
+
+from flocker.node.agents.blockdevice import (
+    AlreadyAttachedVolume, IBlockDeviceAsyncAPI, UnknownVolume,
+    UnattachedVolume
+)
+
+from .emc_sio import (
+    EMCScaleIOBlockDeviceAPI, UnknownProtectionDomain, UnknownStoragePool,
+    UnsupportedAPIVersion, SUPPORTED_API_VERSIONS, VOLUME_NOT_FOUND_ERRORS,
+    ALLOCATION_GRANULARITY, DEVICE_FILEPATH, DEFAULT_PROTECTION_DOMAIN,
+    DEFAULT_STORAGE_POOL, DEFAULT_PORT, HTTP, HTTPS, POOL_DISCOVERY_INTERVAL,
+    _blockdevicevolume_from_scaleio_volume,
+    _is_scaleio_id, bytes_to_mbytes, check_supported_volume_size
+)
+from .devices import POLL_INTERVAL, find_device_link
+from .gateway import (
+    ScaleIOGatewayError, TOKEN_MAX_AGE, TOKEN_IDLE_TIMEOUT,
+    TOKEN_EXPIRY_MARGIN, HTTP_OK, HTTP_UNAUTHORIZED
+)
+from .pool_scheduler import StoragePool, free_capacity_kb, most_free_pool
+from .sdc import DRV_CFG
+
+_logger = Logger()
+
+# Gateway requests in flight at once, and connections kept open.
+DEFAULT_MAX_REQUESTS = 4
+
+# ``errorCode`` of a volume mapped to another SDC.
+SINGLE_SDC_MAPPING_ERROR = 306
+
+
+def _first_error(failure):
+    """
+    Unwrap the failure of the first ``Deferred`` that failed in a
+    ``gatherResults``.
+    """
+    failure.trap(FirstError)
+    return failure.value.subFailure
+
+
+@implementer(IPolicyForHTTPS)
+class _UnverifiedPolicyForHTTPS(object):
+    """
+    TLS without certificate verification, for gateways using the
+    default self-signed certificate.
+    """
+    def creatorForNetloc(self, hostname, port):
+        return CertificateOptions(verify=False)
+
+
+class AsyncScaleIOGateway(object):
+    """
+    A non-blocking client for the ScaleIO REST gateway.
+
+    Like ``ScaleIOGatewaySession``, the token is reused until it is
+    about to expire or is rejected. Concurrent requests share one
+    login, and at most ``max_requests`` requests are in flight.
+    """
+    def __init__(self, reactor, api_url, username, password,
+                 verify_ssl=False, max_requests=DEFAULT_MAX_REQUESTS,
+                 max_age=TOKEN_MAX_AGE, idle_timeout=TOKEN_IDLE_TIMEOUT):
+        """
+        :param reactor: The reactor to make requests with
+        :param str api_url: e.g. ``https://<mdm>/api``
+        :param unicode username: The gateway user
+        :param unicode password: Its password
+        :param boolean verify_ssl: Whether to verify the gateway
+            certificate.
+        :param int max_requests: The number of requests in flight, and
+            of connections kept open, at most.
+        :param int max_age: Seconds a token is valid after login.
+        :param int idle_timeout: Seconds a token stays valid unused.
+        """
+        self._reactor = reactor
+        self._api_url = api_url
+        self._username = username
+        self._password = password
+        self._max_age = max_age - TOKEN_EXPIRY_MARGIN
+        self._idle_timeout = idle_timeout - TOKEN_EXPIRY_MARGIN
+        self._semaphore = DeferredSemaphore(max_requests)
+        self._pool = HTTPConnectionPool(reactor, persistent=True)
+        self._pool.maxPersistentPerHost = max_requests
+        if verify_ssl:
+            policy = BrowserLikePolicyForHTTPS()
+        else:
+            policy = _UnverifiedPolicyForHTTPS()
+        self._client = HTTPClient(
+            Agent(reactor, contextFactory=policy, pool=self._pool))
+        self._token = None
+        self._issued = None
+        self._last_used = None
+        self._login_waiters = None
+
+    def _send(self, method, uri, auth, body=None):
+        headers = {'Accept': ['application/json'], 'Version': ['1.0']}
+        data = None
+        if body is not None:
+            headers['Content-Type'] = ['application/json']
+            data = json.dumps(body)
+        d = self._client.request(
+            method, "%s/%s" % (self._api_url, uri),
+            auth=auth, headers=headers, data=data)
+        d.addCallback(self._decode)
+        return d
+
+    def _decode(self, response):
+        d = treq.content(response)
+
+        def decoded(content):
+            if response.code != HTTP_OK:
+                try:
+                    error = json.loads(content)
+                except ValueError:
+                    error = None
+                if not isinstance(error, dict):
+                    error = {'message': content}
+                raise ScaleIOGatewayError(response.code,
+                                          error.get('errorCode'),
+                                          error.get('message'))
+            if not content:
+                return None
+            return json.loads(content)
+        return d.addCallback(decoded)
+
+    def token_expired(self):
+        """
+        :return boolean: True if there is no usable token.
+        """
+        if self._token is None:
+            return True
+        now = self._reactor.seconds()
+        return (now - self._issued >= self._max_age or
+                now - self._last_used >= self._idle_timeout)
+
+    def version(self):
+        """
+        :return Deferred: Fires with the gateway API version.
+        """
+        return self._semaphore.run(
+            self._send, 'GET', 'version', (self._username, self._password))
+
+    def login(self):
+        """
+        Log in to the gateway, or wait for the login in progress.
+
+        :return Deferred: Fires with the new token.
+        """
+        waiter = Deferred()
+        if self._login_waiters is not None:
+            self._login_waiters.append(waiter)
+            return waiter
+        self._login_waiters = [waiter]
+        d = self._send('GET', 'login', (self._username, self._password))
+        d.addBoth(self._logged_in)
+        return waiter
+
+    def _logged_in(self, result):
+        waiters, self._login_waiters = self._login_waiters, None
+        if isinstance(result, Failure):
+            self._token = None
+            for waiter in waiters:
+                waiter.errback(result)
+            return None
+        self._token = result
+        self._issued = self._last_used = self._reactor.seconds()
+        Message.new(Info="Acquired ScaleIO gateway token").write(_logger)
+        for waiter in waiters:
+            waiter.callback(result)
+        return None
+
+    def _ensure_login(self):
+        if self.token_expired():
+            return self.login()
+        return succeed(self._token)
+
+    def request(self, method, uri, body=None):
+        """
+        Send a request for ``uri``, relative to the gateway API URL,
+        with the cached token. A request whose token the gateway
+        rejects is retried once after logging in again.
+
+        :param str method: The HTTP method
+        :param str uri: e.g. ``instances/Volume::<id>``
+        :param body: The JSON encodable body, if any.
+        :return Deferred: Fires with the decoded JSON body, ``None`` if
+            it is empty, or fails with ``ScaleIOGatewayError``.
+        """
+        return self._semaphore.run(self._request, method, uri, body)
+
+    def _request(self, method, uri, body, retry=True):
+        def send(token):
+            d = self._send(method, uri, ('', token), body)
+
+            def used(result):
+                self._last_used = self._reactor.seconds()
+                return result
+
+            def rejected(failure):
+                failure.trap(ScaleIOGatewayError)
+                if (not retry or
+                        failure.value.status_code != HTTP_UNAUTHORIZED):
+                    return failure
+                Message.new(Info="ScaleIO gateway token rejected, "
+                            "logging in again").write(_logger)
+                # Requests sent with the same token are rejected too,
+                # only the first one forgets it.
+                if self._token == token:
+                    self._token = None
+                return self._request(method, uri, body, retry=False)
+            return d.addCallbacks(used, rejected)
+        return self._ensure_login().addCallback(send)
+
+    def close(self):
+        """
+        Close the kept-alive connections.
+
+        :return Deferred: Fires once they are closed.
+        """
+        return self._pool.closeCachedConnections()
+
+
+@implementer(IBlockDeviceAsyncAPI)
+class AsyncEMCScaleIOBlockDeviceAPI(object):
+    """
+    An ``IBlockDeviceAsyncAPI`` which uses EMC ScaleIO block devices
+    without blocking the reactor.
+    """
+    def __init__(self, reactor, gateway, cluster_id,
+                 pdomain, spool, profiles=None, drv_cfg=DRV_CFG):
+        """
+        :param reactor: The reactor to wait for devices with
+        :param AsyncScaleIOGateway gateway: The gateway client
+        :param UUID cluster_id: An ID that will be included in the
+            names of ScaleIO volumes to identify cluster
+        :param string pdomain: The default protection domain
+        :param string spool: The default storage pool
+        :param dict profiles: The storage pools of each storage
+            profile, see ``EMCScaleIOBlockDeviceAPI``.
+        :param str drv_cfg: The path of the SDC's ``drv_cfg``
+        """
+        self._reactor = reactor
+        self._gateway = gateway
+        self._cluster_id = cluster_id
+        self._pdomain = pdomain
+        self._spool = spool
+        self._profiles = profiles or {}
+        self._drv_cfg = drv_cfg
+        self._pools = None
+        self._profile_pools = None
+        self._instance_id = None
+        # The ids of the storage pools known to hold volumes of the
+        # cluster, besides the configured ones
+        self._volume_pool_ids = set()
+        self._next_pool_discovery = None
+
+    def _storage_pools(self):
+        """
+        Resolve the default storage pool and the profile pools to their
+        ScaleIO ids, once. The pools of each profile are kept by lower
+        case profile name.
+
+        :return Deferred: Fires with the list of distinct
+            ``StoragePool``s, the default one first.
+        """
+        if self._pools is not None:
+            return succeed(self._pools)
+
+        wanted = [(self._pdomain, self._spool)]
+        profile_wanted = {}
+        for profile_name, profile in self._profiles.items():
+            for pool in profile['storage_pools']:
+                wanted.append(
+                    (pool.get('protection_domain', self._pdomain),
+                     pool['storage_pool']))
+                profile_wanted.setdefault(
+                    profile_name.lower(), []).append(wanted[-1])
+        wanted = [(str(pdomain), str(spool)) for pdomain, spool in wanted]
+
+        def got_domains(domains):
+            domains = dict((domain['name'], domain['id'])
+                           for domain in domains)
+            names = []
+            for pdomain, _ in wanted:
+                if pdomain not in domains:
+                    raise UnknownProtectionDomain(pdomain)
+                if pdomain not in names:
+                    names.append(pdomain)
+            d = gatherResults([
+                self._gateway.request(
+                    'GET', 'instances/ProtectionDomain::%s'
+                    '/relationships/StoragePool' % domains[pdomain])
+                for pdomain in names], consumeErrors=True)
+            d.addErrback(_first_error)
+            d.addCallback(lambda pools: (domains, dict(zip(names, pools))))
+            return d
+
+        def got_pools(result):
+            domains, domain_pools = result
+            resolved = {}
+            pools = []
+            for pdomain, spool in wanted:
+                ids = dict((pool['name'], pool['id'])
+                           for pool in domain_pools[pdomain])
+                if spool not in ids:
+                    raise UnknownStoragePool(spool)
+                pool = StoragePool(name=spool, id=ids[spool],
+                                   protection_domain=pdomain,
+                                   protection_domain_id=domains[pdomain])
+                resolved[(pdomain, spool)] = pool
+                if pool not in pools:
+                    pools.append(pool)
+            self._profile_pools = dict(
+                (profile_name, [resolved[(str(pdomain), str(spool))]
+                                for pdomain, spool in profile_pools])
+                for profile_name, profile_pools in profile_wanted.items())
+            self._pools = pools
+            return pools
+
+        d = self._gateway.request('GET', 'types/ProtectionDomain/instances')
+        d.addCallback(got_domains)
+        d.addCallback(got_pools)
+        return d
+
+    def allocation_unit(self):
+        """
+        See ``EMCScaleIOBlockDeviceAPI.allocation_unit``.
+        """
+        return succeed(int(GiB(ALLOCATION_GRANULARITY).to_Byte().value))
+
+    def compute_instance_id(self):
+        """
+        Ask the SDC kernel module for its GUID, once.
+        """
+        if self._instance_id is not None:
+            return succeed(self._instance_id)
+        d = getProcessOutput(self._drv_cfg, ("--query_guid",),
+                             env=os.environ, reactor=self._reactor)
+
+        def got_guid(output):
+            self._instance_id = unicode(output.rstrip('\r\n')).lower()
+            return self._instance_id
+        return d.addCallback(got_guid)
+
+    def _get_sdc_guid(self, sdc_id):
+        d = self._gateway.request('GET', 'instances/Sdc::%s' % sdc_id)
+        return d.addCallback(lambda sdc: sdc['sdcGuid'].lower())
+
+    def _sdc_ids(self):
+        """
+        :return Deferred: Fires with the id of each SDC by lower case
+            GUID.
+        """
+        d = self._gateway.request('GET', 'types/Sdc/instances')
+        return d.addCallback(lambda sdcs: dict(
+            (sdc['sdcGuid'].lower(), sdc['id']) for sdc in sdcs))
+
+    def _lookup(self, blockdevice_id):
+        """
+        See ``EMCScaleIOBlockDeviceAPI._lookup``.
+
+        :return Deferred: Fires with the ``ScaleIO_Volume`` and the
+            matching ``BlockDeviceVolume``, or fails with
+            ``UnknownVolume``.
+        """
+        if not _is_scaleio_id(blockdevice_id):
+            return maybeDeferred(self._unknown, blockdevice_id)
+        d = self._gateway.request(
+            'GET', 'instances/Volume::%s' % blockdevice_id)
+
+        def not_found(failure):
+            failure.trap(ScaleIOGatewayError)
+            if failure.value.error_code not in VOLUME_NOT_FOUND_ERRORS:
+                return failure
+            return None
+
+        def got_volume(volume):
+            if volume is None:
+                return self._unknown(blockdevice_id)
+            sio_volume = ScaleIO_Volume.from_dict(volume)
+            if not EMCScaleIOBlockDeviceAPI._is_cluster_volume(
+                    self._cluster_id, sio_volume):
+                return self._unknown(blockdevice_id)
+            if not sio_volume.mapped_sdcs:
+                return sio_volume, _blockdevicevolume_from_scaleio_volume(
+                    sio_volume)
+            sdc_d = self._get_sdc_guid(sio_volume.mapped_sdcs[0]["sdcId"])
+            return sdc_d.addCallback(
+                lambda guid: (sio_volume,
+                              _blockdevicevolume_from_scaleio_volume(
+                                  sio_volume, attached_to=guid)))
+        d.addErrback(not_found)
+        d.addCallback(got_volume)
+        return d
+
+    def _unknown(self, blockdevice_id):
+        Message.new(Error="Could Not Find Volume "
+                    + str(blockdevice_id)).write(_logger)
+        raise UnknownVolume(blockdevice_id)
+
+    def create_volume(self, dataset_id, size):
+        """
+        Create a new volume in the default storage pool.
+
+        :param UUID dataset_id: The Flocker dataset ID of the dataset on this
+            volume.
+        :param int size: The size of the new volume in bytes.
+        :return Deferred: Fires with a ``BlockDeviceVolume``.
+        """
+        return self.create_volume_with_profile(dataset_id, size, None)
+
+    def _select_pool(self, pools, size_kb):
+        """
+        Pick the pool with the most capacity available, fetching the
+        statistics of the pools concurrently.
+
+        :param list pools: The candidate ``StoragePool``s
+        :param int size_kb: The size of the new volume in KiB
+        :return Deferred: Fires with the ``StoragePool``, or fails with
+            ``NoStoragePoolAvailable``.
+        """
+        if len(pools) == 1:
+            # Nothing to choose from, let the gateway refuse the
+            # volume if the pool is full.
+            return succeed(pools[0])
+        d = gatherResults([
+            self._gateway.request(
+                'GET', 'instances/StoragePool::%s/relationships/Statistics'
+                % pool.id) for pool in pools], consumeErrors=True)
+        d.addErrback(_first_error)
+        return d.addCallback(lambda statistics: most_free_pool(
+            pools, [free_capacity_kb(s) for s in statistics], size_kb))
+
+    def create_volume_with_profile(self, dataset_id, size, profile_name):
+        """
+        Create a new volume in the storage pool of ``profile_name`` with
+        the most free capacity, see
+        ``EMCScaleIOBlockDeviceAPI.create_volume_with_profile``.
+
+        :return Deferred: Fires with a ``BlockDeviceVolume``, or fails
+            with ``UnsupportedVolumeSize`` or ``NoStoragePoolAvailable``.
+        """
+        size_kb = EMCScaleIOBlockDeviceAPI.to_scaleio_size(
+            bytes_to_mbytes(size)) * 1024
+        volume_name = 'f%s%s' % (
+            EMCScaleIOBlockDeviceAPI.id_to_short(dataset_id),
+            str(self._cluster_id)[:8])
+
+        def candidates(pools):
+            profile_pools = None
+            if profile_name is not None:
+                profile_pools = self._profile_pools.get(profile_name.lower())
+                if profile_pools is None:
+                    Message.new(Info="No Storage Pools for Profile "
+                                + profile_name + ", using default"
+                                ).write(_logger)
+            return self._select_pool(profile_pools or pools[:1], size_kb)
+
+        def create(pool):
+            Message.new(Info="Placed Volume " + volume_name
+                        + " in Storage Pool " + pool.name).write(_logger)
+            return self._gateway.request(
+                'POST', 'types/Volume/instances', {
+                    'protectionDomainId': pool.protection_domain_id,
+                    'storagePoolId': pool.id,
+                    'volumeSizeInKb': str(size_kb),
+                    'name': volume_name,
+                    'volumeType': 'ThinProvisioned'})
+
+        def created(result):
+            Message.new(Info="Created Volume " + volume_name).write(_logger)
+            return self._lookup(result['id'])
+
+        def place(pool):
+            self._volume_pool_ids.add(pool.id)
+            return pool
+
+        d = maybeDeferred(check_supported_volume_size, size, dataset_id)
+        d.addCallback(lambda _: self._storage_pools())
+        d.addCallback(candidates)
+        d.addCallback(place)
+        d.addCallback(create)
+        d.addCallback(created)
+        return d.addCallback(lambda looked_up: looked_up[1])
+
+    def destroy_volume(self, blockdevice_id):
+        """
+        Destroy an existing volume.
+
+        :return Deferred: Fires with ``None``, or fails with
+            ``UnknownVolume``.
+        """
+        d = self._lookup(blockdevice_id)
+        d.addCallback(lambda _: self._gateway.request(
+            'POST', 'instances/Volume::%s/action/removeVolume'
+            % blockdevice_id, {'removeMode': 'ONLY_ME'}))
+        return d.addCallback(lambda _: None)
+
+    def attach_volume(self, blockdevice_id, attach_to):
+        """
+        Attach ``blockdevice_id`` to ``attach_to``. The volume and the
+        SDCs are fetched concurrently.
+
+        :return Deferred: Fires with the attached ``BlockDeviceVolume``,
+            or fails with ``UnknownVolume``, ``AlreadyAttachedVolume``,
+            or ``KeyError`` if ``attach_to`` is not a known SDC.
+        """
+        d = gatherResults([self._lookup(blockdevice_id), self._sdc_ids()],
+                          consumeErrors=True)
+        d.addErrback(_first_error)
+
+        def attach(result):
+            (sio_volume, volume), sdc_ids = result
+            if volume.attached_to is not None:
+                Message.new(Error="Could Not Attach Volume "
+                            + str(blockdevice_id)
+                            + "is already attached").write(_logger)
+                raise AlreadyAttachedVolume(blockdevice_id)
+            if attach_to.lower() not in sdc_ids:
+                # What scaleiopy's ``get_sdc_by_guid`` raises for the
+                # synchronous driver.
+                Message.new(Error="Could Not Attach Volume "
+                            + str(blockdevice_id) + " to unknown SDC "
+                            + str(attach_to)).write(_logger)
+                raise KeyError("SDC with that GUID not found")
+            mapped = self._gateway.request(
+                'POST', 'instances/Volume::%s/action/addMappedSdc'
+                % blockdevice_id,
+                {'sdcId': sdc_ids[attach_to.lower()],
+                 'allowMultipleMappings': 'FALSE'})
+
+            def mapping_refused(failure):
+                failure.trap(ScaleIOGatewayError)
+                if failure.value.error_code != SINGLE_SDC_MAPPING_ERROR:
+                    return failure
+                raise AlreadyAttachedVolume(blockdevice_id)
+            mapped.addErrback(mapping_refused)
+            return mapped.addCallback(
+                lambda _: volume.set(attached_to=attach_to))
+        return d.addCallback(attach)
+
+    def detach_volume(self, blockdevice_id):
+        """
+        Detach ``blockdevice_id`` from every SDC it is mapped to, all
+        at once.
+
+        :return Deferred: Fires with ``None``, or fails with
+            ``UnknownVolume`` or ``UnattachedVolume``.
+        """
+        def detach(looked_up):
+            sio_volume, volume = looked_up
+            if volume.attached_to is None:
+                Message.new(Error="Could Not Detach Volume "
+                            + str(blockdevice_id)
+                            + "is unattached").write(_logger)
+                raise UnattachedVolume(blockdevice_id)
+            return gatherResults([
+                self._gateway.request(
+                    'POST', 'instances/Volume::%s/action/removeMappedSdc'
+                    % blockdevice_id, {'sdcId': mapping['sdcId']})
+                for mapping in sio_volume.mapped_sdcs],
+                consumeErrors=True).addErrback(_first_error)
+        d = self._lookup(blockdevice_id)
+        d.addCallback(detach)
+        return d.addCallback(lambda _: None)
+
+    def list_volumes(self):
+        """
+        List the volumes of this cluster. The volumes of each storage
+        pool and the SDCs are fetched concurrently.
+
+        The pools listed are the configured ones and those known to hold
+        volumes of the cluster. Every volume of the system is listed
+        instead on the first call and then every
+        ``POOL_DISCOVERY_INTERVAL`` seconds, so volumes in pools that are
+        no longer configured are still found.
+
+        :return Deferred: Fires with a ``list`` of ``BlockDeviceVolume``s.
+        """
+        def fetch(pools):
+            now = self._reactor.seconds()
+            discover = (self._next_pool_discovery is None or
+                        now >= self._next_pool_discovery)
+            if discover:
+                requests = [self._gateway.request(
+                    'GET', 'types/Volume/instances')]
+            else:
+                pool_ids = self._volume_pool_ids.union(
+                    pool.id for pool in pools)
+                requests = [self._gateway.request(
+                    'GET', 'instances/StoragePool::%s/relationships/Volume'
+                    % pool_id) for pool_id in sorted(pool_ids)]
+            d = gatherResults(
+                [self._gateway.request('GET', 'types/Sdc/instances')] +
+                requests, consumeErrors=True)
+            d.addErrback(_first_error)
+            if discover:
+                def discovered(results):
+                    self._next_pool_discovery = now + POOL_DISCOVERY_INTERVAL
+                    return results
+                d.addCallback(discovered)
+            return d
+
+        def build(results):
+            sdc_guids = dict((sdc['id'], sdc['sdcGuid'].lower())
+                             for sdc in results[0])
+            volumes = []
+            for pool_volumes in results[1:]:
+                for volume in pool_volumes:
+                    if not EMCScaleIOBlockDeviceAPI._is_cluster_volume_name(
+                            self._cluster_id, volume.get('name')):
+                        continue
+                    self._volume_pool_ids.add(volume['storagePoolId'])
+                    sio_volume = ScaleIO_Volume.from_dict(volume)
+                    guid = None
+                    if sio_volume.mapped_sdcs:
+                        guid = sdc_guids.get(
+                            sio_volume.mapped_sdcs[0]["sdcId"])
+                    volumes.append(_blockdevicevolume_from_scaleio_volume(
+                        sio_volume, attached_to=guid))
+            return volumes
+
+        d = self._storage_pools()
+        d.addCallback(fetch)
+        return d.addCallback(build)
+
+    def get_device_path(self, blockdevice_id, time_limit=60):
+        """
+        Wait, without blocking, for the device link of an attached
+        volume.
+
+        :return Deferred: Fires with a ``FilePath`` for the device, or
+            fails with ``UnknownVolume`` or ``UnattachedVolume``.
+        """
+        def attached(looked_up):
+            volume = looked_up[1]
+            if volume.attached_to is None:
+                Message.new(Error="Could get Device Path "
+                            + str(blockdevice_id)
+                            + "is not attached").write(_logger)
+                raise UnattachedVolume(blockdevice_id)
+            return self._wait_for_device(blockdevice_id, time_limit)
+        return self._lookup(blockdevice_id).addCallback(attached)
+
+    def _wait_for_device(self, blockdevice_id, time_limit):
+        matches = EMCScaleIOBlockDeviceAPI._device_link_matcher(
+            blockdevice_id)
+        start_time = self._reactor.seconds()
+
+        def check():
+            path = find_device_link(DEVICE_FILEPATH, matches)
+            if path is not None:
+                return FilePath(path).realpath()
+            elapsed_time = self._reactor.seconds() - start_time
+            if elapsed_time >= time_limit:
+                raise Exception(
+                    'Timed out while waiting for volume. '
+                    'Expected Volume: {!r}, '
+                    'Elapsed Time: {!r}, '
+                    'Time Limit: {!r}.'.format(
+                        blockdevice_id, elapsed_time, time_limit))
+            return deferLater(self._reactor, POLL_INTERVAL, check)
+        return maybeDeferred(check)
+
+
+def async_scaleio_from_configuration(reactor, cluster_id, username, password,
+                                     mdm_ip, port=DEFAULT_PORT,
+                                     protection_domain=DEFAULT_PROTECTION_DOMAIN,
+                                     storage_pool=DEFAULT_STORAGE_POOL,
+                                     certificate=None, ssl=True,
+                                     profiles=None,
+                                     max_requests=DEFAULT_MAX_REQUESTS):
+    """
+    Returns the non-blocking Flocker ScaleIO driver, takes the same
+    configuration as ``scaleio_from_configuration``.
+
+    :param reactor: The reactor to use
+    :param int max_requests: The number of gateway requests in flight
+        at most.
+    :return Deferred: Fires with an ``AsyncEMCScaleIOBlockDeviceAPI``
+        once the gateway version and the storage pools are verified,
+        or fails with ``UnsupportedAPIVersion``,
+        ``UnknownProtectionDomain`` or ``UnknownStoragePool``.
+    """
+    proto = HTTPS if ssl else HTTP
+    gateway = AsyncScaleIOGateway(
+        reactor, "%s://%s/api" % (proto, mdm_ip), username, password,
+        verify_ssl=certificate is not None, max_requests=max_requests)
+    api = AsyncEMCScaleIOBlockDeviceAPI(
+        reactor, gateway, cluster_id, protection_domain, storage_pool,
+        profiles=profiles)
+
+    def check_version(version):
+        if version not in SUPPORTED_API_VERSIONS:
+            raise UnsupportedAPIVersion(str(version))
+        Message.new(Info="Using API Version %s" % version).write(_logger)
+
+    def failed(failure):
+        # Nobody gets the gateway to close it later.
+        return gateway.close().addCallback(lambda _: failure)
+
+    d = gateway.version()
+    d.addCallback(check_version)
+    d.addCallback(lambda _: api._storage_pools())
+    d.addCallback(lambda _: api)
+    return d.addErrback(failed)
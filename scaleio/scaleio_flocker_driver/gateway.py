@@ -0,0 +1,227 @@
+# -*- test-case-name: scaleio_flocker_driver.test_emc_sio -*-
+# Copyright 2015 EMC Corporation
+
+"""
+Session handling for the ScaleIO REST gateway.
+"""
+
+import time
+import threading
+
+from requests.exceptions import ConnectionError, SSLError
+
+from eliot import Message, Logger
+
+_logger = Logger()
+
+# The gateway invalidates a token 8 hours after it was issued, or
+# after 10 minutes without any request made with it.
+TOKEN_MAX_AGE = 8 * 60 * 60
+TOKEN_IDLE_TIMEOUT = 10 * 60
+
+# Log in again this many seconds before the gateway would expire
+# the token so a request never races the expiry.
+TOKEN_EXPIRY_MARGIN = 30
+
+HTTP_OK = 200
+HTTP_UNAUTHORIZED = 401
+
+# ``errorCode``s the gateway answers with for an unknown volume id.
+VOLUME_NOT_FOUND_ERRORS = (78, 79)
+
+
+class ScaleIOGatewayError(Exception):
+    """
+    The gateway answered a request with an error.
+    :param int status_code: The HTTP status of the response
+    :param int error_code: The ScaleIO ``errorCode``, if any
+    :param unicode message: The ScaleIO error message, if any
+    """
+    def __init__(self, status_code, error_code=None, message=None):
+        Exception.__init__(self, status_code, error_code, message)
+        self.status_code = status_code
+        self.error_code = error_code
+        self.message = message
+
+
+class ScaleIOGatewaySession(object):
+    """
+    Caches the gateway token of a ``scaleiopy.ScaleIO`` client and
+    only logs in again when the token is missing, about to expire or
+    has been rejected by the gateway.
+    """
+
+    def __init__(self, sio_client, max_age=TOKEN_MAX_AGE,
+                 idle_timeout=TOKEN_IDLE_TIMEOUT, clock=time.time):
+        """
+        :param IScaleIOVolumeManager sio_client: The client whose
+            ``requests.Session`` carries the token.
+        :param int max_age: Seconds a token is valid after login.
+        :param int idle_timeout: Seconds a token stays valid unused.
+        :param clock: A callable returning the current time in seconds.
+        """
+        self._client = sio_client
+        self._max_age = max_age - TOKEN_EXPIRY_MARGIN
+        self._idle_timeout = idle_timeout - TOKEN_EXPIRY_MARGIN
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._issued = None
+        self._last_used = None
+        self._rejected = False
+        if getattr(sio_client, '_logged_in', False):
+            # Use the token ``scaleio_client`` just verified the login
+            # with instead of logging in again on the first call.
+            self._issued = self._last_used = clock()
+        self._client._session.hooks['response'].append(
+            self._check_response)
+
+    def _check_response(self, response, *args, **kwargs):
+        """
+        ``requests`` response hook noting token rejections and use.
+        """
+        if response.status_code == HTTP_UNAUTHORIZED:
+            self._rejected = True
+        else:
+            self._last_used = self._clock()
+        return response
+
+    def token_expired(self):
+        """
+        :return boolean: True if there is no usable token.
+        """
+        if self._issued is None or self._rejected:
+            return True
+        now = self._clock()
+        return (now - self._issued >= self._max_age or
+                now - self._last_used >= self._idle_timeout)
+
+    def login(self):
+        """
+        Log in to the gateway and cache the new token.
+        """
+        with self._lock:
+            self._rejected = False
+            self._client._login()
+            self._issued = self._last_used = self._clock()
+        Message.new(Info="Acquired ScaleIO gateway token").write(_logger)
+
+    def ensure_login(self):
+        """
+        Log in only if the cached token is no longer usable.
+        """
+        if self.token_expired():
+            self.login()
+
+    def request(self, method, uri, **kwargs):
+        """
+        Send a request for ``uri``, relative to the gateway API URL,
+        with the cached token.
+
+        :param string method: The HTTP method
+        :param string uri: e.g. ``instances/Volume::<id>``
+        :param kwargs: Passed on to ``requests.Session.request``
+        :raises ScaleIOGatewayError: If the gateway answers with an
+            error.
+        :return: The decoded JSON body, ``None`` if it is empty.
+        """
+        self.ensure_login()
+        response = self._client._session.request(
+            method, "%s/%s" % (self._client._api_url, uri),
+            verify=self._client._verify_ssl, **kwargs)
+        if response.status_code != HTTP_OK:
+            try:
+                error = response.json()
+            except ValueError:
+                error = None
+            if not isinstance(error, dict):
+                error = {'message': response.text}
+            raise ScaleIOGatewayError(response.status_code,
+                                      error.get('errorCode'),
+                                      error.get('message'))
+        if not response.content:
+            return None
+        return response.json()
+
+    def create_volume(self, pool, name, size_kb):
+        """
+        Create a thin provisioned volume.
+
+        Same request as scaleiopy's ``create_volume``, which wants
+        protection domain and storage pool objects we don't keep.
+
+        :param StoragePool pool: The storage pool to create it in
+        :param string name: The name of the volume
+        :param int size_kb: The size of the volume in KiB
+        :return unicode: The id of the new volume.
+        """
+        return self.request('POST', 'types/Volume/instances', json={
+            'protectionDomainId': pool.protection_domain_id,
+            'storagePoolId': pool.id,
+            'volumeSizeInKb': str(size_kb),
+            'name': name,
+            'volumeType': 'ThinProvisioned'})['id']
+
+    def statistics(self):
+        """
+        :return dict: The request counts and latency percentiles of
+            the gateway requests, see ``GatewayStatistics.snapshot``.
+            ``None`` if the client's session does not record them.
+        """
+        statistics = getattr(self._client._session, 'statistics', None)
+        if statistics is None:
+            return None
+        return statistics.snapshot()
+
+    def invalidate(self):
+        """
+        Forget the cached token so the next call logs in again.
+        """
+        self._issued = None
+
+    def call(self, operation, *args, **kwargs):
+        """
+        Run ``operation``, which must be safe to run twice, with a
+        valid token. If the gateway rejects the token or the request
+        fails, log in again and retry ``operation`` once.
+
+        Calls nested inside ``operation`` reuse the outer call's token
+        and leave retrying to it.
+        """
+        return self._call(True, operation, args, kwargs)
+
+    def call_once(self, operation, *args, **kwargs):
+        """
+        Run ``operation`` with a valid token, like ``call`` but without
+        retrying it. For operations such as creating, deleting, mapping
+        or unmapping volumes, which may have taken effect on the
+        gateway even when the connection failed.
+        """
+        return self._call(False, operation, args, kwargs)
+
+    def _call(self, retry, operation, args, kwargs):
+        if getattr(self._local, 'active', False):
+            return operation(*args, **kwargs)
+
+        self._local.active = True
+        try:
+            self.ensure_login()
+            try:
+                return operation(*args, **kwargs)
+            except Exception as e:
+                # scaleiopy turns connection failures and error
+                # responses alike into RuntimeError.
+                if not (self._rejected or isinstance(
+                        e, (SSLError, ConnectionError, RuntimeError))):
+                    raise
+                if not retry:
+                    # Start the next call from a fresh login.
+                    self.invalidate()
+                    raise
+                Message.new(Info="ScaleIO gateway token rejected or "
+                            "request failed, logging in again: "
+                            + str(e)).write(_logger)
+            self.login()
+            return operation(*args, **kwargs)
+        finally:
+            self._local.active = False
@@ -0,0 +1,113 @@
+# -*- test-case-name: scaleio_flocker_driver.test_pool_scheduler -*-
+# Copyright 2015 EMC Corporation
+
+"""
+Placement of new volumes across ScaleIO storage pools.
+"""
+
+from characteristic import attributes
+
+from eliot import Message, Logger
+
+_logger = Logger()
+
+
+@attributes(["name", "id", "protection_domain", "protection_domain_id"])
+class StoragePool(object):
+    """
+    A ScaleIO storage pool new volumes can be created in.
+
+    :param str name: The storage pool name
+    :param unicode id: The storage pool id
+    :param str protection_domain: The protection domain name
+    :param unicode protection_domain_id: The protection domain id
+    """
+
+
+class NoStoragePoolAvailable(Exception):
+    """
+    None of the candidate storage pools can hold the volume.
+    :param list pools: The candidate ``StoragePool``s
+    :param int size_kb: The size of the volume in KiB
+    """
+    def __init__(self, pools, size_kb):
+        Exception.__init__(self, pools, size_kb)
+        self.pools = pools
+        self.size_kb = size_kb
+
+
+def free_capacity_kb(statistics):
+    """
+    :param dict statistics: The statistics of a storage pool as
+        returned by the gateway.
+    :return int: The KiB still available for new volumes.
+    """
+    free = statistics.get('capacityAvailableForVolumeAllocationInKb')
+    if free is None:
+        # Older gateways only report the raw unused capacity.
+        free = statistics.get('unusedCapacityInKb', 0)
+    return int(free)
+
+
+def most_free_pool(pools, free_kbs, size_kb):
+    """
+    :param list pools: The candidate ``StoragePool``s
+    :param list free_kbs: The KiB available in each of them, see
+        ``free_capacity_kb``.
+    :param int size_kb: The size of the new volume in KiB
+    :raises NoStoragePoolAvailable: If no pool has enough capacity.
+    :return StoragePool: The pool with the most capacity available.
+    """
+    selected_pool = None
+    selected_free = None
+    for pool, free in zip(pools, free_kbs):
+        Message.new(Info="Storage Pool " + pool.name
+                    + " has " + str(free) + " KiB free").write(_logger)
+        if free < size_kb:
+            continue
+        if selected_pool is None or free > selected_free:
+            selected_pool = pool
+            selected_free = free
+
+    if selected_pool is None:
+        Message.new(Error="No Storage Pool can hold "
+                    + str(size_kb) + " KiB").write(_logger)
+        raise NoStoragePoolAvailable(pools, size_kb)
+    return selected_pool
+
+
+class CapacityPoolScheduler(object):
+    """
+    Places volumes in the candidate storage pool with the most
+    capacity available for volume allocation.
+    """
+    def __init__(self, gateway):
+        """
+        :param ScaleIOGatewaySession gateway: Used to fetch pool
+            statistics.
+        """
+        self._gateway = gateway
+
+    def pool_statistics(self, pool):
+        """
+        :param StoragePool pool: The pool
+        :return dict: Its statistics as returned by the gateway.
+        """
+        return self._gateway.request(
+            'GET',
+            'instances/StoragePool::%s/relationships/Statistics' % pool.id)
+
+    def filter_one(self, pools, size_kb):
+        """
+        :param list pools: The candidate ``StoragePool``s
+        :param int size_kb: The size of the new volume in KiB
+        :raises NoStoragePoolAvailable: If no pool has enough capacity.
+        :return StoragePool: The pool to create the volume in.
+        """
+        if len(pools) == 1:
+            # Nothing to choose from, let the gateway refuse the
+            # volume if the pool is full.
+            return pools[0]
+        return most_free_pool(
+            pools, [free_capacity_kb(self.pool_statistics(pool))
+                    for pool in pools], size_kb)
@@ -0,0 +1,59 @@
+# -*- test-case-name: scaleio_flocker_driver.test_sdc -*-
+# Copyright 2015 EMC Corporation
+
+"""
+Queries answered by the SDC kernel driver of this node, without
+contacting the ScaleIO gateway.
+"""
+
+from subprocess import check_output, CalledProcessError
+
+from eliot import Message, Logger
+
+_logger = Logger()
+
+# The SDC's command line tool.
+DRV_CFG = "/bin/emc/scaleio/drv_cfg"
+
+
+def query_guid(drv_cfg=DRV_CFG):
+    """
+    :param str drv_cfg: The path of ``drv_cfg``
+    :return unicode: The lower case GUID of this node's SDC.
+    """
+    return unicode(check_output(
+        [drv_cfg, "--query_guid"]).rstrip('\r\n')).lower()
+
+
+def parse_query_vols(output):
+    """
+    :param str output: The output of ``drv_cfg --query_vols``, e.g.::
+
+        Retrieved 1 volume(s)
+        VOL-ID aea92e8700000000 MDM-ID 62a34bc20b360b1c
+
+    :return dict: The MDM id of each volume mapped to this node, by
+        volume id.
+    """
+    mappings = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if (len(fields) >= 4 and fields[0] == "VOL-ID" and
+                fields[2] == "MDM-ID"):
+            mappings[unicode(fields[1])] = unicode(fields[3])
+    return mappings
+
+
+def local_volume_mappings(drv_cfg=DRV_CFG):
+    """
+    :param str drv_cfg: The path of ``drv_cfg``
+    :return: A ``dict`` of the MDM id of each volume mapped to this
+        node by volume id, ``None`` if the SDC could not be asked.
+    """
+    try:
+        output = check_output([drv_cfg, "--query_vols"])
+    except (OSError, CalledProcessError) as e:
+        Message.new(Info="Could Not Query Local SDC Volumes: "
+                    + str(e)).write(_logger)
+        return None
+    return parse_query_vols(output)
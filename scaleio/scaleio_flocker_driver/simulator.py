@@ -0,0 +1,510 @@
+# -*- test-case-name: scaleio_flocker_driver.test_simulator -*-
+# Copyright 2015 EMC Corporation
+
+"""
+A local stand-in for the ScaleIO REST gateway, for running the driver
+and benchmarks without a ScaleIO system.
+
+Only the requests made by the driver and ``scaleiopy`` are answered:
+version, login, volumes, SDCs, protection domains and storage pools.
+Objects are kept in memory.
+"""
+
+import base64
+import json
+import re
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from uuid import uuid4
+
+SIMULATED_API_VERSION = "1.1"
+
+# ``errorCode``s of the real gateway.
+ERROR_UNAUTHORIZED = 0
+ERROR_VOLUME_NOT_FOUND = 79
+ERROR_ALREADY_MAPPED = 81
+ERROR_SDC_NOT_FOUND = 86
+ERROR_SINGLE_SDC_MAPPING = 306
+ERROR_VOLUME_NOT_MAPPED = 4041
+ERROR_NAME_IN_USE = 6
+ERROR_INVALID_LIMIT = 4052
+
+# 1 PiB, in KiB
+DEFAULT_POOL_CAPACITY_KB = 1024 ** 4
+
+
+class GatewayError(Exception):
+    """
+    The simulated gateway answers the request with an error.
+    """
+    def __init__(self, status_code, error_code, message):
+        Exception.__init__(self, status_code, error_code, message)
+        self.status_code = status_code
+        self.error_code = error_code
+        self.message = message
+
+
+class GatewayInventory(object):
+    """
+    The objects of a simulated ScaleIO system.
+    """
+    def __init__(self, protection_domains=None,
+                 pool_capacity_kb=DEFAULT_POOL_CAPACITY_KB):
+        """
+        :param dict protection_domains: Maps protection domain names to
+            the names of their storage pools. Defaults to a ``default``
+            storage pool in a ``default`` protection domain.
+        :param int pool_capacity_kb: The capacity of each storage pool.
+        """
+        if protection_domains is None:
+            protection_domains = {"default": ["default"]}
+        self._lock = threading.RLock()
+        self._next_id = 0
+        self.system_id = self.new_id()
+        self.protection_domains = {}
+        self.storage_pools = {}
+        self.sdcs = {}
+        self.volumes = {}
+        self._volume_names = set()
+        self.pool_capacity_kb = pool_capacity_kb
+        for pd_name, pool_names in sorted(protection_domains.items()):
+            pd_id = self.new_id()
+            self.protection_domains[pd_id] = {
+                'id': pd_id, 'name': pd_name, 'systemId': self.system_id,
+                'protectionDomainState': 'Active', 'links': []}
+            for pool_name in pool_names:
+                pool_id = self.new_id()
+                self.storage_pools[pool_id] = {
+                    'id': pool_id, 'name': pool_name,
+                    'protectionDomainId': pd_id, 'links': []}
+
+    def new_id(self):
+        """
+        :return unicode: A fresh 16 hex digit ScaleIO id.
+        """
+        with self._lock:
+            self._next_id += 1
+            return u"%016x" % (self._next_id,)
+
+    def storage_pool_id(self, name):
+        """
+        :param str name: The name of a storage pool
+        :return unicode: Its id.
+        """
+        for pool in self.storage_pools.values():
+            if pool['name'] == name:
+                return pool['id']
+        raise KeyError(name)
+
+    def add_sdc(self, guid=None, ip=None):
+        """
+        Register an SDC.
+
+        :param unicode guid: Its GUID, random if not given.
+        :param str ip: Its IP address
+        :return dict: The SDC.
+        """
+        sdc_id = self.new_id()
+        if guid is None:
+            guid = unicode(uuid4()).upper()
+        self.sdcs[sdc_id] = {
+            'id': sdc_id, 'name': None, 'sdcGuid': guid,
+            'sdcIp': ip or "10.0.%d.%d" % (len(self.sdcs) // 250,
+                                           len(self.sdcs) % 250 + 1),
+            'sdcApproved': True, 'mdmConnectionState': 'Connected',
+            'onVmWare': False, 'systemId': self.system_id, 'links': []}
+        return self.sdcs[sdc_id]
+
+    def add_volume(self, name, size_kb, pool_id):
+        """
+        Create a thin provisioned volume.
+
+        :raises GatewayError: If the name is taken.
+        :return dict: The volume.
+        """
+        with self._lock:
+            if name in self._volume_names:
+                raise GatewayError(
+                    500, ERROR_NAME_IN_USE,
+                    "Volume name already in use. Please use a "
+                    "different name.")
+            volume_id = self.new_id()
+            self.volumes[volume_id] = {
+                'id': volume_id, 'name': name, 'sizeInKb': int(size_kb),
+                'storagePoolId': pool_id, 'volumeType': 'ThinProvisioned',
+                'vtreeId': self.new_id(), 'ancestorVolumeId': None,
+                'consistencyGroupId': None,
+                'creationTime': int(time.time()),
+                'isObfuscated': False, 'mappedScsiInitiatorInfo': None,
+                'mappedSdcInfo': None, 'mappingToAllSdcsEnabled': False,
+                'useRmcache': False, 'links': []}
+            self._volume_names.add(name)
+            return self.volumes[volume_id]
+
+    def rename_volume(self, volume_id, name):
+        """
+        :raises GatewayError: If there is no such volume or the name is
+            taken.
+        """
+        with self._lock:
+            volume = self.volume(volume_id)
+            if name in self._volume_names:
+                raise GatewayError(
+                    500, ERROR_NAME_IN_USE,
+                    "Volume name already in use. Please use a "
+                    "different name.")
+            self._volume_names.discard(volume['name'])
+            self._volume_names.add(name)
+            volume['name'] = name
+
+    def remove_volume(self, volume_id):
+        """
+        :raises GatewayError: If there is no such volume.
+        """
+        with self._lock:
+            volume = self.volume(volume_id)
+            self._volume_names.discard(volume['name'])
+            del self.volumes[volume_id]
+
+    def populate(self, count, pool_id, name_format="vol%07d",
+                 size_kb=8 * 1024 * 1024):
+        """
+        Create ``count`` volumes.
+
+        :param str name_format: Turns the index of a volume into its
+            name.
+        """
+        for i in xrange(count):
+            self.add_volume(name_format % (i,), size_kb, pool_id)
+
+    def volume(self, volume_id):
+        """
+        :raises GatewayError: If there is no such volume.
+        :return dict: The volume.
+        """
+        try:
+            return self.volumes[volume_id]
+        except KeyError:
+            raise GatewayError(500, ERROR_VOLUME_NOT_FOUND,
+                               "Could not find the volume")
+
+    def sdc(self, sdc_id):
+        """
+        :raises GatewayError: If there is no such SDC.
+        :return dict: The SDC.
+        """
+        try:
+            return self.sdcs[sdc_id]
+        except KeyError:
+            raise GatewayError(500, ERROR_SDC_NOT_FOUND,
+                               "Could not find the SDC")
+
+    def pool_statistics(self, pool_id):
+        """
+        :return dict: The capacity statistics of a storage pool.
+        """
+        used = sum(volume['sizeInKb'] for volume in self.volumes.values()
+                   if volume['storagePoolId'] == pool_id)
+        free = max(0, self.pool_capacity_kb - used)
+        return {'capacityAvailableForVolumeAllocationInKb': free,
+                'unusedCapacityInKb': free,
+                'numOfVolumes': len(self.volumes)}
+
+
+class _Route(object):
+    def __init__(self, method, pattern, handler):
+        self.method = method
+        self.pattern = re.compile('^/api/' + pattern + '$')
+        self.handler = handler
+
+
+class GatewaySimulator(object):
+    """
+    Serves the ScaleIO REST API for a ``GatewayInventory`` over HTTP on
+    the loopback interface.
+    """
+    def __init__(self, inventory, username=u"admin", password=u"password",
+                 latency=0.0):
+        """
+        :param GatewayInventory inventory: The simulated system
+        :param unicode username: The gateway user
+        :param unicode password: Its password
+        :param float latency: Seconds to wait before answering each
+            request.
+        """
+        self.inventory = inventory
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.requests = {}
+        self.logins = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._tokens = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._routes = [
+            _Route('GET', r'version', self._version),
+            _Route('GET', r'login', self._login),
+            _Route('GET', r'types/(Volume|Sdc|ProtectionDomain|StoragePool)'
+                   r'/instances', self._list),
+            _Route('GET', r'instances/Volume::(\w+)', self._get_volume),
+            _Route('GET', r'instances/Sdc::(\w+)', self._get_sdc),
+            _Route('GET', r'instances/ProtectionDomain::(\w+)'
+                   r'/relationships/StoragePool', self._domain_pools),
+            _Route('GET', r'instances/StoragePool::(\w+)'
+                   r'/relationships/Statistics', self._pool_statistics),
+            _Route('GET', r'instances/StoragePool::(\w+)'
+                   r'/relationships/Volume', self._pool_volumes),
+            _Route('POST', r'types/Volume/instances', self._create_volume),
+            _Route('POST', r'types/Volume/instances/action/queryIdByKey',
+                   self._query_volume_id),
+            _Route('POST', r'instances/Volume::(\w+)/action/(\w+)',
+                   self._volume_action),
+        ]
+
+    @property
+    def address(self):
+        """
+        The ``host:port`` the simulator listens on.
+        """
+        return "%s:%d" % self._server.server_address
+
+    @property
+    def url(self):
+        """
+        The base URL of the simulated REST API.
+        """
+        return "http://%s/api" % (self.address,)
+
+    def request_count(self):
+        """
+        :return int: The number of requests answered so far.
+        """
+        with self._lock:
+            return sum(self.requests.values())
+
+    def revoke_tokens(self):
+        """
+        Reject every token issued so far, as the gateway does when they
+        expire.
+        """
+        with self._lock:
+            self._tokens.clear()
+
+    def start(self):
+        """
+        Start serving in a background thread on a free port.
+        """
+        simulator = self
+
+        class Handler(_GatewayRequestHandler):
+            pass
+        Handler.simulator = simulator
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="scaleio-gateway-simulator")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def handle(self, method, path, credentials, body):
+        """
+        Answer a request.
+
+        :param str method: The HTTP method
+        :param str path: The request path, e.g. ``/api/version``
+        :param tuple credentials: The basic authentication user and
+            password, ``None`` if none were sent.
+        :param body: The decoded JSON body, ``None`` if there was none.
+        :return tuple: The HTTP status and the JSON encodable answer.
+        """
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return self._route(method, path, credentials, body)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _route(self, method, path, credentials, body):
+        path = path.split('?', 1)[0]
+        for route in self._routes:
+            match = route.pattern.match(path)
+            if route.method != method or match is None:
+                continue
+            with self._lock:
+                key = "%s %s" % (method, route.pattern.pattern)
+                self.requests[key] = self.requests.get(key, 0) + 1
+            try:
+                self._authenticate(route, credentials)
+                return 200, route.handler(body, *match.groups())
+            except GatewayError as e:
+                return e.status_code, {'message': e.message,
+                                       'httpStatusCode': e.status_code,
+                                       'errorCode': e.error_code}
+        return 404, {'message': "Unknown request " + path,
+                     'httpStatusCode': 404, 'errorCode': 0}
+
+    def _authenticate(self, route, credentials):
+        if credentials is not None:
+            if credentials == (self.username, self.password):
+                return
+            if route.handler != self._login:
+                with self._lock:
+                    if credentials[1] in self._tokens:
+                        return
+        raise GatewayError(401, ERROR_UNAUTHORIZED, "Unauthorized")
+
+    def _version(self, body):
+        return SIMULATED_API_VERSION
+
+    def _login(self, body):
+        token = base64.b64encode(uuid4().bytes)
+        with self._lock:
+            self.logins += 1
+            self._tokens.add(token)
+        return token
+
+    def _list(self, body, object_type):
+        return {
+            'Volume': self.inventory.volumes,
+            'Sdc': self.inventory.sdcs,
+            'ProtectionDomain': self.inventory.protection_domains,
+            'StoragePool': self.inventory.storage_pools,
+        }[object_type].values()
+
+    def _get_volume(self, body, volume_id):
+        return self.inventory.volume(volume_id)
+
+    def _get_sdc(self, body, sdc_id):
+        return self.inventory.sdc(sdc_id)
+
+    def _domain_pools(self, body, pd_id):
+        return [pool for pool in self.inventory.storage_pools.values()
+                if pool['protectionDomainId'] == pd_id]
+
+    def _pool_statistics(self, body, pool_id):
+        return self.inventory.pool_statistics(pool_id)
+
+    def _pool_volumes(self, body, pool_id):
+        return [volume for volume in self.inventory.volumes.values()
+                if volume['storagePoolId'] == pool_id]
+
+    def _create_volume(self, body):
+        return {'id': self.inventory.add_volume(
+            body['name'], body['volumeSizeInKb'],
+            body['storagePoolId'])['id']}
+
+    def _query_volume_id(self, body):
+        for volume in self.inventory.volumes.values():
+            if volume['name'] == body['name']:
+                return volume['id']
+        raise GatewayError(500, ERROR_VOLUME_NOT_FOUND,
+                           "Could not find the volume")
+
+    def _volume_action(self, body, volume_id, action):
+        volume = self.inventory.volume(volume_id)
+        mapped = volume['mappedSdcInfo'] or []
+        if action == 'removeVolume':
+            self.inventory.remove_volume(volume_id)
+        elif action == 'setVolumeName':
+            self.inventory.rename_volume(volume_id, body['newName'])
+        elif action == 'setVolumeSize':
+            volume['sizeInKb'] = int(body['sizeInGB']) * 1024 * 1024
+        elif action == 'addMappedSdc':
+            sdc = self.inventory.sdc(body['sdcId'])
+            if any(m['sdcId'] == sdc['id'] for m in mapped):
+                raise GatewayError(500, ERROR_ALREADY_MAPPED,
+                                   "The volume is already mapped to "
+                                   "this SDC")
+            if mapped and str(body.get('allowMultipleMappings')).upper() \
+                    != 'TRUE':
+                raise GatewayError(500, ERROR_SINGLE_SDC_MAPPING,
+                                   "Only a single SDC may be mapped to "
+                                   "this volume at a time")
+            volume['mappedSdcInfo'] = mapped + [
+                {'sdcId': sdc['id'], 'sdcIp': sdc['sdcIp'],
+                 'limitIops': 0, 'limitBwInMbps': 0}]
+        elif action == 'setMappedSdcLimits':
+            iops = int(body.get('iopsLimit', 0))
+            if 0 < iops <= 10:
+                raise GatewayError(500, ERROR_INVALID_LIMIT,
+                                   "The IOPS limit must be 0 or greater "
+                                   "than 10")
+            for mapping in mapped:
+                if mapping['sdcId'] == body['sdcId']:
+                    mapping['limitIops'] = iops
+                    mapping['limitBwInMbps'] = int(
+                        body.get('bandwidthLimitInKbps', 0)) // 1024
+                    break
+            else:
+                raise GatewayError(500, ERROR_VOLUME_NOT_MAPPED,
+                                   "The volume is not mapped to the SDC")
+        elif action == 'removeMappedSdc':
+            remaining = [m for m in mapped if m['sdcId'] != body['sdcId']]
+            if len(remaining) == len(mapped):
+                raise GatewayError(500, ERROR_VOLUME_NOT_MAPPED,
+                                   "The volume is not mapped to the SDC")
+            volume['mappedSdcInfo'] = remaining or None
+        else:
+            raise GatewayError(404, 0, "Unknown action " + action)
+        return None
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _GatewayRequestHandler(BaseHTTPRequestHandler):
+    """
+    Hands requests to ``simulator``.
+    """
+    simulator = None
+
+    # Keep connections alive like the real gateway does.
+    protocol_version = "HTTP/1.1"
+
+    def _credentials(self):
+        header = self.headers.getheader('Authorization')
+        if not header or not header.startswith('Basic '):
+            return None
+        user, _, password = base64.b64decode(header[6:]).partition(':')
+        return user, password
+
+    def _answer(self, method):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = None
+        if length:
+            body = json.loads(self.rfile.read(length))
+        status, answer = self.simulator.handle(
+            method, self.path, self._credentials(), body)
+        content = "" if answer is None else json.dumps(answer)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._answer('GET')
+
+    def do_POST(self):
+        self._answer('POST')
+
+    def log_message(self, format, *args):
+        pass
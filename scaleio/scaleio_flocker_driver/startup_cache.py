@@ -0,0 +1,166 @@
+# -*- test-case-name: scaleio_flocker_driver.test_startup_cache -*-
+# Copyright 2015 EMC Corporation
+
+"""
+The results of the checks the driver makes when it starts, kept in a
+local state file so that a restarted agent can use them right away and
+check them again in the background.
+"""
+
+import json
+import threading
+
+from eliot import Message, Logger
+from twisted.python.filepath import FilePath
+
+from .pool_scheduler import StoragePool
+
+_logger = Logger()
+
+# Where the agent keeps the startup cache by default.
+STARTUP_CACHE_PATH = "/var/lib/flocker/scaleio-startup-cache.json"
+
+
+class StartupCache(object):
+    """
+    The GUID of this node's SDC and, for each gateway, the API version
+    and the ids of the storage pools verified on the last start.
+    """
+    def __init__(self, path=STARTUP_CACHE_PATH):
+        """
+        :param str path: The state file, created if it does not exist.
+        """
+        self._path = FilePath(path)
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self):
+        try:
+            state = json.loads(self._path.getContent())
+        except (IOError, OSError, ValueError) as e:
+            Message.new(Info="Startup Cache Not Loaded: "
+                        + str(e)).write(_logger)
+            return {}
+        if not isinstance(state, dict):
+            return {}
+        return state
+
+    def _save(self):
+        try:
+            self._path.setContent(json.dumps(self._state, sort_keys=True))
+        except (IOError, OSError) as e:
+            Message.new(Error="Startup Cache Not Saved: "
+                        + str(e)).write(_logger)
+
+    def _gateway(self, gateway):
+        return self._state.get('gateways', {}).get(gateway, {})
+
+    def _update(self, update):
+        """
+        Apply ``update`` to the state and save it if it changed.
+
+        :param update: A function changing the state ``dict`` in place.
+        """
+        with self._lock:
+            before = json.dumps(self._state, sort_keys=True)
+            update(self._state)
+            if json.dumps(self._state, sort_keys=True) != before:
+                self._save()
+
+    def sdc_guid(self):
+        """
+        :return unicode: The lower case GUID of this node's SDC, ``None``
+            if not known.
+        """
+        return self._state.get('sdc_guid')
+
+    def set_sdc_guid(self, guid):
+        """
+        :param unicode guid: The lower case GUID of this node's SDC
+        """
+        self._update(lambda state: state.update(sdc_guid=guid))
+
+    def api_version(self, gateway):
+        """
+        :param str gateway: The base URL of the gateway API
+        :return str: The API version verified on the last start,
+            ``None`` if not known.
+        """
+        version = self._gateway(gateway).get('api_version')
+        if version is not None:
+            version = str(version)
+        return version
+
+    def set_api_version(self, gateway, version):
+        """
+        :param str gateway: The base URL of the gateway API
+        :param str version: The verified API version
+        """
+        self._update(lambda state: state.setdefault(
+            'gateways', {}).setdefault(gateway, {}).update(
+                api_version=version))
+
+    def storage_pool(self, gateway, protection_domain, storage_pool):
+        """
+        :param str gateway: The base URL of the gateway API
+        :param str protection_domain: The protection domain name
+        :param str storage_pool: The storage pool name
+        :return StoragePool: The pool verified on the last start,
+            ``None`` if not known.
+        """
+        ids = self._gateway(gateway).get('storage_pools', {}).get(
+            protection_domain, {}).get(storage_pool)
+        if ids is None:
+            return None
+        return StoragePool(
+            name=str(storage_pool), id=ids['id'],
+            protection_domain=str(protection_domain),
+            protection_domain_id=ids['protection_domain_id'])
+
+    def set_storage_pools(self, gateway, pools):
+        """
+        Replace the verified storage pools of a gateway.
+
+        :param str gateway: The base URL of the gateway API
+        :param list pools: The verified ``StoragePool``s
+        """
+        domains = {}
+        for pool in pools:
+            domains.setdefault(pool.protection_domain, {})[pool.name] = {
+                'id': pool.id,
+                'protection_domain_id': pool.protection_domain_id}
+        self._update(lambda state: state.setdefault(
+            'gateways', {}).setdefault(gateway, {}).update(
+                storage_pools=domains))
+
+    def forget(self, gateway):
+        """
+        Drop everything known about a gateway.
+
+        :param str gateway: The base URL of the gateway API
+        """
+        self._update(lambda state: state.get('gateways', {}).pop(
+            gateway, None))
+
+
+def verify_in_background(name, check, *args, **kwargs):
+    """
+    Run a check of cached startup results in a daemon thread, logging
+    its failure.
+
+    :param str name: What is checked, for the log
+    :param check: The function making the check
+    :return threading.Thread: The started thread.
+    """
+    def run():
+        try:
+            check(*args, **kwargs)
+        except Exception as e:
+            Message.new(Error="Could Not Verify Cached " + name + ": "
+                        + str(e)).write(_logger)
+        else:
+            Message.new(Info="Verified Cached " + name).write(_logger)
+    thread = threading.Thread(target=run, name="scaleio-verify-startup")
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,26 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.benchmark``.
+"""
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .benchmark import OPERATIONS, run
+
+
+class RunTests(SynchronousTestCase):
+    """
+    Tests for ``run``.
+    """
+    def test_requests_independent_of_inventory(self):
+        """
+        No operation makes more gateway requests because the system
+        holds more volumes.
+        """
+        small = run(10, iterations=1)
+        large = run(400, iterations=1)
+        self.assertEqual(
+            [small[operation]['requests'] for operation in OPERATIONS],
+            [large[operation]['requests'] for operation in OPERATIONS])
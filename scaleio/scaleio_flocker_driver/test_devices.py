@@ -0,0 +1,75 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.devices``.
+"""
+
+import os
+from threading import Timer
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from . import devices
+from .devices import wait_for_device_link
+
+
+def _matches(name):
+    return name.startswith("emc-vol-") and name.endswith("-aea92e87")
+
+
+class WaitForDeviceLinkTests(SynchronousTestCase):
+    """
+    Tests for ``wait_for_device_link``.
+    """
+    def setUp(self):
+        self.directory = self.mktemp()
+        os.makedirs(self.directory)
+        self.link = os.path.join(self.directory, "emc-vol-62a34bc2-aea92e87")
+
+    def create_later(self, name, delay=0.2):
+        timer = Timer(delay, os.symlink, ("/dev/null",
+                                          os.path.join(self.directory, name)))
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_existing(self):
+        """
+        A link that already exists is returned right away.
+        """
+        os.symlink("/dev/null", self.link)
+        self.assertEqual(
+            wait_for_device_link(self.directory, _matches, 0), self.link)
+
+    def test_created(self):
+        """
+        A link created while waiting is returned.
+        """
+        self.create_later("emc-vol-62a34bc2-00000000")
+        self.create_later(os.path.basename(self.link), delay=0.3)
+        self.assertEqual(
+            wait_for_device_link(self.directory, _matches, 5), self.link)
+
+    def test_created_polling(self):
+        """
+        Without inotify a link created while waiting is still returned.
+        """
+        self.patch(devices, "_libc", None)
+        self.create_later(os.path.basename(self.link))
+        self.assertEqual(
+            wait_for_device_link(self.directory, _matches, 5), self.link)
+
+    def test_timeout(self):
+        """
+        ``None`` is returned if no link shows up within the time limit.
+        """
+        self.create_later("emc-vol-62a34bc2-00000000", delay=0)
+        self.assertIs(
+            wait_for_device_link(self.directory, _matches, 0.3), None)
+
+    def test_missing_directory(self):
+        """
+        A missing directory is waited on until the time limit.
+        """
+        self.assertIs(
+            wait_for_device_link(self.mktemp(), _matches, 0.2), None)
@@ -23,7 +23,7 @@ from .emc_sio import (
 )
 
 from flocker.node.agents.test.test_blockdevice import (
-    make_iblockdeviceapi_tests
+    make_iblockdeviceapi_tests, make_iprofiledblockdeviceapi_tests
 )
 
 
@@ -59,6 +59,21 @@ class EMCScaleIOBlockDeviceAPIInterfaceTests(
     """
 
 
+class EMCScaleIOProfiledBlockDeviceAPIInterfaceTests(
+        make_iprofiledblockdeviceapi_tests(
+            profiled_blockdevice_api_factory=(
+                lambda test_case: emcsioblockdeviceapi_for_test(
+                    uuid4(),
+                    test_case)
+            ),
+            dataset_size=int(GiB(8).to_Byte().value)
+        )
+):
+    """
+    Interface adherence Tests for ``IProfiledBlockDeviceAPI``
+    """
+
+
 # TODO EBS and Cinder implementations move the below tests up
 # into <Driver>BlockDeviceAPIInterfaceTests
 # See https://github.com/ClusterHQ/flocker/blob/master
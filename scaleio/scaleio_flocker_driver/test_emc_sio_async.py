@@ -0,0 +1,257 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.emc_sio_async``, against the gateway
+simulator.
+"""
+
+from uuid import uuid4
+
+from bitmath import GiB
+
+from zope.interface.verify import verifyObject
+
+from twisted.internet import reactor
+from twisted.internet.defer import gatherResults, inlineCallbacks
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import TestCase
+
+from flocker.node.agents.blockdevice import (
+    AlreadyAttachedVolume, IBlockDeviceAsyncAPI, UnattachedVolume,
+    UnknownVolume
+)
+
+from . import simulator
+from .emc_sio import UnsupportedAPIVersion, UnsupportedVolumeSize
+from .emc_sio_async import (
+    AsyncEMCScaleIOBlockDeviceAPI, async_scaleio_from_configuration
+)
+from .simulator import GatewayInventory, GatewaySimulator
+
+SIZE = int(GiB(8).to_Byte().value)
+
+
+class AsyncEMCScaleIOBlockDeviceAPITests(TestCase):
+    """
+    Tests for ``AsyncEMCScaleIOBlockDeviceAPI``.
+    """
+    @inlineCallbacks
+    def setUp(self):
+        self.inventory = GatewayInventory()
+        self.sdc = self.inventory.add_sdc()
+        self.other_sdc = self.inventory.add_sdc()
+        self.simulator = GatewaySimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.api = yield async_scaleio_from_configuration(
+            reactor, uuid4(), self.simulator.username,
+            self.simulator.password, self.simulator.address, ssl=False,
+            max_requests=2)
+        self.addCleanup(self.api._gateway.close)
+
+    def test_interface(self):
+        """
+        ``AsyncEMCScaleIOBlockDeviceAPI`` provides
+        ``IBlockDeviceAsyncAPI``.
+        """
+        self.assertTrue(verifyObject(IBlockDeviceAsyncAPI, self.api))
+
+    @inlineCallbacks
+    def test_volume_lifecycle(self):
+        """
+        A created volume is listed, attached, detached and destroyed.
+        """
+        dataset_id = uuid4()
+        guid = self.sdc['sdcGuid'].lower()
+        volume = yield self.api.create_volume(dataset_id, SIZE)
+        attached = yield self.api.attach_volume(volume.blockdevice_id, guid)
+        listed = yield self.api.list_volumes()
+        yield self.api.detach_volume(volume.blockdevice_id)
+        yield self.api.destroy_volume(volume.blockdevice_id)
+        remaining = yield self.api.list_volumes()
+        self.assertEqual(
+            ((volume.dataset_id, volume.size), listed, remaining),
+            ((dataset_id, SIZE), [attached], []))
+
+    def test_unsupported_size(self):
+        """
+        Creating a volume of a size ScaleIO cannot allocate fails with
+        ``UnsupportedVolumeSize`` without asking the gateway.
+        """
+        before = self.simulator.request_count()
+        d = self.api.create_volume(uuid4(), int(GiB(12).to_Byte().value))
+        d = self.assertFailure(d, UnsupportedVolumeSize)
+        d.addCallback(lambda _: self.assertEqual(
+            self.simulator.request_count(), before))
+        return d
+
+    @inlineCallbacks
+    def test_already_attached(self):
+        """
+        Attaching an attached volume fails with
+        ``AlreadyAttachedVolume``.
+        """
+        volume = yield self.api.create_volume(uuid4(), SIZE)
+        yield self.api.attach_volume(
+            volume.blockdevice_id, self.sdc['sdcGuid'])
+        yield self.assertFailure(
+            self.api.attach_volume(volume.blockdevice_id,
+                                   self.other_sdc['sdcGuid']),
+            AlreadyAttachedVolume)
+
+    @inlineCallbacks
+    def test_unknown_host(self):
+        """
+        Attaching a volume to a node without an SDC fails with the
+        ``KeyError`` of the synchronous driver.
+        """
+        volume = yield self.api.create_volume(uuid4(), SIZE)
+        yield self.assertFailure(
+            self.api.attach_volume(volume.blockdevice_id,
+                                   u"00000000-0000-0000-0000-000000000000"),
+            KeyError)
+
+    @inlineCallbacks
+    def test_unattached(self):
+        """
+        Detaching an unattached volume fails with ``UnattachedVolume``.
+        """
+        volume = yield self.api.create_volume(uuid4(), SIZE)
+        yield self.assertFailure(
+            self.api.detach_volume(volume.blockdevice_id), UnattachedVolume)
+
+    def test_unknown_volume(self):
+        """
+        Destroying an unknown volume fails with ``UnknownVolume``.
+        """
+        return self.assertFailure(
+            self.api.destroy_volume(u"0000000000000bad"), UnknownVolume)
+
+    @inlineCallbacks
+    def test_other_cluster(self):
+        """
+        Volumes of other clusters are neither listed nor destroyed.
+        """
+        pool_id = self.inventory.storage_pool_id("default")
+        other = self.inventory.add_volume(
+            'f%s%s' % (u'A' * 22, str(uuid4())[:8]), 8388608, pool_id)
+        listed = yield self.api.list_volumes()
+        yield self.assertFailure(
+            self.api.destroy_volume(other['id']), UnknownVolume)
+        self.assertEqual(listed, [])
+
+    @inlineCallbacks
+    def test_requests_capped(self):
+        """
+        No more than ``max_requests`` gateway requests are in flight.
+        """
+        self.simulator.latency = 0.05
+        yield gatherResults(
+            [self.api.list_volumes() for _ in range(5)])
+        self.assertEqual(self.simulator.max_in_flight, 2)
+
+    @inlineCallbacks
+    def test_rejected_token(self):
+        """
+        Requests rejected because the token expired are retried after
+        logging in once again.
+        """
+        logins = self.simulator.logins
+        self.simulator.revoke_tokens()
+        yield gatherResults(
+            [self.api.list_volumes() for _ in range(3)])
+        self.assertEqual(self.simulator.logins, logins + 1)
+
+    @inlineCallbacks
+    def test_instance_id(self):
+        """
+        ``compute_instance_id`` returns the lower case SDC GUID.
+        """
+        drv_cfg = FilePath(self.mktemp())
+        drv_cfg.setContent("#!/bin/sh\necho ABCD-EF01\n")
+        drv_cfg.chmod(0o755)
+        api = AsyncEMCScaleIOBlockDeviceAPI(
+            reactor, self.api._gateway, uuid4(), "default", "default",
+            drv_cfg=drv_cfg.path)
+        instance_id = yield api.compute_instance_id()
+        self.assertEqual(instance_id, u"abcd-ef01")
+
+
+class AsyncProfileTests(TestCase):
+    """
+    Tests for ``AsyncEMCScaleIOBlockDeviceAPI`` with storage profiles.
+    """
+    def setUp(self):
+        self.inventory = GatewayInventory(
+            protection_domains={"default": ["default", "gold1", "gold2"]},
+            pool_capacity_kb=64 * 1024 * 1024)
+        self.simulator = GatewaySimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+
+    def start(self, **kwargs):
+        """
+        :return Deferred: Fires with the driver.
+        """
+        d = async_scaleio_from_configuration(
+            reactor, uuid4(), self.simulator.username,
+            self.simulator.password, self.simulator.address, ssl=False,
+            **kwargs)
+
+        def started(api):
+            self.addCleanup(api._gateway.close)
+            return api
+        return d.addCallback(started)
+
+    @inlineCallbacks
+    def test_profile_pool(self):
+        """
+        A volume of a profile is created in the pool of the profile with
+        the most free capacity.
+        """
+        self.inventory.add_volume(
+            "other", 16 * 1024 * 1024, self.inventory.storage_pool_id("gold1"))
+        api = yield self.start(profiles={u"gold": {"storage_pools": [
+            {"storage_pool": "gold1"}, {"storage_pool": "gold2"}]}})
+        volume = yield api.create_volume_with_profile(uuid4(), SIZE, u"Gold")
+        self.assertEqual(
+            self.inventory.volume(volume.blockdevice_id)['storagePoolId'],
+            self.inventory.storage_pool_id("gold2"))
+
+    @inlineCallbacks
+    def test_unconfigured_pool(self):
+        """
+        Volumes of the cluster in a pool that is no longer configured are
+        listed, and those of other clusters are not.
+        """
+        profiles = {u"gold": {"storage_pools": [{"storage_pool": "gold1"}]}}
+        api = yield self.start(profiles=profiles)
+        volume = yield api.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        other = yield self.start(profiles=profiles)
+        yield other.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        restarted = AsyncEMCScaleIOBlockDeviceAPI(
+            reactor, api._gateway, api._cluster_id, "default", "default")
+        listed = yield restarted.list_volumes()
+        self.assertEqual(listed, [volume])
+
+    @inlineCallbacks
+    def test_unknown_profile(self):
+        """
+        A volume of a profile without storage pools is created in the
+        default pool.
+        """
+        api = yield self.start()
+        volume = yield api.create_volume_with_profile(
+            uuid4(), SIZE, u"silver")
+        self.assertEqual(
+            self.inventory.volume(volume.blockdevice_id)['storagePoolId'],
+            self.inventory.storage_pool_id("default"))
+
+    def test_unsupported_version(self):
+        """
+        Starting against a gateway of an unsupported API version fails
+        with ``UnsupportedAPIVersion``.
+        """
+        self.patch(simulator, 'SIMULATED_API_VERSION', u"9.9")
+        return self.assertFailure(self.start(), UnsupportedAPIVersion)
@@ -0,0 +1,176 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.gateway``.
+"""
+
+from requests import Session
+from requests.exceptions import SSLError
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .gateway import (
+    ScaleIOGatewaySession, TOKEN_IDLE_TIMEOUT, TOKEN_MAX_AGE
+)
+
+
+class FakeClock(object):
+    """
+    A clock that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeScaleIOClient(object):
+    """
+    The parts of ``scaleiopy.ScaleIO`` used by the session.
+    """
+    def __init__(self):
+        self._session = Session()
+        self.logins = 0
+
+    def _login(self):
+        self.logins += 1
+
+    def respond(self, status_code):
+        """
+        Pretend the gateway answered a request with ``status_code``.
+        """
+        for hook in self._session.hooks['response']:
+            hook(FakeResponse(status_code))
+
+
+class ScaleIOGatewaySessionTests(SynchronousTestCase):
+    """
+    Tests for ``ScaleIOGatewaySession``.
+    """
+    def setUp(self):
+        self.clock = FakeClock()
+        self.client = FakeScaleIOClient()
+        self.session = ScaleIOGatewaySession(self.client, clock=self.clock)
+
+    def test_token_reused(self):
+        """
+        Consecutive calls log in only once.
+        """
+        for _ in range(3):
+            self.session.call(self.client.respond, 200)
+        self.assertEqual(self.client.logins, 1)
+
+    def test_client_token_adopted(self):
+        """
+        The token of a client that already logged in is used without
+        logging in again.
+        """
+        self.client._logged_in = True
+        session = ScaleIOGatewaySession(self.client, clock=self.clock)
+        session.call(self.client.respond, 200)
+        self.assertEqual(self.client.logins, 0)
+
+    def test_idle_token_renewed(self):
+        """
+        A token left unused for the idle timeout is renewed.
+        """
+        self.session.call(self.client.respond, 200)
+        self.clock.now += TOKEN_IDLE_TIMEOUT
+        self.session.call(self.client.respond, 200)
+        self.assertEqual(self.client.logins, 2)
+
+    def test_old_token_renewed(self):
+        """
+        A token is renewed once it reaches its maximum age even if it
+        is used constantly.
+        """
+        self.session.call(self.client.respond, 200)
+        for _ in range(TOKEN_MAX_AGE // 60):
+            self.clock.now += 60
+            self.client.respond(200)
+        self.session.call(self.client.respond, 200)
+        self.assertEqual(self.client.logins, 2)
+
+    def test_rejected_token_retried(self):
+        """
+        A call the gateway answers with 401 is retried once after
+        logging in again.
+        """
+        responses = [401, 200]
+
+        def operation():
+            status = responses.pop(0)
+            self.client.respond(status)
+            if status == 401:
+                raise RuntimeError("unauthorized")
+            return status
+
+        self.assertEqual(
+            (self.session.call(operation), self.client.logins),
+            (200, 2))
+
+    def test_ssl_error_retried(self):
+        """
+        A call failing with an SSL error is retried once after
+        logging in again.
+        """
+        errors = [SSLError("bad record mac")]
+
+        def operation():
+            if errors:
+                raise errors.pop()
+            return "ok"
+
+        self.assertEqual(
+            (self.session.call(operation), self.client.logins),
+            ("ok", 2))
+
+    def test_client_error_retried(self):
+        """
+        A call failing with the ``RuntimeError`` ``scaleiopy`` wraps
+        connection errors in is retried once after logging in again.
+        """
+        errors = [RuntimeError("Communication error with ScaleIO gateway")]
+
+        def operation():
+            if errors:
+                raise errors.pop()
+            return "ok"
+
+        self.assertEqual(
+            (self.session.call(operation), self.client.logins),
+            ("ok", 2))
+
+    def test_call_once_not_retried(self):
+        """
+        ``call_once`` raises failed requests without a retry, and the
+        next call logs in again.
+        """
+        calls = []
+
+        def operation():
+            calls.append(None)
+            raise SSLError("bad record mac")
+
+        self.assertRaises(SSLError, self.session.call_once, operation)
+        self.session.call(self.client.respond, 200)
+        self.assertEqual((len(calls), self.client.logins), (1, 2))
+
+    def test_other_error_keeps_token(self):
+        """
+        Other errors are raised without a retry and keep the token.
+        """
+        def operation():
+            raise KeyError("volume")
+
+        self.session.call(self.client.respond, 200)
+        self.assertRaises(KeyError, self.session.call, operation)
+        self.session.call(self.client.respond, 200)
+        self.assertEqual(self.client.logins, 1)
@@ -0,0 +1,109 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for listing the volumes of ``EMCScaleIOBlockDeviceAPI`` across
+storage pools, against the gateway simulator.
+"""
+
+from uuid import uuid4
+
+from bitmath import GiB
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .emc_sio import POOL_DISCOVERY_INTERVAL
+from .simulator import GatewayInventory, GatewaySimulator
+from .testtools_emc_sio import simulated_node_api
+
+SIZE = int(GiB(8).to_Byte().value)
+
+ALL_VOLUMES = "GET ^/api/types/(Volume|Sdc|ProtectionDomain|StoragePool)" \
+    "/instances$"
+POOL_VOLUMES = "GET ^/api/instances/StoragePool::(\\w+)" \
+    "/relationships/Volume$"
+
+
+class ListVolumesTests(SynchronousTestCase):
+    """
+    Tests for ``EMCScaleIOBlockDeviceAPI.list_volumes`` with volumes in
+    storage pools the node is not configured with.
+    """
+    def setUp(self):
+        self.inventory = GatewayInventory(
+            protection_domains={"default": ["default", "gold"]})
+        self.simulator = GatewaySimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.cluster_id = uuid4()
+        self.gold = simulated_node_api(
+            self.simulator, self.cluster_id,
+            profiles={u'gold': {'storage_pools': [{'storage_pool': 'gold'}]}})
+        self.node = simulated_node_api(self.simulator, self.cluster_id)
+        self.now = 0
+        self.node._clock = lambda: self.now
+
+    def list_volumes(self):
+        """
+        :return tuple: The ids of the volumes listed by the node, and the
+            requests made to list them, by endpoint.
+        """
+        before = dict(self.simulator.requests)
+        volumes = self.node.list_volumes()
+        return (
+            sorted(volume.blockdevice_id for volume in volumes),
+            dict((key, count - before.get(key, 0))
+                 for key, count in self.simulator.requests.items()
+                 if count != before.get(key, 0)))
+
+    def test_unconfigured_pool(self):
+        """
+        Volumes of the cluster in a pool the node is not configured with
+        are listed, and those of other clusters are not.
+        """
+        volume = self.gold.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        other = simulated_node_api(
+            self.simulator, uuid4(),
+            profiles={u'gold': {'storage_pools': [{'storage_pool': 'gold'}]}})
+        other.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        other.create_volume(uuid4(), SIZE)
+        self.assertEqual(self.list_volumes(),
+                         ([volume.blockdevice_id], {ALL_VOLUMES: 1}))
+
+    def test_known_pools(self):
+        """
+        Until ``POOL_DISCOVERY_INTERVAL`` passes, only the volumes of the
+        configured pools and of the pools found holding volumes of the
+        cluster are fetched.
+        """
+        volume = self.gold.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        self.list_volumes()
+        added = self.gold.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        self.now += POOL_DISCOVERY_INTERVAL - 1
+        self.assertEqual(
+            self.list_volumes(),
+            (sorted([volume.blockdevice_id, added.blockdevice_id]),
+             {POOL_VOLUMES: 2}))
+
+    def test_discovery(self):
+        """
+        Once ``POOL_DISCOVERY_INTERVAL`` passes, volumes of the cluster
+        in pools that were not known to hold any are found again.
+        """
+        self.list_volumes()
+        volume = self.gold.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        missed, _ = self.list_volumes()
+        self.now += POOL_DISCOVERY_INTERVAL
+        self.assertEqual((missed, self.list_volumes()),
+                         ([], ([volume.blockdevice_id], {ALL_VOLUMES: 1})))
+
+    def test_created_pool(self):
+        """
+        Volumes the node created are listed from their pool after the
+        pool is removed from its configuration.
+        """
+        self.gold._clock = lambda: self.now
+        self.gold.list_volumes()
+        volume = self.gold.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        self.gold._profiles = {}
+        self.assertEqual(self.gold.list_volumes(), [volume])
@@ -0,0 +1,103 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for looking up single volumes of ``EMCScaleIOBlockDeviceAPI``,
+against the gateway simulator.
+"""
+
+from uuid import uuid4
+
+from bitmath import GiB
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from flocker.node.agents.blockdevice import UnknownVolume
+
+from .gateway import ScaleIOGatewayError
+from .simulator import GatewayError, GatewayInventory, GatewaySimulator
+from .testtools_emc_sio import simulated_node_api
+
+SIZE = int(GiB(8).to_Byte().value)
+
+
+class LookupTests(SynchronousTestCase):
+    """
+    Tests for ``EMCScaleIOBlockDeviceAPI._lookup``.
+    """
+    def setUp(self):
+        self.inventory = GatewayInventory()
+        self.simulator = GatewaySimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.node = simulated_node_api(self.simulator, uuid4())
+        self.volume = self.node.create_volume(uuid4(), SIZE)
+
+    def lookup(self, blockdevice_id):
+        """
+        :return tuple: The result of ``_lookup`` and the requests made
+            for it, by endpoint.
+        """
+        before = dict(self.simulator.requests)
+        result = self.node._gateway.call(self.node._lookup, blockdevice_id)
+        return result, dict(
+            (key, count - before.get(key, 0))
+            for key, count in self.simulator.requests.items()
+            if count != before.get(key, 0))
+
+    def test_found(self):
+        """
+        A volume of the cluster is fetched by id with a single request.
+        """
+        (sio_volume, volume), requests = self.lookup(
+            self.volume.blockdevice_id)
+        self.assertEqual(
+            (sio_volume.id, volume, requests),
+            (self.volume.blockdevice_id, self.volume,
+             {"GET ^/api/instances/Volume::(\\w+)$": 1}))
+
+    def test_found_attached(self):
+        """
+        A mapped volume is seen attached to the node it is mapped to.
+        """
+        self.node.attach_volume(self.volume.blockdevice_id,
+                                self.node.compute_instance_id())
+        (_, volume), _ = self.lookup(self.volume.blockdevice_id)
+        self.assertEqual(volume.attached_to,
+                         self.node.compute_instance_id())
+
+    def test_unknown_id(self):
+        """
+        A volume the gateway does not know raises ``UnknownVolume``.
+        """
+        self.assertRaises(UnknownVolume, self.lookup, u"00000000000000ff")
+
+    def test_not_a_scaleio_id(self):
+        """
+        An id that cannot be a ScaleIO id raises ``UnknownVolume``
+        without asking the gateway.
+        """
+        before = self.simulator.request_count()
+        self.assertRaises(UnknownVolume, self.lookup, u"not-a-volume")
+        self.assertEqual(self.simulator.request_count(), before)
+
+    def test_other_cluster(self):
+        """
+        A volume of another Flocker cluster raises ``UnknownVolume``.
+        """
+        other = simulated_node_api(self.simulator, uuid4())
+        volume = other.create_volume(uuid4(), SIZE)
+        self.assertRaises(UnknownVolume, self.lookup, volume.blockdevice_id)
+
+    def test_gateway_error(self):
+        """
+        Gateway errors other than an unknown volume are raised as they
+        are.
+        """
+        def fail(volume_id):
+            raise GatewayError(500, 1, "MDM is not reachable")
+        self.patch(self.inventory, 'volume', fail)
+        error = self.assertRaises(ScaleIOGatewayError, self.lookup,
+                                  self.volume.blockdevice_id)
+        self.assertEqual((error.status_code, error.error_code),
+                         (500, 1))
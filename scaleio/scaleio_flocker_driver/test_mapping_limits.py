@@ -0,0 +1,84 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for the IOPS and bandwidth limits of storage profiles, against the
+gateway simulator.
+"""
+
+from uuid import uuid4
+
+from bitmath import GiB
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .emc_sio import ConflictingMappingLimits
+from .gateway import ScaleIOGatewayError
+from .simulator import GatewayInventory, GatewaySimulator
+from .testtools_emc_sio import simulated_node_api
+
+SIZE = int(GiB(8).to_Byte().value)
+
+
+class MappingLimitsTests(SynchronousTestCase):
+    """
+    Tests for the ``iops_limit`` and ``bandwidth_limit`` of profiles.
+    """
+    def setUp(self):
+        self.inventory = GatewayInventory(
+            protection_domains={"default": ["default", "gold"]})
+        self.simulator = GatewaySimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+
+    def node(self, **profile):
+        profile['storage_pools'] = [{'storage_pool': 'gold'}]
+        return simulated_node_api(self.simulator, uuid4(),
+                                  profiles={u'gold': profile})
+
+    def test_profile_limits(self):
+        """
+        The limits of the profile are set on the mapping of its volumes.
+        """
+        node = self.node(iops_limit=500, bandwidth_limit=100)
+        volume = node.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        node.attach_volume(volume.blockdevice_id, node.compute_instance_id())
+        self.assertEqual(
+            node.mapping_limits(volume.blockdevice_id),
+            {node.compute_instance_id(): {'iops_limit': 500,
+                                          'bandwidth_limit': 100}})
+
+    def test_default_pool_unlimited(self):
+        """
+        Volumes of the default storage pool are mapped without limits.
+        """
+        node = self.node(iops_limit=500)
+        volume = node.create_volume(uuid4(), SIZE)
+        node.attach_volume(volume.blockdevice_id, node.compute_instance_id())
+        self.assertEqual(
+            node.mapping_limits(volume.blockdevice_id),
+            {node.compute_instance_id(): {'iops_limit': 0,
+                                          'bandwidth_limit': 0}})
+
+    def test_rejected_limits(self):
+        """
+        A volume is left unattached if its limits are rejected.
+        """
+        node = self.node(iops_limit=5)
+        volume = node.create_volume_with_profile(uuid4(), SIZE, u"gold")
+        self.assertRaises(ScaleIOGatewayError, node.attach_volume,
+                          volume.blockdevice_id, node.compute_instance_id())
+        self.assertEqual(
+            [v.attached_to for v in node.list_volumes()], [None])
+
+    def test_conflicting_limits(self):
+        """
+        Profiles sharing a storage pool cannot set different limits.
+        """
+        pools = [{'storage_pool': 'gold'}]
+        self.assertRaises(
+            ConflictingMappingLimits, simulated_node_api,
+            self.simulator, uuid4(),
+            profiles={u'gold': {'storage_pools': pools, 'iops_limit': 500},
+                      u'silver': {'storage_pools': pools,
+                                  'iops_limit': 100}})
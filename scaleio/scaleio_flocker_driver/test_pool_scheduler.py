@@ -0,0 +1,88 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.pool_scheduler``.
+"""
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .pool_scheduler import (
+    StoragePool, CapacityPoolScheduler, NoStoragePoolAvailable
+)
+
+
+class FakeGateway(object):
+    """
+    Answers storage pool statistics requests from a ``dict``.
+    """
+    def __init__(self, statistics):
+        self.statistics = statistics
+        self.requests = []
+
+    def request(self, method, uri, **kwargs):
+        self.requests.append((method, uri))
+        pool_id = uri.split('::')[1].split('/')[0]
+        return self.statistics[pool_id]
+
+
+def _pool(name):
+    return StoragePool(name=name, id=name, protection_domain="pd",
+                       protection_domain_id="pd")
+
+
+class CapacityPoolSchedulerTests(SynchronousTestCase):
+    """
+    Tests for ``CapacityPoolScheduler``.
+    """
+    def test_most_free(self):
+        """
+        The pool with the most capacity available for volume allocation
+        is selected.
+        """
+        gateway = FakeGateway({
+            "ssd1": {"capacityAvailableForVolumeAllocationInKb": 100},
+            "ssd2": {"capacityAvailableForVolumeAllocationInKb": 300},
+            "ssd3": {"capacityAvailableForVolumeAllocationInKb": 200},
+        })
+        pools = [_pool("ssd1"), _pool("ssd2"), _pool("ssd3")]
+        self.assertEqual(
+            CapacityPoolScheduler(gateway).filter_one(pools, 10), pools[1])
+
+    def test_unused_capacity(self):
+        """
+        The unused capacity is used if the gateway does not report the
+        capacity available for volume allocation.
+        """
+        gateway = FakeGateway({
+            "hdd1": {"unusedCapacityInKb": 500},
+            "hdd2": {"unusedCapacityInKb": 50},
+        })
+        pools = [_pool("hdd1"), _pool("hdd2")]
+        self.assertEqual(
+            CapacityPoolScheduler(gateway).filter_one(pools, 10), pools[0])
+
+    def test_full(self):
+        """
+        ``NoStoragePoolAvailable`` is raised if no pool can hold the
+        volume.
+        """
+        gateway = FakeGateway({
+            "ssd1": {"capacityAvailableForVolumeAllocationInKb": 5},
+            "ssd2": {"capacityAvailableForVolumeAllocationInKb": 8},
+        })
+        self.assertRaises(
+            NoStoragePoolAvailable,
+            CapacityPoolScheduler(gateway).filter_one,
+            [_pool("ssd1"), _pool("ssd2")], 10)
+
+    def test_single_pool(self):
+        """
+        A single candidate pool is used without fetching statistics.
+        """
+        gateway = FakeGateway({})
+        pool = _pool("default")
+        self.assertEqual(
+            (CapacityPoolScheduler(gateway).filter_one([pool], 10),
+             gateway.requests),
+            (pool, []))
@@ -0,0 +1,82 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.sdc``.
+"""
+
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SynchronousTestCase
+
+from .sdc import local_volume_mappings, parse_query_vols, query_guid
+
+QUERY_VOLS = (
+    "Retrieved 2 volume(s)\n"
+    "VOL-ID aea92e8700000000 MDM-ID 62a34bc20b360b1c\n"
+    "VOL-ID aea92e8800000001 MDM-ID 62a34bc20b360b1c\n"
+)
+
+
+class ParseQueryVolsTests(SynchronousTestCase):
+    """
+    Tests for ``parse_query_vols``.
+    """
+    def test_volumes(self):
+        """
+        The MDM id of every listed volume is returned by volume id.
+        """
+        self.assertEqual(
+            parse_query_vols(QUERY_VOLS),
+            {u"aea92e8700000000": u"62a34bc20b360b1c",
+             u"aea92e8800000001": u"62a34bc20b360b1c"})
+
+    def test_no_volumes(self):
+        """
+        No volumes are mapped if none are listed.
+        """
+        self.assertEqual(parse_query_vols("Retrieved 0 volume(s)\n"), {})
+
+
+class LocalVolumeMappingsTests(SynchronousTestCase):
+    """
+    Tests for ``local_volume_mappings`` and ``query_guid``.
+    """
+    def drv_cfg(self, output, status=0):
+        """
+        :return str: The path of a fake ``drv_cfg`` printing ``output``
+            and exiting with ``status``.
+        """
+        script = FilePath(self.mktemp())
+        script.setContent(
+            "#!/bin/sh\ncat <<'EOF'\n%sEOF\nexit %d\n" % (output, status))
+        script.chmod(0o755)
+        return script.path
+
+    def test_mappings(self):
+        """
+        The volumes listed by ``drv_cfg --query_vols`` are returned.
+        """
+        self.assertEqual(
+            sorted(local_volume_mappings(self.drv_cfg(QUERY_VOLS))),
+            [u"aea92e8700000000", u"aea92e8800000001"])
+
+    def test_failure(self):
+        """
+        ``None`` is returned if ``drv_cfg`` fails.
+        """
+        self.assertIs(
+            local_volume_mappings(self.drv_cfg("Failed\n", status=1)),
+            None)
+
+    def test_missing(self):
+        """
+        ``None`` is returned if ``drv_cfg`` is not installed.
+        """
+        self.assertIs(local_volume_mappings(self.mktemp()), None)
+
+    def test_guid(self):
+        """
+        ``query_guid`` returns the lower case SDC GUID.
+        """
+        self.assertEqual(
+            query_guid(self.drv_cfg("ABCD-EF01\n")), u"abcd-ef01")
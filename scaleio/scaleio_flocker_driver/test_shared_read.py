@@ -0,0 +1,116 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for the shared read mode of ``EMCScaleIOBlockDeviceAPI``, against
+the gateway simulator.
+"""
+
+from uuid import uuid4
+
+from bitmath import GiB
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from flocker.node.agents.blockdevice import (
+    AlreadyAttachedVolume, UnattachedVolume
+)
+
+from .gateway import ScaleIOGatewayError
+from .simulator import (
+    ERROR_SDC_NOT_FOUND, GatewayInventory, GatewaySimulator
+)
+from .testtools_emc_sio import simulated_node_api
+
+SIZE = int(GiB(8).to_Byte().value)
+
+
+class SharedReadTests(SynchronousTestCase):
+    """
+    Tests for ``EMCScaleIOBlockDeviceAPI`` with ``shared_read``.
+    """
+    def setUp(self):
+        self.inventory = GatewayInventory()
+        simulator = GatewaySimulator(self.inventory)
+        simulator.start()
+        self.addCleanup(simulator.stop)
+        cluster_id = uuid4()
+        self.nodes = [
+            simulated_node_api(simulator, cluster_id, shared_read=True)
+            for _ in range(3)]
+        self.volume = self.nodes[0].create_volume(uuid4(), SIZE)
+
+    def attach(self, node):
+        return node.attach_volume(self.volume.blockdevice_id,
+                                  node.compute_instance_id())
+
+    def test_attach_several_nodes(self):
+        """
+        A volume can be attached to several nodes, each seeing it
+        attached to itself.
+        """
+        for node in self.nodes:
+            self.attach(node)
+        self.assertEqual(
+            ([node.list_volumes()[0].attached_to for node in self.nodes],
+             sorted(self.nodes[0].list_attachments(
+                 self.volume.blockdevice_id))),
+            ([node.compute_instance_id() for node in self.nodes],
+             sorted(node.compute_instance_id() for node in self.nodes)))
+
+    def test_already_attached_here(self):
+        """
+        Attaching a volume twice to the same node fails with
+        ``AlreadyAttachedVolume``.
+        """
+        self.attach(self.nodes[0])
+        self.attach(self.nodes[1])
+        self.assertRaises(AlreadyAttachedVolume, self.attach, self.nodes[1])
+
+    def test_attached_meanwhile(self):
+        """
+        Attaching a volume that got mapped to the node since it was
+        looked up fails with ``AlreadyAttachedVolume``.
+        """
+        node = self.nodes[1]
+        stale = node._gateway.call(node._lookup, self.volume.blockdevice_id)
+        self.attach(node)
+        self.patch(node, '_lookup', lambda blockdevice_id: stale)
+        self.assertRaises(AlreadyAttachedVolume, self.attach, node)
+
+    def test_mapping_error(self):
+        """
+        Other gateway errors mapping a volume are raised as they are.
+        """
+        node = self.nodes[1]
+        sdc = node._client.get_sdc_by_guid(
+            node.compute_instance_id().upper())
+        sdc.id = u"00000000000000ff"
+        self.patch(node._client, 'get_sdc_by_guid', lambda guid: sdc)
+        error = self.assertRaises(ScaleIOGatewayError, self.attach, node)
+        self.assertEqual(error.error_code, ERROR_SDC_NOT_FOUND)
+
+    def test_detach_own_mapping(self):
+        """
+        Detaching a volume only removes the mapping to the detaching
+        node.
+        """
+        for node in self.nodes:
+            self.attach(node)
+        self.nodes[1].detach_volume(self.volume.blockdevice_id)
+        self.assertEqual(
+            (sorted(self.nodes[1].list_attachments(
+                self.volume.blockdevice_id)),
+             self.nodes[1].list_volumes()[0].attached_to),
+            (sorted([self.nodes[0].compute_instance_id(),
+                     self.nodes[2].compute_instance_id()]),
+             self.nodes[0].compute_instance_id()))
+
+    def test_detach_not_attached_here(self):
+        """
+        Detaching a volume only attached to other nodes fails with
+        ``UnattachedVolume``.
+        """
+        self.attach(self.nodes[0])
+        self.assertRaises(UnattachedVolume, self.nodes[1].detach_volume,
+                          self.volume.blockdevice_id)
@@ -0,0 +1,117 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.simulator``.
+"""
+
+import requests
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .simulator import (
+    GatewayInventory, GatewaySimulator, SIMULATED_API_VERSION,
+    ERROR_VOLUME_NOT_FOUND, ERROR_SINGLE_SDC_MAPPING
+)
+
+
+class GatewaySimulatorTests(SynchronousTestCase):
+    """
+    Tests for ``GatewaySimulator``.
+    """
+    def setUp(self):
+        self.inventory = GatewayInventory()
+        self.pool_id = self.inventory.storage_pool_id("default")
+        self.simulator = GatewaySimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+        token = self.session.get(
+            self.simulator.url + "/login",
+            auth=(self.simulator.username, self.simulator.password)).json()
+        self.session.auth = ('', token)
+
+    def request(self, method, uri, **kwargs):
+        return self.session.request(
+            method, "%s/%s" % (self.simulator.url, uri), **kwargs)
+
+    def test_version(self):
+        """
+        The version is answered to the user credentials.
+        """
+        self.assertEqual(
+            requests.get(self.simulator.url + "/version",
+                         auth=(self.simulator.username,
+                               self.simulator.password)).json(),
+            SIMULATED_API_VERSION)
+
+    def test_unauthorized(self):
+        """
+        Requests without a token issued by the simulator are refused.
+        """
+        self.assertEqual(
+            requests.get(self.simulator.url + "/types/Volume/instances",
+                         auth=('', 'forged')).status_code,
+            401)
+
+    def test_create_volume(self):
+        """
+        A created volume can be fetched by its id and is listed in its
+        storage pool.
+        """
+        volume_id = self.request('POST', 'types/Volume/instances', json={
+            'protectionDomainId': 'pd', 'storagePoolId': self.pool_id,
+            'volumeSizeInKb': '8388608', 'name': 'fvolume',
+            'volumeType': 'ThinProvisioned'}).json()['id']
+        volume = self.request('GET', 'instances/Volume::' + volume_id).json()
+        pool_volumes = self.request(
+            'GET', 'instances/StoragePool::%s/relationships/Volume'
+            % self.pool_id).json()
+        self.assertEqual(
+            ((volume['name'], volume['sizeInKb']),
+             [v['id'] for v in pool_volumes]),
+            (('fvolume', 8388608), [volume_id]))
+
+    def test_unknown_volume(self):
+        """
+        Unknown volumes are answered with the gateway's error code.
+        """
+        response = self.request('GET', 'instances/Volume::0000000000000bad')
+        self.assertEqual(
+            (response.status_code, response.json()['errorCode']),
+            (500, ERROR_VOLUME_NOT_FOUND))
+
+    def test_single_mapping(self):
+        """
+        A volume is only mapped to a second SDC when multiple mappings
+        are allowed.
+        """
+        volume_id = self.inventory.add_volume(
+            'fvolume', 8388608, self.pool_id)['id']
+        sdcs = [self.inventory.add_sdc()['id'] for _ in range(3)]
+        uri = 'instances/Volume::%s/action/addMappedSdc' % volume_id
+        statuses = [
+            self.request('POST', uri, json={
+                'sdcId': sdcs[0], 'allowMultipleMappings': 'FALSE'}),
+            self.request('POST', uri, json={
+                'sdcId': sdcs[1], 'allowMultipleMappings': 'FALSE'}),
+            self.request('POST', uri, json={
+                'sdcId': sdcs[2], 'allowMultipleMappings': 'TRUE'}),
+        ]
+        self.assertEqual(
+            ([r.status_code for r in statuses],
+             statuses[1].json()['errorCode'],
+             [m['sdcId'] for m in
+              self.inventory.volumes[volume_id]['mappedSdcInfo']]),
+            ([200, 500, 200], ERROR_SINGLE_SDC_MAPPING,
+             [sdcs[0], sdcs[2]]))
+
+    def test_request_count(self):
+        """
+        Every answered request is counted.
+        """
+        before = self.simulator.request_count()
+        self.request('GET', 'types/Sdc/instances')
+        self.request('GET', 'types/ProtectionDomain/instances')
+        self.assertEqual(self.simulator.request_count() - before, 2)
@@ -0,0 +1,208 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.startup_cache``.
+"""
+
+from uuid import uuid4
+
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SynchronousTestCase
+
+from . import emc_sio
+from .pool_scheduler import StoragePool
+from .simulator import GatewayInventory, GatewaySimulator
+from .startup_cache import StartupCache, verify_in_background
+from .testtools_emc_sio import simulated_node_api
+
+GATEWAY = "https://gateway/api"
+
+POOL = StoragePool(name="default", id=u"0000000000000003",
+                   protection_domain="default",
+                   protection_domain_id=u"0000000000000002")
+
+
+class StartupCacheTests(SynchronousTestCase):
+    """
+    Tests for ``StartupCache``.
+    """
+    def setUp(self):
+        self.path = self.mktemp()
+
+    def test_empty(self):
+        """
+        Nothing is known without a state file.
+        """
+        cache = StartupCache(self.path)
+        self.assertEqual(
+            (cache.sdc_guid(), cache.api_version(GATEWAY),
+             cache.storage_pool(GATEWAY, "default", "default")),
+            (None, None, None))
+
+    def test_corrupt(self):
+        """
+        Nothing is known from a state file that cannot be decoded.
+        """
+        FilePath(self.path).setContent("{")
+        self.assertIdentical(StartupCache(self.path).sdc_guid(), None)
+
+    def test_persisted(self):
+        """
+        What is set is known to the next ``StartupCache`` of the same
+        state file.
+        """
+        cache = StartupCache(self.path)
+        cache.set_sdc_guid(u"abcd-ef01")
+        cache.set_api_version(GATEWAY, "1.1")
+        cache.set_storage_pools(GATEWAY, [POOL])
+        cache = StartupCache(self.path)
+        self.assertEqual(
+            (cache.sdc_guid(), cache.api_version(GATEWAY),
+             cache.storage_pool(GATEWAY, "default", "default")),
+            (u"abcd-ef01", "1.1", POOL))
+
+    def test_unchanged_not_saved(self):
+        """
+        The state file is not written again when nothing changed.
+        """
+        cache = StartupCache(self.path)
+        cache.set_sdc_guid(u"abcd-ef01")
+        FilePath(self.path).remove()
+        cache.set_sdc_guid(u"abcd-ef01")
+        self.assertFalse(FilePath(self.path).exists())
+
+    def test_forget(self):
+        """
+        ``forget`` drops what is known about a gateway only.
+        """
+        cache = StartupCache(self.path)
+        cache.set_sdc_guid(u"abcd-ef01")
+        cache.set_api_version(GATEWAY, "1.1")
+        cache.forget(GATEWAY)
+        cache = StartupCache(self.path)
+        self.assertEqual((cache.sdc_guid(), cache.api_version(GATEWAY)),
+                         (u"abcd-ef01", None))
+
+    def test_verify_in_background(self):
+        """
+        ``verify_in_background`` runs the check in a thread and does not
+        let its failure escape.
+        """
+        calls = []
+
+        def check(value):
+            calls.append(value)
+            raise RuntimeError("outdated")
+        verify_in_background("value", check, 1).join()
+        self.assertEqual(calls, [1])
+
+
+class CachedStartupTests(SynchronousTestCase):
+    """
+    Tests for starting ``EMCScaleIOBlockDeviceAPI`` with a startup
+    cache.
+    """
+    def setUp(self):
+        self.inventory = GatewayInventory()
+        self.simulator = GatewaySimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.cluster_id = uuid4()
+        self.cache = StartupCache(self.mktemp())
+        self.checks = []
+        self.patch(emc_sio, 'verify_in_background',
+                   lambda name, check, *args, **kwargs:
+                   self.checks.append((name, check, args, kwargs)))
+
+    def start(self, **kwargs):
+        """
+        :param kwargs: Further ``EMCScaleIOBlockDeviceAPI`` arguments.
+        :return tuple: A new driver and the number of gateway requests
+            made to start it.
+        """
+        before = self.simulator.request_count()
+        api = simulated_node_api(self.simulator, self.cluster_id,
+                                 startup_cache=self.cache, **kwargs)
+        return api, self.simulator.request_count() - before
+
+    def outdate_storage_pool(self, api):
+        """
+        Cache another id for the default storage pool of ``api``.
+        """
+        pool = api._default_pool
+        self.cache.set_storage_pools(api._client._api_url, [StoragePool(
+            name=pool.name, id=u"00000000000000ff",
+            protection_domain=pool.protection_domain,
+            protection_domain_id=pool.protection_domain_id)])
+
+    def verify_storage_pools(self):
+        """
+        Run the background checks of the storage pools.
+        """
+        for name, check, args, kwargs in self.checks:
+            if name == "Storage Pools":
+                check(*args, **kwargs)
+
+    def test_restart(self):
+        """
+        A restart skips the version check and the protection domain and
+        storage pool lookups, and checks them in the background instead.
+        """
+        first = self.start()[1]
+        second = self.start()[1]
+        # The version check, and the protection domain and storage pool
+        # listings of both ``scaleio_client`` and the driver.
+        self.assertEqual(
+            (first - second, [name for name, _, _, _ in self.checks]),
+            (5, ["API Version", "Storage Pools"]))
+
+    def test_outdated_storage_pool(self):
+        """
+        A storage pool id that changed since it was cached is corrected
+        by the background check.
+        """
+        api = self.start()[0]
+        pool = api._default_pool
+        self.outdate_storage_pool(api)
+        api = self.start()[0]
+        stale = api._default_pool.id
+        self.verify_storage_pools()
+        self.assertEqual(
+            (stale, api._default_pool.id,
+             self.cache.storage_pool(api._client._api_url, "default",
+                                     "default").id),
+            (u"00000000000000ff", pool.id, pool.id))
+
+    def test_outdated_warm_pool(self):
+        """
+        The warm pool is moved to the storage pool the background check
+        corrected the default pool to.
+        """
+        api = self.start()[0]
+        pool = api._default_pool
+        self.outdate_storage_pool(api)
+        api = self.start(warm_pool={8: 1})[0]
+        api._warm_pool.stop()
+        stale = api._warm_pool.pool.id
+        self.verify_storage_pools()
+        self.assertEqual((stale, api._warm_pool.pool),
+                         (u"00000000000000ff", pool))
+
+    def test_checks_start_last(self):
+        """
+        The background checks start once the driver is set up, so they
+        neither find it half set up nor have their corrections
+        overwritten by it.
+        """
+        self.cache.set_sdc_guid(u"abcd-ef01")
+        self.start()
+        started = []
+        self.patch(emc_sio, 'verify_in_background',
+                   lambda name, check, *args, **kwargs: started.append(
+                       (name, hasattr(getattr(check, '__self__', None),
+                                      '_warm_pool'))))
+        self.start()
+        self.assertEqual(started, [("API Version", False),
+                                   ("SDC GUID", True),
+                                   ("Storage Pools", True)])
@@ -0,0 +1,154 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.transport``.
+"""
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .transport import (
+    GatewayStatistics, ScaleIOHTTPSession, endpoint_name, percentile
+)
+
+
+class FakeClock(object):
+    """
+    A clock that moves one second every time it is read.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class FakeAdapter(BaseAdapter):
+    """
+    Answers requests with the given statuses, raising
+    ``ConnectionError`` for ``None``.
+    """
+    def __init__(self, statuses):
+        BaseAdapter.__init__(self)
+        self.statuses = statuses
+
+    def send(self, request, **kwargs):
+        status = self.statuses.pop(0)
+        if status is None:
+            raise ConnectionError("connection reset")
+        response = Response()
+        response.status_code = status
+        response.request = request
+        response.url = request.url
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+
+class EndpointNameTests(SynchronousTestCase):
+    """
+    Tests for ``endpoint_name``.
+    """
+    def test_object_id_removed(self):
+        """
+        Object ids and the query string are not part of the endpoint.
+        """
+        self.assertEqual(
+            endpoint_name(
+                'POST', 'https://gw/api/instances/Volume::abcd0123/'
+                'action/setVolumeSize?x=1'),
+            'POST instances/Volume::{id}/action/setVolumeSize')
+
+
+class PercentileTests(SynchronousTestCase):
+    """
+    Tests for ``percentile``.
+    """
+    def test_nearest_rank(self):
+        """
+        The nearest-rank percentile of the samples is returned.
+        """
+        samples = range(1, 101)
+        self.assertEqual(
+            [percentile(samples, p) for p in (50, 90, 99, 100)],
+            [50, 90, 99, 100])
+
+    def test_no_samples(self):
+        """
+        There is no percentile of no samples.
+        """
+        self.assertIs(percentile([], 50), None)
+
+
+class GatewayStatisticsTests(SynchronousTestCase):
+    """
+    Tests for ``GatewayStatistics``.
+    """
+    def test_snapshot(self):
+        """
+        Requests, errors and latencies are reported per endpoint and in
+        total.
+        """
+        statistics = GatewayStatistics()
+        statistics.record('GET a', 1.0)
+        statistics.record('GET a', 3.0, failed=True)
+        statistics.record('GET b', 2.0)
+        snapshot = statistics.snapshot()
+        self.assertEqual(
+            (snapshot['GET a'], snapshot['total']),
+            ({'requests': 2, 'errors': 1,
+              'p50': 1.0, 'p90': 3.0, 'p99': 3.0},
+             {'requests': 3, 'errors': 1,
+              'p50': 2.0, 'p90': 3.0, 'p99': 3.0}))
+
+    def test_samples_bounded(self):
+        """
+        Only the most recent latencies are kept.
+        """
+        statistics = GatewayStatistics(samples=2)
+        for latency in (10.0, 1.0, 1.0):
+            statistics.record('GET a', latency)
+        snapshot = statistics.snapshot()['GET a']
+        self.assertEqual((snapshot['requests'], snapshot['p99']), (3, 1.0))
+
+
+class ScaleIOHTTPSessionTests(SynchronousTestCase):
+    """
+    Tests for ``ScaleIOHTTPSession``.
+    """
+    def setUp(self):
+        self.session = ScaleIOHTTPSession(pool_size=2, clock=FakeClock())
+
+    def test_pool_size(self):
+        """
+        The connection pools hold ``pool_size`` connections.
+        """
+        self.assertEqual(
+            [self.session.get_adapter(url)._pool_maxsize
+             for url in ('https://gw/api', 'http://gw/api')],
+            [2, 2])
+
+    def test_requests_recorded(self):
+        """
+        Responses, error responses and failed connections are all
+        recorded.
+        """
+        self.session.mount('https://', FakeAdapter([200, 401, None]))
+        self.session.get('https://gw/api/instances/Sdc::1')
+        self.session.get('https://gw/api/instances/Sdc::2')
+        self.assertRaises(ConnectionError, self.session.get,
+                          'https://gw/api/types/Sdc/instances')
+        snapshot = self.session.statistics.snapshot()
+        self.assertEqual(
+            ((snapshot['GET instances/Sdc::{id}']['requests'],
+              snapshot['GET instances/Sdc::{id}']['errors']),
+             (snapshot['total']['requests'], snapshot['total']['errors'],
+              snapshot['total']['p50'])),
+            ((2, 1), (3, 2, 1.0)))
@@ -0,0 +1,180 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``scaleio_flocker_driver.warm_pool``.
+"""
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from .gateway import ScaleIOGatewayError
+from .pool_scheduler import StoragePool
+from .warm_pool import (
+    InvalidWarmPoolSize, WarmVolumePool, warm_volume_prefix
+)
+
+GIB_IN_KIB = 1024 * 1024
+
+
+class FakeGateway(object):
+    """
+    Keeps volumes in a ``dict`` and answers the requests made by
+    ``WarmVolumePool``.
+    """
+    def __init__(self, volumes=()):
+        self.volumes = dict((volume['id'], volume) for volume in volumes)
+        self.created = 0
+        self.error = None
+
+    def call(self, operation, *args, **kwargs):
+        return operation(*args, **kwargs)
+
+    call_once = call
+
+    def create_volume(self, pool, name, size_kb):
+        self.created += 1
+        volume_id = "%016x" % (len(self.volumes) + 1)
+        self.volumes[volume_id] = {
+            'id': volume_id, 'name': name, 'sizeInKb': size_kb,
+            'mappedSdcInfo': None, 'storagePoolId': pool.id}
+        return volume_id
+
+    def request(self, method, uri, **kwargs):
+        if uri.endswith('/relationships/Volume'):
+            pool_id = uri.split('::')[1].split('/')[0]
+            return [volume for volume in self.volumes.values()
+                    if volume.get('storagePoolId', POOL.id) == pool_id]
+        volume_id = uri.split('::')[1].split('/')[0]
+        if self.error is not None:
+            raise self.error
+        if volume_id not in self.volumes:
+            raise ScaleIOGatewayError(500, 79, "Could not find the volume")
+        self.volumes[volume_id]['name'] = kwargs['json']['newName']
+
+
+POOL = StoragePool(name="default", id="pool1", protection_domain="pd",
+                   protection_domain_id="pd1")
+
+OTHER_POOL = StoragePool(name="other", id="pool2", protection_domain="pd",
+                         protection_domain_id="pd1")
+
+PREFIX = warm_volume_prefix("0123456789abcdef", "abcd-ef01-2345")
+
+
+class WarmVolumePoolTests(SynchronousTestCase):
+    """
+    Tests for ``WarmVolumePool``.
+    """
+    def test_prefix(self):
+        """
+        Pool volume names carry the cluster and the owning node and do
+        not start like Flocker volume names.
+        """
+        self.assertEqual(PREFIX, "w01234567abcdef01")
+
+    def test_invalid_size(self):
+        """
+        Sizes which are not a multiple of the allocation granularity
+        are refused.
+        """
+        self.assertRaises(InvalidWarmPoolSize, WarmVolumePool,
+                          FakeGateway(), POOL, PREFIX, {12: 1})
+
+    def test_refill(self):
+        """
+        ``refill`` creates the missing volumes of each size, with names
+        of at most 31 characters.
+        """
+        gateway = FakeGateway()
+        pool = WarmVolumePool(gateway, POOL, PREFIX, {8: 2, 16: 1})
+        pool.refill()
+        pool.refill()
+        self.assertEqual(
+            (pool.available(), gateway.created,
+             set(len(v['name']) for v in gateway.volumes.values())),
+            ({8 * GIB_IN_KIB: 2, 16 * GIB_IN_KIB: 1}, 3, set([31])))
+
+    def test_claim(self):
+        """
+        ``claim`` renames a pool volume of the requested size.
+        """
+        gateway = FakeGateway()
+        pool = WarmVolumePool(gateway, POOL, PREFIX, {8: 1})
+        pool.refill()
+        volume_id = pool.claim(8 * GIB_IN_KIB, "fdataset")
+        self.assertEqual(
+            (gateway.volumes[volume_id]['name'], pool.available()),
+            ("fdataset", {8 * GIB_IN_KIB: 0}))
+
+    def test_claim_empty(self):
+        """
+        ``claim`` returns ``None`` when no volume of the size is left.
+        """
+        pool = WarmVolumePool(FakeGateway(), POOL, PREFIX, {8: 1})
+        self.assertEqual(
+            (pool.claim(8 * GIB_IN_KIB, "f1"),
+             pool.claim(16 * GIB_IN_KIB, "f2")),
+            (None, None))
+
+    def test_claim_skips_deleted(self):
+        """
+        A pool volume deleted behind the pool's back is skipped.
+        """
+        gateway = FakeGateway()
+        pool = WarmVolumePool(gateway, POOL, PREFIX, {8: 2})
+        pool.refill()
+        del gateway.volumes["%016x" % 2]
+        self.assertEqual(pool.claim(8 * GIB_IN_KIB, "f1"), "%016x" % 1)
+
+    def test_claim_error(self):
+        """
+        Other errors renaming a pool volume are raised, and the volume
+        stays in the pool.
+        """
+        gateway = FakeGateway()
+        pool = WarmVolumePool(gateway, POOL, PREFIX, {8: 2})
+        pool.refill()
+        gateway.error = ScaleIOGatewayError(500, 6, "Name already in use")
+        self.assertRaises(ScaleIOGatewayError, pool.claim,
+                          8 * GIB_IN_KIB, "f1")
+        self.assertEqual(pool.available(), {8 * GIB_IN_KIB: 2})
+
+    def test_load(self):
+        """
+        ``load`` takes over the unmapped volumes with the pool prefix
+        and a configured size only.
+        """
+        gateway = FakeGateway([
+            {'id': '1', 'name': PREFIX + 'a', 'sizeInKb': 8 * GIB_IN_KIB,
+             'mappedSdcInfo': None},
+            {'id': '2', 'name': PREFIX + 'b', 'sizeInKb': 8 * GIB_IN_KIB,
+             'mappedSdcInfo': [{'sdcId': 'x'}]},
+            {'id': '3', 'name': PREFIX + 'c', 'sizeInKb': 24 * GIB_IN_KIB,
+             'mappedSdcInfo': None},
+            {'id': '4', 'name': 'fother', 'sizeInKb': 8 * GIB_IN_KIB,
+             'mappedSdcInfo': None},
+        ])
+        pool = WarmVolumePool(gateway, POOL, PREFIX, {8: 2})
+        pool.load()
+        self.assertEqual(pool.claim(8 * GIB_IN_KIB, "f1"), '1')
+
+    def test_move(self):
+        """
+        ``move`` leaves the volumes of the previous storage pool, takes
+        over those of the new one and refills it.
+        """
+        gateway = FakeGateway([
+            {'id': '1', 'name': PREFIX + 'a', 'sizeInKb': 8 * GIB_IN_KIB,
+             'mappedSdcInfo': None, 'storagePoolId': OTHER_POOL.id}])
+        pool = WarmVolumePool(gateway, POOL, PREFIX, {8: 2})
+        pool.refill()
+        pool.move(OTHER_POOL)
+        claimed = pool.claim(8 * GIB_IN_KIB, "f1")
+        pool.refill()
+        self.assertEqual(
+            (claimed, pool.pool, pool.available(),
+             sorted(volume['storagePoolId']
+                    for volume in gateway.volumes.values())),
+            ('1', OTHER_POOL, {8 * GIB_IN_KIB: 2},
+             [POOL.id, POOL.id, OTHER_POOL.id, OTHER_POOL.id,
+              OTHER_POOL.id]))
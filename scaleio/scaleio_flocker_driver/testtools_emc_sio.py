@@ -15,7 +15,7 @@ from twisted.trial.unittest import SynchronousTestCase, SkipTest
 from twisted.python.components import proxyForInterface
 
 from .emc_sio import (
-    IScaleIOVolumeManager, scaleio_client
+    IScaleIOVolumeManager, EMCScaleIOBlockDeviceAPI, scaleio_client, DEBUG
 )
 from scaleiopy import ScaleIO
 
@@ -126,3 +126,36 @@ def tidy_scaleio_client_for_test(test_case):
     client = TidyScaleIOVolumeManager(client)
     test_case.addCleanup(client._cleanup)
     return client, pd, sp
+
+
+class SimulatedNodeBlockDeviceAPI(EMCScaleIOBlockDeviceAPI):
+    """
+    The driver, as run on the node of a simulated SDC.
+    """
+    def __init__(self, instance_id, *args, **kwargs):
+        self._simulated_instance_id = instance_id
+        EMCScaleIOBlockDeviceAPI.__init__(self, *args, **kwargs)
+
+    def compute_instance_id(self):
+        return self._simulated_instance_id
+
+
+def simulated_node_api(simulator, cluster_id, startup_cache=None,
+                       **kwargs):
+    """
+    Register a new SDC with a ``GatewaySimulator`` and return the driver
+    of its node.
+
+    :param GatewaySimulator simulator: A started simulator
+    :param UUID cluster_id: A Flocker cluster ID.
+    :param StartupCache startup_cache: Optional startup cache of the
+        client and the driver.
+    :param kwargs: Further ``EMCScaleIOBlockDeviceAPI`` arguments.
+    :returns: A ``SimulatedNodeBlockDeviceAPI``.
+    """
+    client, pdomain, spool = scaleio_client(
+        simulator.username, simulator.password, simulator.address,
+        ssl=False, debug_level=DEBUG, cache=startup_cache)
+    return SimulatedNodeBlockDeviceAPI(
+        simulator.inventory.add_sdc()['sdcGuid'].lower(), client,
+        cluster_id, pdomain, spool, startup_cache=startup_cache, **kwargs)
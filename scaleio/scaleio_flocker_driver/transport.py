@@ -0,0 +1,160 @@
+# -*- test-case-name: scaleio_flocker_driver.test_transport -*-
+# Copyright 2015 EMC Corporation
+
+"""
+The HTTP transport shared by all requests made to the ScaleIO REST
+gateway.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scaleiopy.scaleio import TLS1Adapter
+
+# Connections kept open to the gateway. The agents issue requests from
+# a handful of threads at most, so a small pool avoids reconnecting
+# without holding many idle sockets.
+DEFAULT_POOL_SIZE = 4
+
+# Latencies kept per endpoint for percentiles.
+LATENCY_SAMPLES = 1024
+
+# Percentiles reported by ``GatewayStatistics.snapshot``.
+PERCENTILES = (50, 90, 99)
+
+# Object ids in request paths, e.g. ``Volume::<id>``.
+_OBJECT_ID = re.compile(r'::[^/?]+')
+
+
+def endpoint_name(method, url):
+    """
+    :param string method: The HTTP method
+    :param string url: The request URL
+    :return string: The endpoint the request was for, with object ids
+        and the query string removed, e.g.
+        ``GET instances/Volume::{id}``.
+    """
+    path = url.split('?', 1)[0]
+    if '/api/' in path:
+        path = path.split('/api/', 1)[1]
+    return "%s %s" % (method, _OBJECT_ID.sub('::{id}', path))
+
+
+def percentile(samples, percent):
+    """
+    :param list samples: Sorted values
+    :param int percent: The percentile wanted, between 0 and 100
+    :return: The nearest-rank percentile of ``samples``, ``None`` if
+        there are no samples.
+    """
+    if not samples:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(samples)))
+    return samples[max(0, min(rank, len(samples)) - 1)]
+
+
+class GatewayStatistics(object):
+    """
+    Request counts and latencies of the requests made to the gateway,
+    per endpoint.
+    """
+    def __init__(self, samples=LATENCY_SAMPLES):
+        """
+        :param int samples: The number of latencies kept per endpoint.
+        """
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._errors = {}
+        self._latencies = {}
+
+    def record(self, endpoint, latency, failed=False):
+        """
+        :param string endpoint: As returned by ``endpoint_name``
+        :param float latency: Seconds until the response arrived
+        :param boolean failed: True if the request got an error
+            response or no response at all.
+        """
+        with self._lock:
+            self._requests[endpoint] = self._requests.get(endpoint, 0) + 1
+            if failed:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+            if endpoint not in self._latencies:
+                self._latencies[endpoint] = deque(maxlen=self._samples)
+            self._latencies[endpoint].append(latency)
+
+    def _summary(self, count, errors, latencies):
+        summary = {'requests': count, 'errors': errors}
+        latencies = sorted(latencies)
+        for percent in PERCENTILES:
+            summary['p%d' % percent] = percentile(latencies, percent)
+        return summary
+
+    def snapshot(self):
+        """
+        :return dict: The request count, error count and latency
+            percentiles, in seconds, of each endpoint and of all of
+            them under ``total``.
+        """
+        with self._lock:
+            snapshot = {}
+            everything = []
+            for endpoint, latencies in self._latencies.iteritems():
+                snapshot[endpoint] = self._summary(
+                    self._requests[endpoint],
+                    self._errors.get(endpoint, 0),
+                    latencies)
+                everything.extend(latencies)
+            snapshot['total'] = self._summary(
+                sum(self._requests.values()),
+                sum(self._errors.values()),
+                everything)
+        return snapshot
+
+
+class ScaleIOHTTPSession(requests.Session):
+    """
+    A ``requests.Session`` keeping a pool of connections to the
+    gateway alive, and recording the statistics of every request sent
+    through it.
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, statistics=None,
+                 clock=time.time):
+        """
+        :param int pool_size: The number of connections kept open.
+        :param GatewayStatistics statistics: Where to record requests.
+        :param clock: A callable returning the current time in seconds.
+        """
+        requests.Session.__init__(self)
+        # The headers scaleiopy sends with every request.
+        self.headers.update({'Accept': 'application/json',
+                             'Version': '1.0'})
+        # Only one gateway is talked to, so one host pool is enough.
+        # The gateway only speaks TLSv1, like with scaleiopy's session.
+        self.mount('https://', TLS1Adapter(pool_connections=1,
+                                           pool_maxsize=pool_size))
+        self.mount('http://', HTTPAdapter(pool_connections=1,
+                                          pool_maxsize=pool_size))
+        if statistics is None:
+            statistics = GatewayStatistics()
+        self.statistics = statistics
+        self._clock = clock
+
+    def send(self, request, **kwargs):
+        endpoint = endpoint_name(request.method, request.url)
+        start = self._clock()
+        try:
+            response = requests.Session.send(self, request, **kwargs)
+        except Exception:
+            self.statistics.record(endpoint, self._clock() - start,
+                                   failed=True)
+            raise
+        self.statistics.record(endpoint, self._clock() - start,
+                               failed=response.status_code >= 400)
+        return response
@@ -0,0 +1,230 @@
+# -*- test-case-name: scaleio_flocker_driver.test_warm_pool -*-
+# Copyright 2015 EMC Corporation
+
+"""
+A pool of pre-created ScaleIO volumes handed out by renaming them, so
+creating a dataset does not wait for the gateway to create a volume.
+"""
+
+import threading
+from uuid import uuid4
+
+from bitmath import GiB, KiB
+
+from eliot import Message, Logger
+
+from .gateway import ScaleIOGatewayError, VOLUME_NOT_FOUND_ERRORS
+
+_logger = Logger()
+
+# Names of pool volumes start with this instead of the "f" of Flocker
+# volumes, so they are not listed as this cluster's volumes.
+WARM_VOLUME_PREFIX = "w"
+
+# ScaleIO volume names are at most 31 characters long.
+MAX_VOLUME_NAME_LENGTH = 31
+
+# Seconds between checks for missing pool volumes when no volume was
+# claimed in the meantime.
+REFILL_INTERVAL = 60
+
+# ScaleIO's allocation granularity in GiB
+ALLOCATION_GRANULARITY = 8
+
+
+class InvalidWarmPoolSize(Exception):
+    """
+    Pool volumes have to be a multiple of the allocation granularity.
+    :param size: The configured size in GiB
+    """
+    def __init__(self, size):
+        Exception.__init__(self, size)
+        self.size = size
+
+
+def warm_volume_prefix(cluster_id, owner):
+    """
+    :param UUID cluster_id: The Flocker cluster ID
+    :param unicode owner: Identifies the node keeping the pool, so
+        nodes never claim each other's volumes.
+    :return str: The name prefix of the node's pool volumes.
+    """
+    return "%s%s%s" % (WARM_VOLUME_PREFIX, str(cluster_id)[:8],
+                       str(owner).replace("-", "")[:8])
+
+
+class WarmVolumePool(object):
+    """
+    Keeps a number of unmapped volumes of each configured size in one
+    storage pool, and refills the pool in a background thread.
+    """
+    def __init__(self, gateway, pool, prefix, sizes,
+                 interval=REFILL_INTERVAL):
+        """
+        :param ScaleIOGatewaySession gateway: Used to create and rename
+            volumes.
+        :param StoragePool pool: The storage pool to keep volumes in.
+        :param str prefix: The name prefix of pool volumes, see
+            ``warm_volume_prefix``.
+        :param dict sizes: Maps volume sizes in GiB, multiples of
+            ``ALLOCATION_GRANULARITY``, to the number of volumes to keep.
+        :param int interval: Seconds between checks for missing
+            volumes.
+        :raises InvalidWarmPoolSize: If a size is not a multiple of
+            ``ALLOCATION_GRANULARITY``.
+        """
+        self._gateway = gateway
+        self._pool = pool
+        self._prefix = prefix
+        self._interval = interval
+        self._wanted = {}
+        for size, count in sizes.items():
+            if int(size) <= 0 or int(size) % ALLOCATION_GRANULARITY:
+                raise InvalidWarmPoolSize(size)
+            self._wanted[int(GiB(int(size)).to_KiB().value)] = int(count)
+        self._lock = threading.Lock()
+        self._available = dict((size_kb, []) for size_kb in self._wanted)
+        self._refill_needed = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def pool(self):
+        """
+        The ``StoragePool`` the volumes are kept in.
+        """
+        return self._pool
+
+    def available(self):
+        """
+        :return dict: The number of unclaimed volumes per size in KiB.
+        """
+        with self._lock:
+            return dict((size_kb, len(ids))
+                        for size_kb, ids in self._available.items())
+
+    def _volume_name(self):
+        return self._prefix + uuid4().hex[
+            :MAX_VOLUME_NAME_LENGTH - len(self._prefix)]
+
+    def load(self):
+        """
+        Take over the unmapped pool volumes left by a previous run.
+        """
+        volumes = self._gateway.request(
+            'GET', 'instances/StoragePool::%s/relationships/Volume'
+            % self._pool.id)
+        with self._lock:
+            for volume in volumes:
+                size_kb = int(volume['sizeInKb'])
+                if (not volume['name'].startswith(self._prefix) or
+                        volume.get('mappedSdcInfo') or
+                        size_kb not in self._available or
+                        volume['id'] in self._available[size_kb]):
+                    continue
+                self._available[size_kb].append(volume['id'])
+        Message.new(Info="Warm pool volumes available: "
+                    + str(self.available())).write(_logger)
+
+    def move(self, pool):
+        """
+        Keep the volumes in another storage pool from now on. The
+        unclaimed volumes of the previous pool are left in it, and those
+        of the new pool left by a previous run are taken over.
+
+        :param StoragePool pool: The storage pool to keep volumes in.
+        """
+        with self._lock:
+            self._pool = pool
+            self._available = dict(
+                (size_kb, []) for size_kb in self._wanted)
+        self.load()
+        self._refill_needed.set()
+
+    def claim(self, size_kb, name):
+        """
+        Rename a pool volume of ``size_kb`` to ``name``.
+
+        :param int size_kb: The size of the volume in KiB
+        :param str name: The name the volume should get
+        :raises ScaleIOGatewayError: If the gateway fails to rename the
+            volume for another reason than it being gone. The volume
+            is kept in the pool.
+        :return unicode: The id of the renamed volume, ``None`` if the
+            pool has no volume of that size.
+        """
+        while True:
+            with self._lock:
+                if not self._available.get(size_kb):
+                    return None
+                volume_id = self._available[size_kb].pop()
+            self._refill_needed.set()
+            try:
+                self._gateway.request(
+                    'POST', 'instances/Volume::%s/action/setVolumeName'
+                    % volume_id, json={'newName': name})
+            except ScaleIOGatewayError as e:
+                Message.new(Error="Could Not Claim Warm Pool Volume "
+                            + str(volume_id) + ": "
+                            + str(e)).write(_logger)
+                if e.error_code in VOLUME_NOT_FOUND_ERRORS:
+                    # Deleted behind our back, try the next one.
+                    continue
+                # The gateway answered, so the volume kept its name.
+                with self._lock:
+                    self._available[size_kb].append(volume_id)
+                raise
+            Message.new(Info="Claimed Warm Pool Volume " + str(volume_id)
+                        + " as " + name).write(_logger)
+            return volume_id
+
+    def refill(self):
+        """
+        Create the volumes missing from the pool.
+        """
+        for size_kb, count in sorted(self._wanted.items()):
+            while len(self._available[size_kb]) < count:
+                if self._stopped:
+                    return
+                name = self._volume_name()
+                pool = self._pool
+                volume_id = self._gateway.call_once(
+                    self._gateway.create_volume, pool, name, size_kb)
+                with self._lock:
+                    if self._pool is not pool:
+                        # Moved meanwhile, the volume stays unclaimed.
+                        return
+                    self._available[size_kb].append(volume_id)
+                Message.new(Info="Created Warm Pool Volume " + name
+                            + " of " + str(KiB(size_kb).to_GiB())
+                            ).write(_logger)
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.refill()
+            except Exception as e:
+                Message.new(Error="Could Not Refill Warm Pool: "
+                            + str(e)).write(_logger)
+            self._refill_needed.wait(self._interval)
+            self._refill_needed.clear()
+
+    def start(self):
+        """
+        Start refilling the pool in a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="scaleio-warm-pool")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop refilling the pool. Unclaimed volumes are kept for the
+        next run.
+        """
+        self._stopped = True
+        self._refill_needed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
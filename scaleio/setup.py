@@ -34,7 +34,7 @@ setup(
 
     keywords='backend, plugin, flocker, docker, python',
     packages=find_packages(exclude=['test*']),
-    install_requires = ['scaleio-py'],
+    install_requires = ['scaleio-py', 'treq'],
     data_files=[('/etc/flocker/', ['example_sio_agent.yml']),
                 ('/etc/flocker/', ['scaleio_test.config'])]
 )
@@ -4,11 +4,19 @@
 
 from flocker.node import BackendDescription, DeployerType
 from emc_xtremio_flocker_plugin.emc_xtremio_blockdevice import xio_from_configuration
+from emc_xtremio_flocker_plugin.connection_pool import (
+    DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+)
+from emc_xtremio_flocker_plugin.volume_cache import DEFAULT_VOLUME_CACHE_TTL
 
 
 def api_factory(cluster_id, **kwargs):
     return xio_from_configuration(cluster_id=cluster_id, xms_user=kwargs[u'xms_user'],
-                                  xms_password=kwargs[u'xms_password'], xms_ip=kwargs['xms_ip'])
+                                  xms_password=kwargs[u'xms_password'], xms_ip=kwargs['xms_ip'],
+                                  pool_size=kwargs.get(u'pool_size', DEFAULT_POOL_SIZE),
+                                  connect_timeout=kwargs.get(u'connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+                                  read_timeout=kwargs.get(u'read_timeout', DEFAULT_READ_TIMEOUT),
+                                  volume_cache_ttl=kwargs.get(u'volume_cache_ttl', DEFAULT_VOLUME_CACHE_TTL))
 
 
 FLOCKER_BACKEND = BackendDescription(
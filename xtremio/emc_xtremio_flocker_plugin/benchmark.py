@@ -0,0 +1,136 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Benchmark of the driver against the XMS simulator.
+
+For each inventory size, the driver creates, attaches, lists, detaches
+and destroys volumes, and the XMS requests and latency of each operation
+are reported::
+
+    python -m emc_xtremio_flocker_plugin.benchmark --volumes 10,1000,10000
+"""
+
+import argparse
+import sys
+import time
+from uuid import uuid4
+
+from emc_xtremio_flocker_plugin.emc_xtremio_blockdevice import XtremIOMgmt
+from emc_xtremio_flocker_plugin.simulator import (
+    XMSInventory, XMSSimulator, simulated_node_api
+)
+
+DEFAULT_INVENTORY_SIZES = (10, 1000, 10000)
+DEFAULT_ITERATIONS = 20
+
+# The share of the volumes on the array belonging to the benchmarked
+# cluster.
+CLUSTER_SHARE = 0.05
+
+OPERATIONS = ('create_volume', 'attach_volume', 'list_volumes',
+              'detach_volume', 'destroy_volume')
+
+
+def percentile(values, p):
+    """
+    :param values: Sorted values
+    :param p: The percentile, 0 to 100
+    :return: The value below which ``p`` percent of the values fall
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def _measure(simulator, results, operation, function, *args):
+    requests = simulator.request_count()
+    start = time.time()
+    result = function(*args)
+    results[operation]['latencies'].append(time.time() - start)
+    results[operation]['requests'].append(
+        simulator.request_count() - requests)
+    return result
+
+
+def run(inventory_size, iterations=DEFAULT_ITERATIONS, latency=0.0):
+    """
+    Benchmark the driver against a simulated array holding
+    ``inventory_size`` volumes.
+
+    :param int inventory_size: The number of volumes on the array
+    :param int iterations: The number of volumes to go through the
+        create, attach, list, detach and destroy cycle.
+    :param float latency: Seconds the simulator waits before each
+        answer.
+    :return dict: For each operation, the ``requests`` and
+        ``latencies`` of each call.
+    """
+    cluster_id = uuid4()
+    inventory = XMSInventory()
+    owned = int(inventory_size * CLUSTER_SHARE)
+    inventory.populate(inventory_size - owned, '/Volume/other')
+    inventory.populate(owned, XtremIOMgmt.BASE_PATH + str(cluster_id),
+                       name_format=str(cluster_id)[:8] + "%07d")
+
+    simulator = XMSSimulator(inventory, latency=latency)
+    simulator.start()
+    try:
+        api = simulated_node_api(simulator, cluster_id)
+        results = dict((operation, {'requests': [], 'latencies': []})
+                       for operation in OPERATIONS)
+        size = 8 * 1024 * 1024 * 1024
+        for _ in xrange(iterations):
+            volume = _measure(simulator, results, 'create_volume',
+                              api.create_volume, uuid4(), size)
+            _measure(simulator, results, 'attach_volume',
+                     api.attach_volume, volume.blockdevice_id,
+                     api.compute_instance_id())
+            _measure(simulator, results, 'list_volumes', api.list_volumes)
+            _measure(simulator, results, 'detach_volume',
+                     api.detach_volume, volume.blockdevice_id)
+            _measure(simulator, results, 'destroy_volume',
+                     api.destroy_volume, volume.blockdevice_id)
+        return results
+    finally:
+        simulator.stop()
+
+
+def report(inventory_size, results, out=sys.stdout):
+    """
+    Write the requests per call and the p50 and p99 latencies of each
+    operation.
+    """
+    out.write("%d volumes\n" % (inventory_size,))
+    out.write("  %-16s %10s %10s %10s\n"
+              % ("operation", "requests", "p50 ms", "p99 ms"))
+    for operation in OPERATIONS:
+        latencies = sorted(results[operation]['latencies'])
+        requests = results[operation]['requests']
+        out.write("  %-16s %10.1f %10.1f %10.1f\n" % (
+            operation, float(sum(requests)) / len(requests),
+            percentile(latencies, 50) * 1000,
+            percentile(latencies, 99) * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the XtremIO driver against a simulated "
+                    "XMS.")
+    parser.add_argument(
+        '--volumes', default=",".join(map(str, DEFAULT_INVENTORY_SIZES)),
+        help="Comma separated numbers of volumes on the array.")
+    parser.add_argument(
+        '--iterations', type=int, default=DEFAULT_ITERATIONS,
+        help="Volumes created and destroyed per inventory size.")
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help="Milliseconds the simulator waits before each answer.")
+    options = parser.parse_args(argv)
+    for inventory_size in [int(n) for n in options.volumes.split(",")]:
+        report(inventory_size, run(inventory_size, options.iterations,
+                                   options.latency / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
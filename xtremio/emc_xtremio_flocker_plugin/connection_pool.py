@@ -0,0 +1,149 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+A pool of kept-alive HTTPS connections to the XMS, so REST calls do not
+each pay for a new TCP connection and TLS handshake.
+"""
+
+from eliot import Message, Logger
+
+import httplib
+import socket
+import ssl
+import threading
+
+_logger = Logger()
+
+# Connections kept open to the XMS, and the most requests made at once.
+DEFAULT_POOL_SIZE = 4
+
+# Seconds to wait for the connection to the XMS, and for each answer.
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120
+
+# Requests sent again on a new connection when the kept-alive one they
+# went out on turns out to be closed. The XMS may have acted on others.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+def _tls_context():
+    """
+    :return: The ``ssl.SSLContext`` shared by the connections of a pool,
+        ``None`` before Python 2.7.9.
+    """
+    if hasattr(ssl, 'SSLContext'):
+        return ssl.SSLContext(ssl.PROTOCOL_TLSv1)
+    return None
+
+
+class HTTPSConnectionPool(object):
+    """
+    Keeps up to ``pool_size`` connections to one host open between
+    requests, and lets no more than ``pool_size`` requests run at once.
+    """
+
+    def __init__(self, host, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, secure=True):
+        """
+        :param host: The host, optionally followed by ``:port``
+        :param pool_size: The number of connections kept open
+        :param connect_timeout: Seconds to wait for a connection
+        :param read_timeout: Seconds to wait for each answer
+        :param secure: Use HTTPS, or plain HTTP if False
+        """
+        self.host = host
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.secure = secure
+        self._context = _tls_context() if secure else None
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _new_connection(self):
+        if not self.secure:
+            connection = httplib.HTTPConnection(
+                self.host, timeout=self.connect_timeout)
+        elif self._context is not None:
+            connection = httplib.HTTPSConnection(
+                self.host, timeout=self.connect_timeout,
+                context=self._context)
+        else:
+            connection = httplib.HTTPSConnection(
+                self.host, timeout=self.connect_timeout)
+        connection.connect()
+        # The connect timeout only applies to connecting, answers may
+        # take longer.
+        connection.sock.settimeout(self.read_timeout)
+        return connection
+
+    def _get_connection(self):
+        """
+        :return: A kept-alive connection if there is one, otherwise a new
+            one, and whether it was kept-alive.
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _put_connection(self, connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self):
+        """
+        Close the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Make a request over a pooled connection. A kept-alive connection
+        the XMS closed in the meantime is replaced once, and the request
+        made again if it could not be sent or is idempotent.
+
+        :param method: The HTTP method
+        :param path: The path and query of the URL
+        :param body: The request body, if any
+        :param headers: A ``dict`` of request headers
+        :raises socket.timeout: If the XMS does not answer in time.
+        :raises socket.error: If the XMS cannot be reached.
+        :return: A tuple of the status code, reason and body.
+        """
+        self._slots.acquire()
+        try:
+            connection, reused = self._get_connection()
+            while True:
+                sent = False
+                try:
+                    connection.request(method, path, body, headers or {})
+                    sent = True
+                    response = connection.getresponse()
+                    content = response.read()
+                except socket.timeout:
+                    connection.close()
+                    raise
+                except (httplib.HTTPException, socket.error) as e:
+                    connection.close()
+                    if not reused or (sent and
+                                      method not in IDEMPOTENT_METHODS):
+                        raise
+                    Message.new(Info="Kept-alive XMS connection was "
+                                     "closed: " + repr(e)).write(_logger)
+                    connection, reused = self._new_connection(), False
+                    continue
+                break
+            if response.will_close:
+                connection.close()
+            else:
+                self._put_connection(connection)
+            return response.status, response.reason, content
+        finally:
+            self._slots.release()
@@ -14,15 +14,23 @@ from zope.interface import implementer
 from subprocess import check_output
 from uuid import UUID
 
+from emc_xtremio_flocker_plugin.connection_pool import (
+    HTTPSConnectionPool, DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT
+)
+from emc_xtremio_flocker_plugin import scsi
+from emc_xtremio_flocker_plugin.volume_cache import (
+    VolumeStateCache, DEFAULT_VOLUME_CACHE_TTL
+)
+
 import base64
+import httplib
 import urllib
-import urllib2
+import urlparse
 import json
 import os
 import re
 import socket
-import ssl
-import sys
 
 
 class ArrayConfiguration(object):
@@ -30,10 +38,17 @@ class ArrayConfiguration(object):
     Wrapper object for EMC XtremIO Array Configuration
     """
 
-    def __init__(self, login, password, host):
+    def __init__(self, login, password, host, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, secure=True):
         self.array_login = login
         self.array_password = password
         self.array_host = host
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Plain HTTP, e.g. to a simulated XMS, if False
+        self.secure = secure
 
 
 INITIATOR_FILE = "/etc/iscsi/initiatorname.iscsi"
@@ -72,6 +87,13 @@ class VolumeBackendAPIException(Exception):
     """
 
 
+class BulkQueryUnsupported(VolumeBackendAPIException):
+    """
+    The XMS refused a bulk query of the v2 REST API, as it does not have
+    the v2 API or does not support the query
+    """
+
+
 class DeviceException(Exception):
     """
     A base class for exceptions raised by  ``IBlockDeviceAPI`` operations.
@@ -134,11 +156,18 @@ class XtremIOMgmt():
                                                 (configuration.array_login,
                                                  configuration.array_password))
                             .replace('\n', ''))
-        self.base_url = ('https://%s/api/json/types' %
-                         configuration.array_host)
+        self.base_url = '/api/json/types'
+        self.base_url_v2 = '/api/json/v2/types'
+        # All REST calls share kept-alive connections to the XMS
+        self.pool = HTTPSConnectionPool(
+            configuration.array_host,
+            pool_size=configuration.pool_size,
+            connect_timeout=configuration.connect_timeout,
+            read_timeout=configuration.read_timeout,
+            secure=configuration.secure)
 
     def request(self, object_type='volumes', request_typ='GET', data=None,
-                name=None, idx=None):
+                name=None, idx=None, cluster=None):
         """
         :param object_type: Type of object - volumes, initiator, lun maps. Refer to EMC XtremIO REST interface guide
          for more details.
@@ -146,10 +175,10 @@ class XtremIOMgmt():
         :param data: Raw data to be passed with request, if any
         :param name: Parameter to the request
         :param idx: If not name, then index of the object at EMC XtremIO
+        :param cluster: Name of the cluster of the object, when the XMS
+         manages several clusters
         :return: REST Response
         """
-        response = None
-
         if name and idx:
             Message.new("Request can't handle both name and index")
             raise ValueError("can't handle both name and idx")
@@ -162,40 +191,115 @@ class XtremIOMgmt():
         elif idx:
             url = '%s/%d' % (url, idx)
             key = str(idx)
+        if cluster is not None:
+            # The cluster is named in the query of GET and DELETE requests
+            # and in the body of the others
+            if request_typ in (self.GET, self.DELETE):
+                url = '%s%s%s' % (url, '&' if '?' in url else '?',
+                                  urllib.urlencode({'cluster-name': cluster}))
+            else:
+                data = dict(data or {})
+                data['cluster-id'] = cluster
+        body = None
         if data and request_typ == 'GET':
-            url + '?' + urllib.urlencode(data)
-            request = urllib2.Request(url)
+            url = '%s%s%s' % (url, '&' if '?' in url else '?',
+                              urllib.urlencode(data))
         elif data:
             Message.new(data=json.dumps(data)).write(_logger)
-            request = urllib2.Request(url,( json.dumps(data)))
-        else:
-            request = urllib2.Request(url)
+            body = json.dumps(data)
+        return self._send(request_typ, url, body, object_type, key)
+
+    def request_full(self, object_type, properties, cluster=None):
+        """
+        Fetch the given properties of every object of a type with bulk
+        queries of the v2 REST API (XMS 4.0 and up), following the pages
+        of the answer.
+
+        :param object_type: Type of object - volumes, initiators, ...
+        :param properties: The properties to fetch of each object
+        :param cluster: Name of the cluster of the objects, when the XMS
+         manages several clusters
+        :return: A list with a dict of the properties of each object
+        """
+        query = [('full', 1)] + [('prop', prop) for prop in properties]
+        if cluster is not None:
+            query.append(('cluster-name', cluster))
+        url = '%s/%s?%s' % (self.base_url_v2, object_type,
+                            urllib.urlencode(query))
+        objects = []
+        while url is not None:
+            page = self._send(self.GET, url, None, object_type, None) or {}
+            objects.extend(page.get(object_type, []))
+            url = None
+            for link in page.get('links', []):
+                if link.get('rel') == 'next':
+                    parts = urlparse.urlsplit(link['href'])
+                    url = parts.path + ('?' + parts.query if parts.query
+                                        else '')
+        return objects
+
+    def clusters(self):
+        """
+        :return: The name and index of each cluster managed by the XMS
+        """
+        clusters = []
+        for cluster in self.request('clusters')['clusters']:
+            # The index ends the link to the cluster
+            idx = int(cluster['href'].rstrip('/').rsplit('/', 1)[-1])
+            clusters.append((cluster['name'], idx))
+        return clusters
+
+    def _send(self, request_typ, url, body, object_type, key):
+        """
+        :param request_typ: Type of request - GET, POST, DELETE
+        :param url: The path and query of the request
+        :param body: The JSON body, if any
+        :param object_type: Type of object, for error messages
+        :param key: Name or index of the object, for error messages
+        :return: REST Response
+        """
         Message.new(url=url).write(_logger)
-        request.get_method = lambda: request_typ
-        request.add_header("Authorization", "Basic %s" % (self.base64_auth,))
+        headers = {"Authorization": "Basic %s" % (self.base64_auth,)}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
         try:
-	    if sys.version_info >= (2,7,9):
-            	gcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1)
-            	response = urllib2.urlopen(request, context=gcontext)
-	    else:
-            	response = urllib2.urlopen(request)
-        except (urllib2.HTTPError) as exc:
-            if exc.code == 400 and hasattr(exc, 'read'):
-                error = json.load(exc)
-                if error['message'].endswith('obj_not_found'):
-                    Message.new(object_key=key + "of type").write(_logger)
-                    Message.new(object_type=object_type + " is not found").write(_logger)
-                    raise DeviceExceptionObjNotFound(Exception)
-                elif error['message'] == 'vol_obj_name_not_unique':
-                    Message.new(error="can't create 2 volumes with the same name").write(_logger)
-                    raise (InvalidVolumeMetadata('Volume by this name already exists'))
-                raise
-        if response.code >= 300:
-            Message.new(Error=response.msg).write(_logger)
+            status, reason, str_result = self.pool.request(
+                request_typ, url, body, headers)
+        except (httplib.HTTPException, socket.error) as exc:
+            # Includes timeouts, so a slow XMS cannot hang the agent
+            Message.new(Error="XMS request failed " + repr(exc)).write(_logger)
+            raise VolumeBackendAPIException(
+                'XMS request %s %s failed: %r' % (request_typ, url, exc))
+        if status == 400 and str_result:
+            try:
+                error = json.loads(str_result)
+            except ValueError:
+                error = None
+            if not isinstance(error, dict):
+                # Not an error of the REST API, e.g. a proxy's page
+                Message.new(Error=reason + " " + str_result).write(_logger)
+                raise VolumeBackendAPIException(
+                    'bad response from XMS got http code %d, %s: %s' %
+                    (status, reason, str_result))
+            if error.get('message', '').endswith('obj_not_found'):
+                Message.new(object_key=str(key) + "of type").write(_logger)
+                Message.new(object_type=object_type + " is not found").write(_logger)
+                raise DeviceExceptionObjNotFound(Exception)
+            elif error.get('message') == 'vol_obj_name_not_unique':
+                Message.new(error="can't create 2 volumes with the same name").write(_logger)
+                raise (InvalidVolumeMetadata(u'Volume by this name already exists'))
+        if status in (400, 404) and url.startswith(self.base_url_v2 + '/'):
+            # Unlike errors of the XMS or the network, this answer is
+            # the same for every bulk query
+            Message.new(Error=reason).write(_logger)
+            raise BulkQueryUnsupported(
+                'bulk query refused by XMS got http code %d, %s' %
+                (status, reason))
+        if status >= 300:
+            Message.new(Error=reason).write(_logger)
             raise VolumeBackendAPIException(
-                data='bad response from XMS got http code %d, %s' %
-                     (response.code, response.msg))
-        str_result = response.read()
+                'bad response from XMS got http code %d, %s' %
+                (status, reason))
         if str_result:
             try:
                 return json.loads(str_result)
@@ -224,16 +328,24 @@ class XtremIOiSCSIDriver():
 
         self.mgmt = mgmt
         self._connector = {'initiator': None, 'ig': compute_instance_id}
+        # The indexes of volumes, initiator groups and target groups by
+        # cluster, type and name, they name lun maps
+        self._indexes = {}
+        self.topology = scsi.ScsiTopology()
+        self._monitor = None
 
-    def initialize_connection(self):
+    def initialize_connection(self, cluster=None, idx=1):
         """
         The model followed with EMC XtremIO can be explained as follows:
         Each node has a initiator group created, when logged in for the first time. To this initiator group
         the initiator name is added for all the interfaces available on the node. The volumes are associated with
         the initiator group, thus making sure multipathing is established automatically.
+        With several clusters behind the XMS, each cluster has its own initiator group for the node.
+        :param cluster: Name of the cluster, when the XMS manages several
+        :param idx: Index of the cluster
         """
 
-        sys = self.mgmt.request('clusters', 'GET', idx=1)['content']
+        sys = self.mgmt.request('clusters', 'GET', idx=idx)['content']
         use_chap = (sys.get('chap-authentication-mode', 'disabled') !=
                     'disabled')
         discovery_chap = (sys.get('chap-discovery-mode', 'disabled') !=
@@ -242,21 +354,23 @@ class XtremIOiSCSIDriver():
         try:
             # check if the IG already exists
             self.mgmt.request('initiator-groups', 'GET',
-                              name=self._get_ig())['content']
+                              name=self._get_ig(), cluster=cluster)['content']
         except DeviceExceptionObjNotFound:
             # create an initiator group to hold the the initiator
             data = {'ig-name': self._get_ig()}
-            self.mgmt.request('initiator-groups', 'POST', data)
+            self.mgmt.request('initiator-groups', 'POST', data,
+                              cluster=cluster)
         try:
             init = self.mgmt.request('initiators', 'GET',
-                                     name=initiator)['content']
+                                     name=initiator, cluster=cluster)['content']
             if use_chap:
                 chap_passwd = init['chap-authentication-initiator-'
                                    'password']
                 # delete the initiator to create a new one with password
                 if not chap_passwd:
                     Message.new(Info='initiator has no password while using chap removing it')
-                    self.mgmt.request('initiators', 'DELETE', name=initiator)
+                    self.mgmt.request('initiators', 'DELETE', name=initiator,
+                                      cluster=cluster)
                     # check if the initiator already exists
                     raise DeviceExceptionObjNotFound
         except DeviceExceptionObjNotFound:
@@ -272,108 +386,196 @@ class XtremIOiSCSIDriver():
                 data['initiator-discovery-user-name'] = 'chap_user'
                 data['initiator-discovery-'
                      'password'] = self._get_password()
-            self.mgmt.request('initiators', 'POST', data)
+            self.mgmt.request('initiators', 'POST', data, cluster=cluster)
 
-    def create_lun_map(self, blockdevice_id, compute_instance_id):
+    def create_lun_map(self, blockdevice_id, compute_instance_id, cluster=None):
         """
         :param: volume id or blockdevice_id passed from flocker
         :param: hostname, we use hostname as initiator group's name. If hostname is not current host, things won't
         break
+        :param cluster: Name of the cluster of the volume, if several
         :return: none
         :exception: Unknown volume, if volume not found
         """
         try:
             self.mgmt.request('lun-maps', 'POST', {'ig-id': compute_instance_id,
-                                                   "vol-id": str(blockdevice_id)})
+                                                   "vol-id": str(blockdevice_id)},
+                              cluster=cluster)
         except DeviceExceptionObjNotFound:
             Message.new(Error="Could not attach volume"
                               + str(blockdevice_id)
                               + "for node " + str(compute_instance_id)).write(_logger)
-            raise UnknownVolume(blockdevice_id)
+            raise UnknownVolume(unicode(blockdevice_id))
 
-    def destroy_lun_map(self, blockdevice_id, compute_instance_id):
+    def cache_volume(self, blockdevice_id, vol, cluster=None):
+        """
+        Remember the index of a volume from its details, see
+        ``destroy_lun_map``.
+        :param blockdevice_id: Volume id
+        :param vol: The volume's details as returned by XMS
+        :param cluster: Name of the cluster of the volume, if several
+        """
+        if 'index' in vol:
+            self._indexes[(cluster, 'volumes', str(blockdevice_id))] = vol['index']
+
+    def forget_volume(self, blockdevice_id, cluster=None):
+        """
+        Forget the index of a destroyed volume.
+        :param blockdevice_id: Volume id
+        :param cluster: Name of the cluster of the volume, if several
+        """
+        self._indexes.pop((cluster, 'volumes', str(blockdevice_id)), None)
+
+    def _get_index(self, object_type, name, cluster=None):
+        """
+        :return: The index of an object, from the cache if known
+        :exception: DeviceExceptionObjNotFound, if not found
+        """
+        key = (cluster, object_type, str(name))
+        if key not in self._indexes:
+            self._indexes[key] = self.mgmt.request(
+                object_type, name=str(name), cluster=cluster)['content']['index']
+        return self._indexes[key]
+
+    def _delete_lun_map(self, blockdevice_id, compute_instance_id, cluster):
+        lm_name = '%s_%s_%s' % (
+            str(self._get_index('volumes', blockdevice_id, cluster)),
+            str(self._get_index('initiator-groups', compute_instance_id,
+                                cluster)),
+            str(self._get_index('target-groups', 'Default', cluster)))
+        Message.new(lm_name=lm_name).write(_logger)
+        self.mgmt.request('lun-maps', 'DELETE', name=lm_name, cluster=cluster)
+
+    def destroy_lun_map(self, blockdevice_id, compute_instance_id,
+                        cluster=None):
         """
         :param: volumeid or blockdevice_id passed from flocker
         :param: hostname used to identify initiator group
+        :param cluster: Name of the cluster of the volume, if several
         :return: none
         :exception: Unknown volume if volume is not found
         """
         try:
-            ig = self.mgmt.request('initiator-groups', name=compute_instance_id)['content']
-            tg = self.mgmt.request('target-groups', name="Default")['content']
-            vol = self.mgmt.request('volumes', name=str(blockdevice_id))['content']
-            lm_name = '%s_%s_%s' % (str(vol['index']),
-                                    str(ig['index']) if ig else 'any', str(tg['index']))
-            Message.new(lm_name=lm_name).write(_logger)
-            self.mgmt.request('lun-maps', 'DELETE', name=lm_name)
+            self._delete_lun_map(blockdevice_id, compute_instance_id, cluster)
+            return
+        except DeviceExceptionObjNotFound:
+            # The cached indexes may be outdated, e.g. the initiator group
+            # was recreated, look them up once more
+            self.forget_volume(blockdevice_id, cluster)
+            self._indexes.pop((cluster, 'initiator-groups',
+                               str(compute_instance_id)), None)
+            self._indexes.pop((cluster, 'target-groups', 'Default'), None)
+        try:
+            self._delete_lun_map(blockdevice_id, compute_instance_id, cluster)
         except DeviceExceptionObjNotFound:
             Message.new(Error="destroy_lun_map: object not found for"
                               + str(blockdevice_id) + "when mapped to "
                               + str(compute_instance_id)).write(_logger)
-            raise UnknownVolume(blockdevice_id)
+            raise UnknownVolume(unicode(blockdevice_id))
 
-    def get_lun_map(self, blockdevice_id):
+    def get_mapping(self, blockdevice_id, cluster=None, vol=None):
         """
         :param blockdevice_id: Volume id
-        :return:return lun mapping if for the volume
+        :param cluster: Name of the cluster of the volume, if several
+        :param vol: The volume's details as just returned by XMS, fetched
+            if not given
+        :return: The LUN of the volume and its SCSI identifier, e.g.
+            ``(3, 'naa.514f0c5461400172')``. The LUN number is only unique
+            in the cluster, the identifier tells the devices of the
+            volume from those of other clusters and arrays.
+        :exception: Unknown volume, if volume not found
         :exception: Volume unattached, if no mapping was found
         """
-        try:
-            vol = self.mgmt.request('volumes', name=str(blockdevice_id))['content']
-            if int(vol['num-of-lun-mappings']) == 0:
-                raise UnattachedVolume(blockdevice_id)
-            else:
-                # EMC XtremIO gives unique lun number for each
-                # volume when it is attached. The unique lun number is
-                # generated in sequence
-                lun_mapping_list = vol['lun-mapping-list']
-                return lun_mapping_list[0][2]
-        except DeviceExceptionObjNotFound:
-            Message.new(Error="get_lun_map: could not be found for"
-                              + str(blockdevice_id)).write(_logger)
+        if vol is None:
+            try:
+                vol = self.mgmt.request('volumes', name=str(blockdevice_id),
+                                        cluster=cluster)['content']
+            except DeviceExceptionObjNotFound:
+                raise UnknownVolume(unicode(blockdevice_id))
+            self.cache_volume(blockdevice_id, vol, cluster)
+        if int(vol['num-of-lun-mappings']) == 0:
+            raise UnattachedVolume(unicode(blockdevice_id))
+        # EMC XtremIO gives unique lun number for each
+        # volume when it is attached. The unique lun number is
+        # generated in sequence
+        lun_mapping_list = vol['lun-mapping-list']
+        return lun_mapping_list[0][2], 'naa.' + vol['naa-name'].lower()
 
     def rescan_scsi(self):
         """
-        Rescan SCSI bus. This is needed in situations:
-            - Resize of volumes
-            - Detach of volumes
-            - Possibly creation of new volumes
+        Rescan the SCSI buses of the XtremIO targets. Only needed when
+        no XtremIO LUN shows in sysfs yet, see ``scan_lun``.
         :return:none
         """
-        channel_number = self._get_channel_number()
+        hosts = self._get_host_numbers()
         # Check for error condition
-        if channel_number < 0:
+        if not hosts:
             Message.new(error="iSCSI login not done for XtremIO bailing out").write(_logger)
             raise DeviceException
         else:
-            check_output(["rescan-scsi-bus.sh", "-r", "-c", channel_number])
-
-    def _get_channel_number(self):
-        """
-        Query scsi to get channel number of XtremIO devices.
-        Right now it supports only one XtremIO connected array
-        :return: channel number
-        """
-        output = check_output([b"/usr/bin/lsscsi"])
-        # lsscsi gives output in the following form:
-        # [0:0:0:0]    disk    ATA      ST91000640NS     SN03  /dev/sdp
-        # [1:0:0:0]    disk    DGC      LUNZ             0532  /dev/sdb
-        # [1:0:1:0]    disk    DGC      LUNZ             0532  /dev/sdc
-        # [8:0:0:0]    disk    MSFT     Virtual HD       6.3   /dev/sdd
-        # [9:0:0:0]    disk XtremIO  XtremApp         2400     /dev/sde
-
-        # We shall parse the output above and to give out channel number
-        # as 9
-        for row in output.split('\n'):
-            if re.search(r'XtremApp', row, re.I):
-                channel_row = re.search('\d+', row)
-                if channel_row:
-                    channel_number = channel_row.group()
-                    return channel_number
-
-        # Did not find channel number of xtremIO
-        # The number cannot be negative
-        return -1
+            check_output(["rescan-scsi-bus.sh", "-r", "-c"] +
+                         [str(host) for host in hosts])
+            self._watched_topology().refresh()
+
+    def _watched_topology(self):
+        """
+        :return: The SCSI topology of the node, kept up to date from
+            uevents from its first use
+        """
+        if self._monitor is None:
+            self._monitor = scsi.UeventMonitor(self.topology)
+            self._monitor.start()
+        return self.topology
+
+    def scan_lun(self, lun, wwid):
+        """
+        Scan the XtremIO targets for a single LUN, and wait for its
+        block devices to appear.
+        :param lun: The LUN number, see ``get_mapping``
+        :param wwid: The SCSI identifier of the volume, see ``get_mapping``
+        :return: The names of the block devices of the LUN
+        """
+        if not scsi.scan_lun(self._watched_topology(), lun):
+            # No XtremIO target shows in sysfs yet, fall back to a
+            # full rescan of the bus
+            self.rescan_scsi()
+        return scsi.wait_for_lun(self._watched_topology(), lun, wwid)
+
+    def remove_lun(self, lun, wwid):
+        """
+        Flush the multipath map over a single LUN, if any, and remove
+        its SCSI devices.
+        :param lun: The LUN number, see ``get_mapping``
+        :param wwid: The SCSI identifier of the volume, see ``get_mapping``
+        """
+        scsi.remove_lun(self._watched_topology(), lun, wwid)
+
+    def rescan_lun(self, lun, wwid):
+        """
+        Read the capacity of the SCSI devices of a single LUN again.
+        :param lun: The LUN number, see ``get_mapping``
+        :param wwid: The SCSI identifier of the volume, see ``get_mapping``
+        """
+        scsi.rescan_lun(self._watched_topology(), lun, wwid)
+
+    def _get_host_numbers(self):
+        """
+        The SCSI hosts of the XtremIO targets, of any number of arrays
+        :return: host numbers
+        """
+        return self._watched_topology().hosts()
+
+    def get_block_devices(self, lun, wwid):
+        """
+        :param lun: The LUN of the volume, see ``get_mapping``
+        :param wwid: The SCSI identifier of the volume, see ``get_mapping``.
+            The LUN number may be in use on other clusters and arrays,
+            and only their devices may show yet.
+        :return: The names of the block devices of the volume, one per path
+        """
+        return [device.block for device
+                in self._watched_topology().devices(lun, wwid)
+                if device.block is not None]
 
     def _get_initiator(self):
         """
@@ -412,45 +614,51 @@ class EMCXtremIOBlockDeviceAPI(object):
     VERSION = '0.1'
     driver_name = 'XtremIO'
     MIN_XMS_VERSION = [2, 4, 0]
+    # The v2 REST API, with bulk queries, came with XMS 4.0
+    BULK_QUERY_XMS_VERSION = [4, 0, 0]
+    LIST_VOLUME_PROPERTIES = ['name', 'index', 'vol-size', 'lun-mapping-list']
     DEFAULT_MULTIPATH_DEVICE_PATH = "/dev/mapper/"
 
-    def __init__(self, configuration, cluster_id, compute_instance_id=socket.gethostname(), allocation_unit=None):
+    def __init__(self, configuration, cluster_id, compute_instance_id=socket.gethostname(), allocation_unit=None,
+                 volume_cache_ttl=DEFAULT_VOLUME_CACHE_TTL):
         """
 
        :param configuration: Arrayconfiguration
+       :param volume_cache_ttl: Seconds the cached state of a volume is trusted
        """
 
         self._cluster_id = cluster_id
         self._compute_instance_id = compute_instance_id
-        self.volume_list = {}
+        self.volume_cache = VolumeStateCache(ttl=volume_cache_ttl)
         if allocation_unit is None:
             allocation_unit = 1
         self._allocation_unit = allocation_unit
+        # The cluster holding each volume, by blockdevice_id
+        self._owners = {}
         self.mgmt = XtremIOMgmt(configuration)
         self.data = XtremIOiSCSIDriver(self.mgmt, self._compute_instance_id)
         self.version = self._initialize_setup()
+        self._bulk_listing = ([int(n) for n in
+                               self.version.split('-')[0].split('.')]
+                              >= self.BULK_QUERY_XMS_VERSION)
         self.multipath_on = False
         if(self.check_multipath()):
             self.multipath_on = True
 
-    def _check_for_volume_folder(self):
+    def _check_for_volume_folder(self, cluster=None):
 
         """
-        :param: the flocker dataset_id
+        :param cluster: Name of the XtremIO cluster, if several
         :return: True if volume folder exists. For each dataset_id a new volume is created.
         :exception: none
         """
         try:
-            vol_folders = self.mgmt.request(XtremIOMgmt.VOLUME_FOLDERS)
-            vol_folder = vol_folders['folders']
-            Message.new(folders=vol_folder).write(_logger)
-            for folder in vol_folder:
-                Message.new(folder_name=folder['name']).write(_logger)
-                # Folder name comes with a "/" as absolute path
-                if folder['name'] == (str(XtremIOMgmt.BASE_PATH) + str(self._cluster_id)):
-                    Message.new(Debug="Volume folder found").write(_logger)
-                    return True
-
+            # Folder name comes with a "/" as absolute path
+            self.mgmt.request(XtremIOMgmt.VOLUME_FOLDERS,
+                              name=XtremIOMgmt.BASE_PATH + str(self._cluster_id),
+                              cluster=cluster)
+            Message.new(Debug="Volume folder found").write(_logger)
+            return True
         except DeviceExceptionObjNotFound as exc:
             Message.new(value="Volume folder not found").write(_logger)
         except:
@@ -458,15 +666,16 @@ class EMCXtremIOBlockDeviceAPI(object):
 
         return False
 
-    def _create_volume_folder(self):
+    def _create_volume_folder(self, cluster=None):
 
         """
-        :param: the flocker dataset_id
+        :param cluster: Name of the XtremIO cluster, if several
         """
         try:
             data = {self.mgmt.CAPTION: str(self._cluster_id),
                     self.mgmt.PARENT_FOLDER_ID: self.mgmt.BASE_PATH}
-            self.mgmt.request(self.mgmt.VOLUME_FOLDERS, self.mgmt.POST, data)
+            self.mgmt.request(self.mgmt.VOLUME_FOLDERS, self.mgmt.POST, data,
+                              cluster=cluster)
         except DeviceExceptionObjNotFound as exe:
             # Message.new(Error="Failed to create volume folder").write(_logger)
             raise exe
@@ -474,20 +683,71 @@ class EMCXtremIOBlockDeviceAPI(object):
     def _check_version(self):
 
         """
-        Checks version of EMC XtremIO
-        """
-        sys = self.mgmt.request('clusters', idx=1)['content']
-        ver = [int(n) for n in sys['sys-sw-version'].split('-')[0].split('.')]
-        if ver < self.MIN_XMS_VERSION:
-            Message.new(Error='Invalid XtremIO version ' + sys['sys-sw-version'])
-            raise (DeviceVersionMismatch
-                   ('Invalid XtremIO version, version 2.4 or up is required'))
-        else:
-            msg = "EMCXtremIO SW version " + sys['sys-sw-version']
-            Message.new(version=msg).write(_logger)
-        version = sys['sys-sw-version']
+        Checks version of EMC XtremIO, on each cluster managed by the XMS.
+        Requests name the cluster only when there are several, as older
+        XMS versions manage a single one.
+        :return: The lowest version of the clusters
+        """
+        clusters = self.mgmt.clusters()
+        if len(clusters) == 1:
+            clusters = [(None, clusters[0][1])]
+        # The index of each cluster by name, None if it is the only one
+        self._cluster_indexes = dict(clusters)
+        self._clusters = [name for name, idx in clusters]
+        self._versions = {}
+        for name, idx in clusters:
+            sys = self.mgmt.request('clusters', idx=idx)['content']
+            ver = [int(n) for n in sys['sys-sw-version'].split('-')[0].split('.')]
+            if ver < self.MIN_XMS_VERSION:
+                Message.new(Error='Invalid XtremIO version ' + sys['sys-sw-version'])
+                raise (DeviceVersionMismatch
+                       ('Invalid XtremIO version, version 2.4 or up is required'))
+            else:
+                msg = "EMCXtremIO SW version " + sys['sys-sw-version']
+                Message.new(version=msg, cluster=name).write(_logger)
+            self._versions[name] = sys['sys-sw-version']
+        version = min(self._versions.values(), key=lambda version: [
+            int(n) for n in version.split('-')[0].split('.')])
         return version
 
+    def _place_volume(self):
+        """
+        :return: The name of the cluster to create a new volume on, the
+            one with the most effective free capacity
+        """
+        if len(self._clusters) == 1:
+            return self._clusters[0]
+        capacities = dict(
+            (cluster, _effective_free_capacity(self.mgmt.request(
+                'clusters', idx=self._cluster_indexes[cluster])['content']))
+            for cluster in self._clusters)
+        cluster = max(self._clusters, key=capacities.get)
+        Message.new(Info="Placing volume on cluster " + cluster,
+                    capacities=capacities).write(_logger)
+        return cluster
+
+    def _cluster_of(self, blockdevice_id):
+        """
+        :param blockdevice_id: - volume id
+        :return: The name of the cluster holding the volume, looked up on
+            each cluster if not known
+        :exception: Unknown volume
+        """
+        if len(self._clusters) == 1:
+            return self._clusters[0]
+        if blockdevice_id not in self._owners:
+            self._get_vol_details(blockdevice_id)
+        return self._owners[blockdevice_id]
+
+    def _forget_volume(self, blockdevice_id):
+        """
+        Forget the state, cluster and index of a volume that is gone.
+        :param blockdevice_id: - volume id
+        """
+        self.data.forget_volume(blockdevice_id,
+                                self._owners.pop(blockdevice_id, None))
+        self.volume_cache.remove(blockdevice_id)
+
     def _convert_size(self, size, to='BYTES'):
         """
         :param size: size to convert to or from
@@ -504,17 +764,22 @@ class EMCXtremIOBlockDeviceAPI(object):
     def _get(self, blockdevice_id):
         """
         :param blockdevice_id: - volume id
-        :return:volume object
+        :return:volume object, as the XMS has it now
+        :exception: Unknown volume
         """
-        try:
-            volume = self.volume_list[str(blockdevice_id)]
-            if volume is not None:
-                return volume
-            else:
-                raise UnknownVolume(blockdevice_id)
-        except:
-            raise UnknownVolume(blockdevice_id)
+        return self._fetch(blockdevice_id)[0]
 
+    def _fetch(self, blockdevice_id):
+        """
+        Calls that act on a volume decide from its state on the XMS, as
+        changes made by other nodes reach the cache only once its entry
+        expires.
+        :param blockdevice_id: - volume id
+        :return: The volume object and its details, as the XMS has them now
+        :exception: Unknown volume
+        """
+        self.volume_cache.remove(blockdevice_id)
+        return self._fetch_vol_details(blockdevice_id)
 
     def _blockdevicevolume_from_blockdevice_id(self, blockdevice_id, size,
                                            attached_to=None):
@@ -550,29 +815,91 @@ class EMCXtremIOBlockDeviceAPI(object):
             dataset_id=dataset_id, blockdevice_id=u"block-{0}".format(dataset_id),
         )
 
-    def _get_vol_details(self, blockdevice_id):
+    def _get_vol_details(self, blockdevice_id, cluster=None):
         """
         :param blockdevice_id - volume id
+        :param cluster - the cluster holding the volume, if known
         :return:volume details
         :exception: Unknown volume
         """
-        try:
-            vol = self.mgmt.request('volumes', 'GET', name=blockdevice_id)
-            vol_content = vol['content']
+        return self._fetch_vol_details(blockdevice_id, cluster)[0]
 
-            if int(vol_content['num-of-lun-mappings']) == 0:
-                is_attached_to = None
-            else:
-                is_attached_to = unicode(vol_content['lun-mapping-list'][0][0][1])
+    def _fetch_vol_details(self, blockdevice_id, cluster=None):
+        """
+        :param blockdevice_id - volume id
+        :param cluster - the cluster holding the volume, if known
+        :return: The volume object, and its details as returned by XMS
+        :exception: Unknown volume
+        """
+        if cluster is not None:
+            clusters = [cluster]
+        elif blockdevice_id in self._owners:
+            clusters = [self._owners[blockdevice_id]]
+        else:
+            # Volumes do not move, so each cluster is only searched once
+            clusters = self._clusters
+        for cluster in clusters:
+            try:
+                vol = self.mgmt.request('volumes', 'GET', name=blockdevice_id,
+                                        cluster=cluster)
+            except DeviceExceptionObjNotFound as exc:
+                continue
+            volume = self._volume_from_content(blockdevice_id,
+                                               vol['content'], cluster)
+            self.volume_cache.put(volume)
+            return volume, vol['content']
+        self._forget_volume(blockdevice_id)
+        raise UnknownVolume(blockdevice_id)
 
-            volume = self._blockdevicevolume_from_blockdevice_id(
-                blockdevice_id=blockdevice_id,
-                size=self._convert_size(int(vol_content['vol-size'])),
-                attached_to=is_attached_to
-            )
-            return volume
-        except DeviceExceptionObjNotFound as exc:
-            raise UnknownVolume(blockdevice_id)
+    def _volume_from_content(self, blockdevice_id, vol_content, cluster=None):
+        """
+        :param blockdevice_id - volume id
+        :param vol_content - the volume's vol-size and lun-mapping-list
+            as returned by XMS
+        :param cluster - the cluster holding the volume
+        :return:volume details
+        """
+        self._owners[blockdevice_id] = cluster
+        self.data.cache_volume(blockdevice_id, vol_content, cluster)
+        if not vol_content.get('lun-mapping-list'):
+            is_attached_to = None
+        else:
+            is_attached_to = unicode(vol_content['lun-mapping-list'][0][0][1])
+
+        return self._blockdevicevolume_from_blockdevice_id(
+            blockdevice_id=blockdevice_id,
+            size=self._convert_size(int(vol_content['vol-size'])),
+            attached_to=is_attached_to
+        )
+
+    def _list_volume_details(self, names, cluster=None):
+        """
+        :param names: Names of the volumes to list
+        :param cluster: The cluster holding these volumes
+        :return: the details of these volumes, fetched with bulk queries
+            where the XMS supports them and one by one otherwise
+        """
+        if self._bulk_listing:
+            try:
+                objects = self.mgmt.request_full(
+                    'volumes', self.LIST_VOLUME_PROPERTIES, cluster)
+            except BulkQueryUnsupported:
+                Message.new(Info="XMS bulk queries unsupported, listing "
+                                 "volumes one by one").write(_logger)
+                self._bulk_listing = False
+            except (VolumeBackendAPIException, DeviceExceptionObjNotFound):
+                # Possibly transient, bulk queries are tried again next time
+                Message.new(Info="XMS bulk query failed, listing "
+                                 "volumes one by one").write(_logger)
+            else:
+                wanted = set(names)
+                return [self._volume_from_content(unicode(vol['name']), vol,
+                                                  cluster)
+                        for vol in objects if vol['name'] in wanted]
+        # Listing changes nothing, so the fresh cached state of a volume
+        # saves fetching it
+        return [self.volume_cache.get(name) or
+                self._get_vol_details(name, cluster) for name in names]
 
     def compute_instance_id(self):
         """
@@ -589,9 +916,11 @@ class EMCXtremIOBlockDeviceAPI(object):
 
         try:
             version = self._check_version()
-            self.data.initialize_connection()
-            if not self._check_for_volume_folder():
-                self._create_volume_folder()
+            for cluster in self._clusters:
+                self.data.initialize_connection(
+                    cluster, self._cluster_indexes[cluster])
+                if not self._check_for_volume_folder(cluster):
+                    self._create_volume_folder(cluster)
         except DeviceVersionMismatch as exc:
             # Message.new(Error=exc).write(_logger)
             raise
@@ -615,9 +944,6 @@ class EMCXtremIOBlockDeviceAPI(object):
         See ``IBlockDeviceAPI.create_volume`` for parameter and return type
         documentation.
         """
-        if not self._check_for_volume_folder():
-            self._create_volume_folder()
-
         # Round up to 1MB boundaries
         size_mb = self._convert_size(size, 'MB')
 
@@ -627,10 +953,68 @@ class EMCXtremIOBlockDeviceAPI(object):
         data = {'vol-name': str(volume.blockdevice_id),
                 'vol-size': str(size_mb) + 'm',
                 'parent-folder-id': XtremIOMgmt.BASE_PATH + str(self._cluster_id)}
-        self.mgmt.request('volumes', 'POST', data)
-        self.volume_list[str(volume.blockdevice_id)] = volume
+        cluster = self._place_volume()
+        self._create_in_volume_folder('volumes', data, cluster)
+        self._owners[volume.blockdevice_id] = cluster
+        self.volume_cache.put(volume)
         return volume
 
+    def clone_volume(self, blockdevice_id, dataset_id):
+        """
+        Create a volume for ``dataset_id`` as a writable snapshot of an
+        existing volume. The snapshot shares the blocks of the cloned
+        volume on the array, so no data is copied whatever its size. The
+        content of an attached volume is cloned as it would be found after
+        a crash. The clone is on the cluster of the cloned volume.
+
+        :param blockdevice_id: The volume to clone
+        :param dataset_id: The dataset of the new volume
+        :raise: UnknownVolume if the volume to clone is not found
+        :return: BlockDeviceVolume of the new, unattached volume, of the
+            size of the cloned one
+        """
+        source = self._get(blockdevice_id)
+        cluster = self._cluster_of(blockdevice_id)
+        volume = self._blockdevicevolume_from_dataset_id(
+                      dataset_id=dataset_id,
+                      size=source.size)
+        data = {'ancestor-vol-id': str(blockdevice_id),
+                'snap-vol-name': str(volume.blockdevice_id),
+                'folder-id': XtremIOMgmt.BASE_PATH + str(self._cluster_id)}
+        try:
+            self._create_in_volume_folder('snapshots', data, cluster)
+        except DeviceExceptionObjNotFound:
+            # The volume folder was there, so the cloned volume was not
+            self._forget_volume(blockdevice_id)
+            raise UnknownVolume(blockdevice_id)
+        self._owners[volume.blockdevice_id] = cluster
+        self.volume_cache.put(volume)
+        return volume
+
+    def _create_in_volume_folder(self, object_type, data, cluster=None):
+        """
+        Create a volume or snapshot in the cluster's volume folder. The
+        folder is created by _initialize_setup, and created again if it
+        has been removed since.
+
+        :param object_type: volumes or snapshots
+        :param data: The request, naming the volume folder
+        :param cluster: Name of the XtremIO cluster, if several
+        :raise: DeviceExceptionObjNotFound if an object named by the
+            request other than the volume folder is not found
+        """
+        try:
+            self.mgmt.request(object_type, 'POST', data, cluster=cluster)
+        except DeviceExceptionObjNotFound:
+            Message.new(Info="Volume folder not found, creating it "
+                             "again").write(_logger)
+            try:
+                self._create_volume_folder(cluster)
+            except VolumeBackendAPIException:
+                # Another node created it in the meantime
+                Message.new(Info="Could not create volume folder").write(_logger)
+            self.mgmt.request(object_type, 'POST', data, cluster=cluster)
+
     def destroy_volume(self, blockdevice_id):
         """
         Destroy the storage for the given unattached volume.
@@ -638,22 +1022,28 @@ class EMCXtremIOBlockDeviceAPI(object):
         :raise: UnknownVolume is not found
         """
         try:
+            cluster = self._cluster_of(blockdevice_id)
             Message.new(Info="Destroying Volume" + str(blockdevice_id)).write(_logger)
-            self.mgmt.request('volumes', 'DELETE', name=blockdevice_id)
+            self.mgmt.request('volumes', 'DELETE', name=blockdevice_id,
+                              cluster=cluster)
         except DeviceExceptionObjNotFound as exc:
             raise UnknownVolume(blockdevice_id)
+        finally:
+            self._forget_volume(blockdevice_id)
 
     def destroy_volume_folder(self):
         """
-        Destroy the volume folder
+        Destroy the volume folder, on each cluster
         :param: none
         """
         try:
             Message.new(Info="Destroying Volume folder" + str(self._cluster_id)).write(_logger)
-            self.mgmt.request(XtremIOMgmt.VOLUME_FOLDERS, XtremIOMgmt.DELETE,
-                              name=XtremIOMgmt.BASE_PATH + str(self._cluster_id))
+            for cluster in self._clusters:
+                self.mgmt.request(XtremIOMgmt.VOLUME_FOLDERS, XtremIOMgmt.DELETE,
+                                  name=XtremIOMgmt.BASE_PATH + str(self._cluster_id),
+                                  cluster=cluster)
         except DeviceExceptionObjNotFound as exc:
-            raise UnknownVolume(self._cluster_id)
+            raise UnknownVolume(unicode(self._cluster_id))
 
     def attach_volume(self, blockdevice_id, attach_to):
         """
@@ -664,19 +1054,24 @@ class EMCXtremIOBlockDeviceAPI(object):
         documentation.
         """
 
-        volume = self._get_vol_details(blockdevice_id)
+        volume = self._get(blockdevice_id)
+        cluster = self._cluster_of(blockdevice_id)
 
         if volume.attached_to is None:
-            self.data.create_lun_map(str(blockdevice_id), str(attach_to))
+            try:
+                self.data.create_lun_map(str(blockdevice_id), str(attach_to),
+                                         cluster)
+            except UnknownVolume:
+                self._forget_volume(blockdevice_id)
+                raise
         else:
             raise AlreadyAttachedVolume(blockdevice_id)
 
         attached_volume = volume.set(attached_to=unicode(attach_to))
-        self.volume_list[str(blockdevice_id)] = attached_volume
+        self.volume_cache.put(attached_volume)
         Message.new(attached_to=attached_volume.attached_to).write(_logger)
-        self.data.rescan_scsi()
-        self.data.rescan_scsi()
-        self.data.rescan_scsi()
+        lun, wwid = self.data.get_mapping(blockdevice_id, cluster)
+        self.data.scan_lun(lun, wwid)
         return attached_volume
 
     def resize_volume(self, blockdevice_id, size):
@@ -686,7 +1081,8 @@ class EMCXtremIOBlockDeviceAPI(object):
         they are unattached.
         """
         # Raise unknown volume
-        volume = self._get_vol_details(blockdevice_id)
+        volume, details = self._fetch(blockdevice_id)
+        cluster = self._cluster_of(blockdevice_id)
 
         # Round up to 1MB boundaries
         size_mb = self._convert_size(size, 'MB')
@@ -695,18 +1091,38 @@ class EMCXtremIOBlockDeviceAPI(object):
             'vol-size': str(size_mb) + 'm'
         }
 
-        self.mgmt.request('volumes', 'PUT', data, name=str(volume.blockdevice_id))
-        self.data.rescan_scsi()
+        try:
+            self.mgmt.request('volumes', 'PUT', data, name=str(volume.blockdevice_id),
+                              cluster=cluster)
+        except DeviceExceptionObjNotFound:
+            self._forget_volume(blockdevice_id)
+            raise UnknownVolume(blockdevice_id)
+        self.volume_cache.put(volume.set(size=size_mb * 1048576))
+        if volume.attached_to is not None:
+            lun, wwid = self.data.get_mapping(blockdevice_id, cluster,
+                                              details)
+            self.data.rescan_lun(lun, wwid)
 
     def detach_volume(self, blockdevice_id):
         """
         :param: volume id = blockdevice_id
         :raises: unknownvolume exception if not found
         """
-        vol = self._get_vol_details(blockdevice_id)
+        vol, details = self._fetch(blockdevice_id)
+        cluster = self._cluster_of(blockdevice_id)
         if vol.attached_to is not None:
-            self.data.destroy_lun_map(blockdevice_id, self._compute_instance_id)
-            self.data.rescan_scsi()
+            try:
+                lun, wwid = self.data.get_mapping(blockdevice_id, cluster,
+                                                  details)
+                # Remove the devices before the array stops serving them
+                self.data.remove_lun(lun, wwid)
+                self.data.destroy_lun_map(blockdevice_id, self._compute_instance_id,
+                                          cluster)
+            except (UnknownVolume, UnattachedVolume):
+                # Detached or destroyed meanwhile
+                self.volume_cache.remove(blockdevice_id)
+                raise
+            self.volume_cache.put(vol.set(attached_to=None))
         else:
             Message.new(Info="Volume" + blockdevice_id + "not attached").write(_logger)
             raise UnattachedVolume(blockdevice_id)
@@ -720,34 +1136,47 @@ class EMCXtremIOBlockDeviceAPI(object):
         documentation.
         """
         volumes = []
+        listed_at = self.volume_cache.clock()
         try:
-            # Query for volume folder by name VOL_FLOCKER
-            # and get list of volumes. The array may have
-            # other volumes not owned by Flocker
-            vol_folder = self.mgmt.request(XtremIOMgmt.VOLUME_FOLDERS,
-                                           name=XtremIOMgmt.BASE_PATH + str(self._cluster_id))['content']
-
-            #Identified Bug in s/w version 4.0.0-64 that num-of-vols attribute is not updated.
-            if self.version == "4.0.0-64" :
-                numOfVolumes = vol_folder['num-of-items']
-            else :
-                numOfVolumes = vol_folder['num-of-vols']
-
-            # Get the number of volumes
-            Message.new(NoOfVolumesFound=vol_folder['num-of-vols']).write(_logger)
-
-            if int(numOfVolumes) > 0:
-                for vol in vol_folder['direct-list']:
-                    # Message.new(VolumeName=vol[1]).write(_logger)
-                    volume = self._get_vol_details(vol[1])
-                    volumes.append(volume)
-                    # Message.new(volume=volume).write(_logger)
+            # The volumes of the Flocker cluster are in its volume folder
+            # on each XtremIO cluster
+            for cluster in self._clusters:
+                volumes.extend(self._list_cluster_volumes(cluster))
+            self.volume_cache.seed(volumes, listed_at)
         except Exception as exe:
             pass
             # Message.new(Error=exe).write(_logger)
 
         return volumes
 
+    def _list_cluster_volumes(self, cluster):
+        """
+        :param cluster: Name of the XtremIO cluster, if several
+        :return: The volumes in the volume folder on the cluster
+        """
+        # Query for volume folder by name VOL_FLOCKER
+        # and get list of volumes. The array may have
+        # other volumes not owned by Flocker
+        vol_folder = self.mgmt.request(XtremIOMgmt.VOLUME_FOLDERS,
+                                       name=XtremIOMgmt.BASE_PATH + str(self._cluster_id),
+                                       cluster=cluster)['content']
+
+        #Identified Bug in s/w version 4.0.0-64 that num-of-vols attribute is not updated.
+        if self._versions[cluster] == "4.0.0-64" :
+            numOfVolumes = vol_folder['num-of-items']
+        else :
+            numOfVolumes = vol_folder['num-of-vols']
+
+        # Get the number of volumes
+        Message.new(NoOfVolumesFound=vol_folder['num-of-vols']).write(_logger)
+
+        if int(numOfVolumes) == 0:
+            return []
+        # The folder lists the names of its volumes, their
+        # details come with a few bulk queries
+        return self._list_volume_details(
+            [vol[1] for vol in vol_folder['direct-list']], cluster)
+
     def check_multipath(self):
         """"
         Method to check if multipathing kernel modules are installed
@@ -771,67 +1200,51 @@ class EMCXtremIOBlockDeviceAPI(object):
 
         return multipath_on
 
-    def return_multipath_device(self, blockdevice_id):
+    def return_multipath_device(self, blockdevice_id, lunid=None, wwid=None):
         """
+        Look the multipath map of the volume up in sysfs. Nothing is run
+        and the device is left as it is, Flocker creates the filesystem.
 
         :param blockdevice_id:
+        :param lunid: The LUN of the volume, looked up if not given
+        :param wwid: The SCSI identifier of the volume, looked up with
+            the LUN
         :return: DeviveAbsPath - Multipath device path
         """
-        lunid = self.data.get_lun_map(blockdevice_id)
-        try :
-            #Query multipath for the device name
-            output = check_output([b"multipath -v2 -ll"], shell=True)
-            #multipath -v2 -ll sample output as below :
-            #3514f0c5461400172 dm-5 XtremIO ,XtremApp
-            #size=1.0M features='0' hwhandler='0' wp=rw
-            #`-+- policy='queue-length 0' prio=0 status=active
-            # |- 7:0:0:2 sdg 8:96 active faulty running
-            # `- 3:0:0:2 sdf 8:80 active faulty running
-
-            # Parse the above output for the device name under /dev/mapper
-            for row in output.split('\n'):
-                if re.search(r'XtremApp', row, re.I) :
-                    deviceName = row.split(' ')[0]
-                if re.search(r'\d:\d:\d:' + str(lunid), row, re.I):
-                    deviceAbsPath = EMCXtremIOBlockDeviceAPI.DEFAULT_MULTIPATH_DEVICE_PATH + deviceName
-                    if os.path.exists(deviceAbsPath):
-                        output = check_output([b"mkfs.ext3 " + deviceAbsPath], shell=True)
-                        return deviceAbsPath
-        except Exception as ex :
-            Message.new(value="Exception when quering for multipath device").write(_logger)
+        if lunid is None:
+            lunid, wwid = self.data.get_mapping(
+                blockdevice_id, self._cluster_of(blockdevice_id))
+        names = self.data.get_block_devices(lunid, wwid)
+        if not names:
             raise UnknownVolume(blockdevice_id)
-
+        try:
+            deviceAbsPath = scsi.wait_for_multipath(
+                self.data.topology, names,
+                FilePath(EMCXtremIOBlockDeviceAPI.DEFAULT_MULTIPATH_DEVICE_PATH))
+        except scsi.DeviceTimeout:
+            Message.new(value="No multipath device for "
+                              + str(blockdevice_id)).write(_logger)
+            raise UnknownVolume(blockdevice_id)
+        return deviceAbsPath
 
     def get_device_path(self, blockdevice_id):
         """
         :param blockdevice_id:
         :return:the device path
         """
-        lunid = self.data.get_lun_map(blockdevice_id)
-        devicePath = " "
+        # The LUN number is only unique in the cluster of the volume
+        cluster = self._cluster_of(blockdevice_id)
+        lunid, wwid = self.data.get_mapping(blockdevice_id, cluster)
+        devicePath = None
 
         #Check if multipathing is  available on host and return the multipathing device
         if(self.multipath_on) :
-            devicePath = self.return_multipath_device(blockdevice_id)
+            devicePath = self.return_multipath_device(blockdevice_id, lunid,
+                                                      wwid)
         else :
-            # Query LunID from XtremIO
-
-            output = check_output([b"/usr/bin/lsscsi"])
-            # lsscsi gives output in the following form:
-            # [0:0:0:0]    disk    ATA      ST91000640NS     SN03  /dev/sdp
-            # [1:0:0:0]    disk    DGC      LUNZ             0532  /dev/sdb
-            # [1:0:1:0]    disk    DGC      LUNZ             0532  /dev/sdc
-            # [8:0:0:0]    disk    MSFT     Virtual HD       6.3   /dev/sdd
-            # [9:0:0:0]    disk XtremIO  XtremApp         240   0     /dev/sde
-
-            # We shall parse the output above and give out path /dev/sde as in
-            # this case
-            for row in output.split('\n'):
-                if re.search(r'XtremApp', row, re.I):
-                    if re.search(r'\d:\d:\d:' + str(lunid), row, re.I):
-                        device_name = re.findall(r'/\w+', row, re.I)
-                        if device_name:
-                            devicePath = device_name[0] + device_name[1]
+            names = self.data.get_block_devices(lunid, wwid)
+            if names:
+                devicePath = "/dev/" + names[0]
 
         if devicePath:
             Message.new(value="get_device_path returned : " + devicePath).write(_logger)
@@ -840,17 +1253,45 @@ class EMCXtremIOBlockDeviceAPI(object):
         raise UnknownVolume(blockdevice_id)
 
 
-def xio_from_configuration(cluster_id, xms_user, xms_password, xms_ip):
+def _effective_free_capacity(cluster):
+    """
+    :param cluster: The details of a cluster as returned by XMS
+    :return: The KB of data that still fit on the cluster, its free
+        physical capacity times its data reduction ratio. A cluster that
+        reports no ratio yet, or one below 1, counts as not reducing data.
+    """
+    free = (int(cluster.get('ud-ssd-space', 0)) -
+            int(cluster.get('ud-ssd-space-in-use', 0)))
+    try:
+        ratio = float(cluster.get('data-reduction-ratio'))
+    except (TypeError, ValueError):
+        ratio = 1.0
+    return free * max(ratio, 1.0)
+
+
+def xio_from_configuration(cluster_id, xms_user, xms_password, xms_ip,
+                           pool_size=DEFAULT_POOL_SIZE,
+                           connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                           read_timeout=DEFAULT_READ_TIMEOUT,
+                           volume_cache_ttl=DEFAULT_VOLUME_CACHE_TTL):
     """
 
     :param xms_ip:
     :param xms_user:
     :param xms_password:
+    :param pool_size: Connections kept open to the XMS
+    :param connect_timeout: Seconds to wait for a connection to the XMS
+    :param read_timeout: Seconds to wait for each XMS answer
+    :param volume_cache_ttl: Seconds the cached state of a volume is trusted
     :return:EMCXtremIOBlockDeviceAPI object
     """
     return EMCXtremIOBlockDeviceAPI(
-        configuration=ArrayConfiguration(xms_user, xms_password, xms_ip),
+        configuration=ArrayConfiguration(xms_user, xms_password, xms_ip,
+                                         pool_size=pool_size,
+                                         connect_timeout=connect_timeout,
+                                         read_timeout=read_timeout),
         cluster_id=cluster_id,
         compute_instance_id=unicode(socket.gethostname()),
-        allocation_unit=1
+        allocation_unit=1,
+        volume_cache_ttl=volume_cache_ttl
     )
@@ -0,0 +1,462 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+An in-memory index of the XtremIO SCSI devices of the node, read from
+sysfs and kept up to date from kernel uevents, and targeted scans of
+single XtremIO LUNs.
+"""
+
+from collections import namedtuple
+from subprocess import check_output
+
+from eliot import Message, Logger
+from twisted.python.filepath import FilePath
+
+import socket
+import threading
+import time
+
+_logger = Logger()
+
+SYSFS = FilePath("/sys")
+
+# The vendor XtremIO LUNs report in their SCSI inquiry data
+XTREMIO_VENDOR = "XtremIO"
+
+# Seconds to wait for a scanned LUN to show up as a block device
+DEVICE_TIMEOUT = 60
+POLL_INTERVAL = 0.5
+
+# Seconds to wait for multipathd to set up the map of a LUN, or for a
+# flushed map to go away
+MULTIPATH_TIMEOUT = 10
+
+# The prefix of the device-mapper UUIDs of multipath maps
+MULTIPATH_UUID_PREFIX = "mpath-"
+
+# The netlink protocol and multicast group of kernel uevents
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP = 1
+
+
+class DeviceTimeout(Exception):
+    """
+    A scanned LUN did not show up as a block device in time.
+    """
+
+
+# A SCSI device of an XtremIO LUN. ``address`` is the tuple of host,
+# channel, target and LUN, ``block`` the name of its block device, e.g.
+# ``sde``, and ``wwid`` its SCSI identifier, e.g. ``naa.514f0c5461400172``.
+# ``block`` and ``wwid`` are ``None`` when not known (yet).
+ScsiDevice = namedtuple('ScsiDevice', ['address', 'block', 'wwid'])
+
+
+def _address(name):
+    """
+    :param name: A SCSI address as named in sysfs, ``host:channel:target:lun``
+    :return: The address as a tuple of ints, ``None`` if not an address
+    """
+    try:
+        address = tuple(int(n) for n in name.split(':'))
+    except ValueError:
+        return None
+    if len(address) != 4:
+        return None
+    return address
+
+
+def _name(address):
+    return '%d:%d:%d:%d' % address
+
+
+def _read(path):
+    """
+    :return: The stripped content of a sysfs attribute, ``None`` if it
+        does not exist (any more)
+    """
+    try:
+        return path.getContent().strip()
+    except (IOError, OSError):
+        return None
+
+
+class ScsiTopology(object):
+    """
+    The XtremIO SCSI devices of the node, by address.
+
+    The index is read from ``/sys/class/scsi_device`` once, and then
+    updated one device at a time from the uevents a ``UeventMonitor``
+    passes to ``handle_uevent``. Lookups that find nothing read sysfs
+    again, in case the monitor is not running or an event is late.
+    """
+
+    def __init__(self, sysfs=SYSFS):
+        """
+        :param sysfs: The sysfs mount point
+        """
+        self.sysfs = sysfs
+        self._devices = None
+        self._lock = threading.Lock()
+
+    def scsi_device(self, address):
+        """
+        :return: The sysfs directory of the SCSI device at ``address``
+        """
+        return self.sysfs.descendant(['class', 'scsi_device',
+                                      _name(address), 'device'])
+
+    def _read_device(self, address):
+        """
+        :return: The ``ScsiDevice`` at ``address`` as sysfs shows it,
+            ``None`` if it is gone or not an XtremIO device
+        """
+        device = self.scsi_device(address)
+        if _read(device.child('vendor')) != XTREMIO_VENDOR:
+            return None
+        block = None
+        try:
+            blocks = device.child('block').children()
+        except (IOError, OSError):
+            blocks = []
+        if blocks:
+            block = sorted(child.basename() for child in blocks)[0]
+        return ScsiDevice(address, block, _read(device.child('wwid')))
+
+    def _update(self, address):
+        device = self._read_device(address)
+        with self._lock:
+            if self._devices is None:
+                return
+            if device is None:
+                self._devices.pop(address, None)
+            else:
+                self._devices[address] = device
+
+    def refresh(self):
+        """
+        Read every SCSI device from sysfs again.
+        """
+        devices = {}
+        try:
+            names = self.sysfs.descendant(['class',
+                                           'scsi_device']).listdir()
+        except (IOError, OSError):
+            names = []
+        for name in names:
+            address = _address(name)
+            if address is None:
+                continue
+            device = self._read_device(address)
+            if device is not None:
+                devices[address] = device
+        with self._lock:
+            self._devices = devices
+
+    def discard(self, address):
+        """
+        Drop the device at ``address`` from the index, e.g. once it has
+        been deleted.
+        """
+        with self._lock:
+            if self._devices is not None:
+                self._devices.pop(address, None)
+
+    def handle_uevent(self, event):
+        """
+        Update the index for a uevent of a SCSI device or a disk.
+
+        :param dict event: The uevent's properties, see ``parse_uevent``
+        """
+        subsystem = event.get('SUBSYSTEM')
+        name = event.get('DEVPATH', '').rsplit('/', 1)[-1]
+        if subsystem == 'scsi_device':
+            address = _address(name)
+            if address is None:
+                return
+            if event.get('ACTION') == 'remove':
+                self.discard(address)
+            else:
+                self._update(address)
+        elif subsystem == 'block' and event.get('DEVTYPE') == 'disk':
+            if event.get('ACTION') == 'remove':
+                with self._lock:
+                    addresses = [device.address for device
+                                 in (self._devices or {}).values()
+                                 if device.block == name]
+            else:
+                try:
+                    addresses = [_address(child) for child in
+                                 self.sysfs.descendant(
+                                     ['block', name, 'device',
+                                      'scsi_device']).listdir()]
+                except (IOError, OSError):
+                    addresses = []
+            for address in addresses:
+                if address is not None:
+                    self._update(address)
+
+    def _lookup(self, select):
+        with self._lock:
+            if self._devices is not None:
+                found = select(self._devices.values())
+                if found:
+                    return found
+        self.refresh()
+        with self._lock:
+            return select(self._devices.values())
+
+    def devices(self, lun, wwid=None):
+        """
+        :param lun: A LUN number
+        :param wwid: The SCSI identifier of the volume, e.g.
+            ``naa.514f0c5461400172``, as other arrays may use the same
+            LUN number for other volumes
+        :return: The ``ScsiDevice`` of every path to the LUN, of the
+            volume if ``wwid`` is given and on every XtremIO array if not
+        """
+        if wwid is not None:
+            wwid = wwid.lower()
+        return self._lookup(lambda devices: sorted(
+            device for device in devices if device.address[3] == lun
+            and (wwid is None or (device.wwid or '').lower() == wwid)))
+
+    def targets(self):
+        """
+        :return: The host, channel and target of every XtremIO target the
+            node is logged in to, each XtremIO target has a LUN 0
+        """
+        return self._lookup(lambda devices: sorted(
+            set(device.address[:3] for device in devices)))
+
+    def hosts(self):
+        """
+        :return: The SCSI hosts of the XtremIO targets
+        """
+        return sorted(set(target[0] for target in self.targets()))
+
+
+def parse_uevent(data):
+    """
+    :param data: A kernel uevent as read from netlink,
+        ``ACTION@DEVPATH`` followed by ``KEY=value`` fields, all
+        separated by NUL characters
+    :return: A ``dict`` of the fields
+    """
+    return dict(field.split('=', 1) for field in data.split('\0')[1:]
+                if '=' in field)
+
+
+class UeventMonitor(object):
+    """
+    Passes the kernel uevents of the node to a ``ScsiTopology``, from a
+    daemon thread.
+    """
+
+    def __init__(self, topology):
+        self.topology = topology
+        self._socket = None
+
+    def start(self):
+        """
+        Listen for uevents. Without netlink, e.g. when not allowed, the
+        topology is only read again when lookups find nothing.
+
+        :return: Whether the monitor is running
+        """
+        try:
+            self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                                         NETLINK_KOBJECT_UEVENT)
+            self._socket.bind((0, UEVENT_GROUP))
+        except (AttributeError, socket.error) as e:
+            Message.new(Info="Not watching uevents: " + str(e)).write(_logger)
+            self._socket = None
+            return False
+        thread = threading.Thread(target=self._run,
+                                  name="XtremIO uevent monitor")
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                data = self._socket.recv(65536)
+            except socket.error as e:
+                Message.new(Error="Stopped watching uevents: "
+                                  + str(e)).write(_logger)
+                return
+            try:
+                self.topology.handle_uevent(parse_uevent(data))
+            except Exception as e:
+                Message.new(Error="Could not handle uevent: "
+                                  + repr(e)).write(_logger)
+
+
+def scan_lun(topology, lun):
+    """
+    Ask every XtremIO target for a single LUN.
+
+    :param topology: The ``ScsiTopology`` of the node
+    :param lun: The LUN number
+    :return: The scanned targets, as tuples of host, channel and target
+    """
+    targets = topology.targets()
+    for host, channel, target in targets:
+        Message.new(Info="Scanning LUN %d on %d:%d:%d"
+                    % (lun, host, channel, target)).write(_logger)
+        topology.sysfs.descendant(['class', 'scsi_host', 'host%d' % host,
+                                   'scan']).setContent("%d %d %d" %
+                                                       (channel, target, lun))
+    return targets
+
+
+def remove_lun(topology, lun, wwid, run=check_output,
+               timeout=MULTIPATH_TIMEOUT, interval=POLL_INTERVAL,
+               sleep=time.sleep, clock=time.time):
+    """
+    Remove the SCSI devices of a LUN, leaving every other device alone.
+    The multipath map over them is flushed first, and the devices are
+    removed once the map is gone, as deleting the paths of a map leaves
+    it queueing I/O with no path to send it to.
+
+    :param topology: The ``ScsiTopology`` of the node
+    :param lun: The LUN number
+    :param wwid: The SCSI identifier of the volume mapped to the LUN
+    :param run: Runs a command, ``check_output`` by default
+    :raises CalledProcessError: If the map could not be flushed, e.g.
+        because it is still open. No device is removed then.
+    :raises DeviceTimeout: If the flushed map is still there after
+        ``timeout`` seconds. No device is removed then either.
+    """
+    devices = topology.devices(lun, wwid)
+    blocks = [device.block for device in devices if device.block is not None]
+    for dm, name in _multipath_maps(topology, blocks):
+        Message.new(Info="Flushing multipath map %s (%s)"
+                    % (name, dm)).write(_logger)
+        run(["multipath", "-f", name])
+        holder = topology.sysfs.descendant(['block', dm])
+        deadline = clock() + timeout
+        while holder.exists():
+            if clock() >= deadline:
+                raise DeviceTimeout(dm)
+            sleep(interval)
+            holder.changed()
+    for device in devices:
+        Message.new(Info="Removing SCSI device %d:%d:%d:%d"
+                    % device.address).write(_logger)
+        topology.scsi_device(device.address).child('delete').setContent("1")
+        topology.discard(device.address)
+
+
+def rescan_lun(topology, lun, wwid):
+    """
+    Read the capacity of the SCSI devices of a LUN again, after it was
+    resized.
+
+    :param topology: The ``ScsiTopology`` of the node
+    :param lun: The LUN number
+    :param wwid: The SCSI identifier of the volume mapped to the LUN
+    """
+    for device in topology.devices(lun, wwid):
+        topology.scsi_device(device.address).child('rescan').setContent("1")
+
+
+def wait_for_lun(topology, lun, wwid, dev=FilePath("/dev"),
+                 timeout=DEVICE_TIMEOUT, interval=POLL_INTERVAL,
+                 sleep=time.sleep, clock=time.time):
+    """
+    Wait for a scanned LUN to show up as a block device.
+
+    :param topology: The ``ScsiTopology`` of the node
+    :param lun: The LUN number
+    :param wwid: The SCSI identifier of the volume mapped to the LUN
+    :param dev: Where device nodes are created
+    :raises DeviceTimeout: If it does not show up within ``timeout``
+        seconds.
+    :return: The names of the block devices of the LUN
+    """
+    deadline = clock() + timeout
+    while True:
+        names = [device.block for device in topology.devices(lun, wwid)
+                 if device.block is not None
+                 and dev.child(device.block).exists()]
+        if names:
+            return names
+        if clock() >= deadline:
+            raise DeviceTimeout(lun)
+        sleep(interval)
+        # The LUN's SCSI devices may show before their block devices or
+        # identifiers
+        topology.refresh()
+
+
+def _multipath_maps(topology, blocks):
+    """
+    Find the multipath maps over some paths, from the ``slaves`` of the
+    device-mapper devices in ``/sys/block``.
+
+    :param topology: The ``ScsiTopology`` of the node
+    :param blocks: The names of the block devices of the paths
+    :return: The device-mapper device, e.g. ``dm-1``, and the name under
+        ``/dev/mapper`` of each map
+    """
+    blocks = set(blocks)
+    if not blocks:
+        return []
+    block = topology.sysfs.child('block')
+    try:
+        names = sorted(name for name in block.listdir()
+                       if name.startswith('dm-'))
+    except (IOError, OSError):
+        names = []
+    maps = []
+    for name in names:
+        dm = block.child(name)
+        uuid = _read(dm.descendant(['dm', 'uuid']))
+        if uuid is None or not uuid.startswith(MULTIPATH_UUID_PREFIX):
+            continue
+        try:
+            slaves = dm.child('slaves').listdir()
+        except (IOError, OSError):
+            continue
+        if blocks.intersection(slaves):
+            maps.append((name, _read(dm.descendant(['dm', 'name']))))
+    return maps
+
+
+def multipath_device(topology, blocks):
+    """
+    Find the multipath map over some paths.
+
+    :param topology: The ``ScsiTopology`` of the node
+    :param blocks: The names of the block devices of the paths
+    :return: The name of the map under ``/dev/mapper``, e.g.
+        ``3514f0c5461400172``, ``None`` if there is none
+    """
+    for dm, name in _multipath_maps(topology, blocks):
+        return name
+    return None
+
+
+def wait_for_multipath(topology, blocks, mapper=FilePath("/dev/mapper"),
+                       timeout=MULTIPATH_TIMEOUT, interval=POLL_INTERVAL,
+                       sleep=time.sleep, clock=time.time):
+    """
+    Wait for multipathd to set up the map over some paths.
+
+    :param topology: The ``ScsiTopology`` of the node
+    :param blocks: The names of the block devices of the paths
+    :param mapper: Where device-mapper device nodes are created
+    :raises DeviceTimeout: If there is no map within ``timeout`` seconds.
+    :return: The path of the map's device node
+    """
+    deadline = clock() + timeout
+    while True:
+        name = multipath_device(topology, blocks)
+        if name is not None and mapper.child(name).exists():
+            return mapper.child(name).path
+        if clock() >= deadline:
+            raise DeviceTimeout(blocks)
+        sleep(interval)
@@ -0,0 +1,616 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+A local stand-in for the XMS REST API, for running the driver and
+benchmarks without an XtremIO array.
+
+Only the requests made by the driver are answered: clusters, volume
+folders, volumes (also through bulk queries of the v2 API), snapshots,
+initiator groups, initiators, target groups and lun maps. Objects are kept in
+memory, for one or several clusters.
+"""
+
+import base64
+import json
+import re
+import threading
+import time
+import urllib
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from uuid import uuid4
+
+from twisted.python.filepath import FilePath
+
+from emc_xtremio_flocker_plugin.emc_xtremio_blockdevice import (
+    EMCXtremIOBlockDeviceAPI, XtremIOiSCSIDriver, ArrayConfiguration
+)
+from emc_xtremio_flocker_plugin import scsi
+
+SIMULATED_XMS_VERSION = "4.0.2-80"
+
+# The ``message``s of the errors of the real XMS
+OBJ_NOT_FOUND = "obj_not_found"
+VOL_OBJ_NAME_NOT_UNIQUE = "vol_obj_name_not_unique"
+OBJ_NAME_NOT_UNIQUE = "obj_name_not_unique"
+CLUSTER_ID_IS_REQUIRED = "cluster_id_is_required"
+
+# Objects per page of the answers to bulk queries
+DEFAULT_PAGE_SIZE = 1000
+
+# Usable physical capacity of a simulated cluster, in KiB
+DEFAULT_CAPACITY_KB = 8 * 1024 ** 3
+
+_SIZE_UNITS = {'k': 1, 'm': 1024, 'g': 1024 ** 2, 't': 1024 ** 3}
+
+
+class XMSError(Exception):
+    """
+    The simulated XMS answers the request with an error.
+    """
+    def __init__(self, message, status_code=400):
+        Exception.__init__(self, message, status_code)
+        self.message = message
+        self.status_code = status_code
+
+
+def _size_kb(size):
+    """
+    :param size: A size as sent to the XMS, e.g. ``8m``
+    :return int: The size in KiB
+    """
+    size = str(size).lower()
+    if size[-1:] in _SIZE_UNITS:
+        return int(size[:-1]) * _SIZE_UNITS[size[-1]]
+    return int(size) // 1024
+
+
+class XMSInventory(object):
+    """
+    The objects of a simulated XtremIO cluster.
+    """
+    def __init__(self, version=SIMULATED_XMS_VERSION, name='xbrick1',
+                 capacity_kb=DEFAULT_CAPACITY_KB, data_reduction_ratio=1.0):
+        """
+        :param version: The XMS software version
+        :param name: The name of the cluster
+        :param int capacity_kb: The usable physical capacity of the cluster
+        :param float data_reduction_ratio: The data reduction ratio the
+            cluster reports
+        """
+        self._lock = threading.RLock()
+        self._next_index = 0
+        self._next_lun = 0
+        # Part of the NAA identifier of each volume, as on real clusters
+        # the identifiers are unique across clusters
+        self._serial = uuid4().hex[:6]
+        # Set ``ud-ssd-space-in-use`` to simulate data written
+        self.cluster = {'name': name, 'sys-sw-version': version,
+                        'chap-authentication-mode': 'disabled',
+                        'chap-discovery-mode': 'disabled',
+                        'ud-ssd-space': str(capacity_kb),
+                        'ud-ssd-space-in-use': '0',
+                        'data-reduction-ratio': str(data_reduction_ratio)}
+        self.objects = dict((object_type, {}) for object_type in (
+            'volume-folders', 'volumes', 'initiator-groups', 'initiators',
+            'target-groups', 'lun-maps'))
+        self.add('target-groups', 'Default', {})
+
+    def _new_index(self):
+        with self._lock:
+            self._next_index += 1
+            return self._next_index
+
+    def add(self, object_type, name, properties):
+        """
+        Create an object.
+
+        :raises XMSError: If the name is taken.
+        :return dict: The object.
+        """
+        with self._lock:
+            objects = self.objects[object_type]
+            if name in objects:
+                raise XMSError(VOL_OBJ_NAME_NOT_UNIQUE
+                               if object_type == 'volumes'
+                               else OBJ_NAME_NOT_UNIQUE)
+            index = self._new_index()
+            obj = {'name': name, 'index': index,
+                   'guid': uuid4().hex}
+            obj.update(properties)
+            objects[name] = obj
+            return obj
+
+    def get(self, object_type, name):
+        """
+        :raises XMSError: If there is no such object.
+        :return dict: The object.
+        """
+        try:
+            return self.objects[object_type][name]
+        except KeyError:
+            raise XMSError(OBJ_NOT_FOUND)
+
+    def remove(self, object_type, name):
+        """
+        :raises XMSError: If there is no such object.
+        """
+        with self._lock:
+            obj = self.get(object_type, name)
+            del self.objects[object_type][name]
+            return obj
+
+    def add_folder(self, name):
+        """
+        :param name: The folder's absolute path, e.g. ``/Volume/abc``
+        :return dict: The folder.
+        """
+        return self.add('volume-folders', name, {'caption':
+                                                 name.rsplit('/', 1)[-1]})
+
+    def add_volume(self, name, size_kb, folder):
+        """
+        Create a volume in a folder.
+
+        :raises XMSError: If the folder does not exist or the name is
+            taken.
+        :return dict: The volume.
+        """
+        with self._lock:
+            self.get('volume-folders', folder)
+            index = self._next_index + 1
+            return self.add('volumes', name, {
+                'vol-size': str(int(size_kb)),
+                'naa-name': '514f0c5%s%03x' % (self._serial, index),
+                'parent-folder-id': folder, 'lun-mapping-list': [],
+                'num-of-lun-mappings': 0})
+
+    def add_snapshot(self, ancestor, name, folder):
+        """
+        Create a writable snapshot of a volume in a folder. Like on the
+        real XMS, the snapshot is a volume of the size of its ancestor.
+
+        :raises XMSError: If the ancestor or folder does not exist, or the
+            name is taken.
+        :return dict: The snapshot.
+        """
+        with self._lock:
+            ancestor = self.get('volumes', ancestor)
+            snapshot = self.add_volume(name, ancestor['vol-size'], folder)
+            snapshot['ancestor-vol-id'] = [ancestor['guid'], ancestor['name'],
+                                           ancestor['index']]
+            return snapshot
+
+    def populate(self, count, folder, name_format="vol%07d",
+                 size_kb=8 * 1024 * 1024):
+        """
+        Create ``count`` volumes in a folder, creating it if needed.
+
+        :param str name_format: Turns the index of a volume into its
+            name.
+        """
+        if folder not in self.objects['volume-folders']:
+            self.add_folder(folder)
+        for i in xrange(count):
+            self.add_volume(name_format % (i,), size_kb, folder)
+
+    def folder_content(self, folder):
+        """
+        :return dict: The folder, with its volumes.
+        """
+        with self._lock:
+            content = dict(self.get('volume-folders', folder))
+            volumes = [volume for volume in self.objects['volumes'].values()
+                       if volume['parent-folder-id'] == folder]
+        content['direct-list'] = [[volume['guid'], volume['name'],
+                                   volume['index']] for volume in volumes]
+        content['num-of-vols'] = content['num-of-items'] = len(volumes)
+        return content
+
+    def map_volume(self, volume_name, ig_name, tg_name='Default'):
+        """
+        Map a volume to an initiator group, with a LUN number unique in
+        the cluster.
+
+        :raises XMSError: If the volume, initiator group or target group
+            does not exist, or the volume is mapped to the group already.
+        :return dict: The lun map.
+        """
+        with self._lock:
+            volume = self.get('volumes', volume_name)
+            ig = self.get('initiator-groups', ig_name)
+            tg = self.get('target-groups', tg_name)
+            name = '%d_%d_%d' % (volume['index'], ig['index'], tg['index'])
+            self._next_lun += 1
+            lun_map = self.add('lun-maps', name, {
+                'vol-name': volume['name'], 'lun': self._next_lun})
+            volume['lun-mapping-list'].append(
+                [[ig['guid'], ig['name'], ig['index']],
+                 [tg['guid'], tg['name'], tg['index']], self._next_lun])
+            volume['num-of-lun-mappings'] = len(volume['lun-mapping-list'])
+            return lun_map
+
+    def unmap(self, name):
+        """
+        Remove a lun map.
+
+        :raises XMSError: If there is no such lun map.
+        """
+        with self._lock:
+            lun_map = self.remove('lun-maps', name)
+            volume = self.objects['volumes'].get(lun_map['vol-name'])
+            if volume is not None:
+                volume['lun-mapping-list'] = [
+                    mapping for mapping in volume['lun-mapping-list']
+                    if mapping[2] != lun_map['lun']]
+                volume['num-of-lun-mappings'] = len(
+                    volume['lun-mapping-list'])
+
+
+class XMSSimulator(object):
+    """
+    Serves the XMS REST API for ``XMSInventory``s over HTTP on the
+    loopback interface.
+    """
+    def __init__(self, inventory, username="admin", password="password",
+                 latency=0.0, page_size=DEFAULT_PAGE_SIZE):
+        """
+        :param XMSInventory inventory: The simulated cluster, see
+            ``add_cluster`` for more
+        :param username: The XMS user
+        :param password: Its password
+        :param float latency: Seconds to wait before answering each
+            request.
+        :param int page_size: Objects per page of bulk queries
+        """
+        self.inventory = inventory
+        self.inventories = [inventory]
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.page_size = page_size
+        self.requests = {}
+        self._errors = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        """
+        The ``host:port`` the simulator listens on.
+        """
+        return "%s:%d" % self._server.server_address
+
+    def configuration(self, **kwargs):
+        """
+        :return ArrayConfiguration: The configuration of a driver talking
+            to the simulator.
+        """
+        return ArrayConfiguration(self.username, self.password,
+                                  self.address, secure=False, **kwargs)
+
+    def add_cluster(self, inventory):
+        """
+        Manage another cluster. Once there are several, requests must name
+        their cluster like with the real XMS.
+
+        :param XMSInventory inventory: The simulated cluster
+        :return int: The index of the cluster
+        """
+        with self._lock:
+            self.inventories.append(inventory)
+            return len(self.inventories)
+
+    def _cluster(self, name):
+        """
+        :param name: The cluster named by a request, ``None`` if none was.
+        :raises XMSError: If there is no such cluster, or none is named
+            while there are several.
+        :return XMSInventory: The cluster.
+        """
+        if name is None:
+            if len(self.inventories) > 1:
+                raise XMSError(CLUSTER_ID_IS_REQUIRED)
+            return self.inventories[0]
+        for inventory in self.inventories:
+            if inventory.cluster['name'] == name:
+                return inventory
+        raise XMSError(OBJ_NOT_FOUND)
+
+    def request_count(self):
+        """
+        :return int: The number of requests answered so far.
+        """
+        with self._lock:
+            return sum(self.requests.values())
+
+    def inject_error(self, method, object_type, message=OBJ_NOT_FOUND,
+                     status_code=400):
+        """
+        Answer the next ``method`` request for ``object_type`` with an
+        error, e.g. ``obj_not_found`` or ``vol_obj_name_not_unique``.
+        """
+        with self._lock:
+            self._errors.append((method, object_type,
+                                 XMSError(message, status_code)))
+
+    def start(self):
+        """
+        Start serving in a background thread on a free port.
+        """
+        simulator = self
+
+        class Handler(_XMSRequestHandler):
+            pass
+        Handler.simulator = simulator
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="xms-simulator")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def handle(self, method, path, credentials, body):
+        """
+        Answer a request.
+
+        :param str method: The HTTP method
+        :param str path: The request path and query, e.g.
+            ``/api/json/types/volumes?name=abc``
+        :param tuple credentials: The basic authentication user and
+            password, ``None`` if none were sent.
+        :param body: The decoded JSON body, ``None`` if there was none.
+        :return tuple: The HTTP status and the JSON encodable answer.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlparse.urlsplit(path)
+        match = re.match(r'^/api/json/(v2/)?types/([\w-]+)(?:/(\d+))?$',
+                         parts.path)
+        if match is None:
+            return 404, {'message': "Unknown request " + path,
+                         'error_code': 404}
+        bulk, object_type, index = match.groups()
+        query = urlparse.parse_qs(parts.query)
+        with self._lock:
+            key = "%s %s%s" % (method, 'v2 ' if bulk else '', object_type)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            error = None
+            for injected in self._errors:
+                if injected[:2] == (method, object_type):
+                    self._errors.remove(injected)
+                    error = injected[2]
+                    break
+        try:
+            if credentials != (self.username, self.password):
+                raise XMSError("Unauthorized", 401)
+            if error is not None:
+                raise error
+            if object_type == 'clusters':
+                return self._clusters(method, index and int(index))
+            body = body or {}
+            # GET and DELETE requests name the cluster in the query, the
+            # others in the body
+            inventory = self._cluster(query.get('cluster-name', [None])[0]
+                                      if method in ('GET', 'DELETE')
+                                      else body.get('cluster-id'))
+            if bulk:
+                return 200, self._bulk(inventory, object_type, query)
+            name = query.get('name', [None])[0]
+            return self._object(inventory, method, object_type, name, body)
+        except XMSError as e:
+            return e.status_code, {'message': e.message,
+                                   'error_code': e.status_code}
+
+    def _clusters(self, method, index):
+        if method != 'GET':
+            raise XMSError("Unsupported request", 405)
+        with self._lock:
+            inventories = list(self.inventories)
+        if index is None:
+            return 200, {'clusters': [
+                {'name': inventory.cluster['name'],
+                 'href': 'http://%s/api/json/types/clusters/%d'
+                 % (self.address, i + 1)}
+                for i, inventory in enumerate(inventories)]}
+        if not 0 < index <= len(inventories):
+            raise XMSError(OBJ_NOT_FOUND)
+        content = dict(inventories[index - 1].cluster)
+        content['index'] = index
+        return 200, {'content': content}
+
+    def _bulk(self, inventory, object_type, query):
+        if query.get('full') != ['1'] or object_type != 'volumes':
+            raise XMSError("Unsupported bulk query")
+        properties = query.get('prop', [])
+        start = int(query.get('from-index', ['0'])[0])
+        with inventory._lock:
+            objects = sorted(inventory.objects[object_type].values(),
+                             key=lambda obj: obj['index'])
+        page = [dict((prop, obj.get(prop)) for prop in properties)
+                for obj in objects[start:start + self.page_size]]
+        links = [{'rel': 'self', 'href': 'http://%s/api/json/v2/types/%s'
+                  % (self.address, object_type)}]
+        if start + self.page_size < len(objects):
+            next_query = [('full', 1)] + [('prop', prop) for prop
+                                          in properties]
+            next_query.extend(('cluster-name', name) for name
+                              in query.get('cluster-name', []))
+            next_query.append(('from-index', start + self.page_size))
+            links.append({'rel': 'next', 'href':
+                          'http://%s/api/json/v2/types/%s?%s'
+                          % (self.address, object_type,
+                             urllib.urlencode(next_query))})
+        return {object_type: page, 'links': links}
+
+    def _object(self, inventory, method, object_type, name, body):
+        # Snapshots are volumes to the XMS, and kept with them
+        if object_type not in inventory.objects and object_type != 'snapshots':
+            raise XMSError(OBJ_NOT_FOUND)
+        if method == 'GET' and object_type == 'volume-folders' and name:
+            return 200, {'content': inventory.folder_content(name)}
+        if method == 'GET' and name:
+            return 200, {'content': inventory.get(object_type, name)}
+        if method == 'GET':
+            return 200, {object_type: [
+                {'name': obj['name'], 'href': 'http://%s/api/json/types/%s/%d'
+                 % (self.address, object_type, obj['index'])}
+                for obj in inventory.objects[object_type].values()]}
+        if method == 'DELETE':
+            if object_type == 'lun-maps':
+                inventory.unmap(name)
+            else:
+                inventory.remove(object_type, name)
+            return 200, None
+        if method == 'PUT' and object_type == 'volumes':
+            inventory.get(object_type, name)['vol-size'] = str(
+                _size_kb(body['vol-size']))
+            return 200, None
+        if method == 'POST':
+            if object_type == 'volumes':
+                obj = inventory.add_volume(body['vol-name'],
+                                           _size_kb(body['vol-size']),
+                                           body['parent-folder-id'])
+            elif object_type == 'snapshots':
+                obj = inventory.add_snapshot(body['ancestor-vol-id'],
+                                             body['snap-vol-name'],
+                                             body['folder-id'])
+            elif object_type == 'volume-folders':
+                obj = inventory.add_folder(
+                    body['parent-folder-id'].rstrip('/') + '/' +
+                    body['caption'])
+            elif object_type == 'lun-maps':
+                obj = inventory.map_volume(body['vol-id'], body['ig-id'],
+                                           body.get('tg-id', 'Default'))
+            elif object_type == 'initiator-groups':
+                obj = inventory.add(object_type, body['ig-name'], {})
+            elif object_type == 'initiators':
+                inventory.get('initiator-groups', body['ig-id'])
+                obj = inventory.add(object_type, body['initiator-name'], {
+                    'ig-id': body['ig-id'],
+                    'port-address': body['port-address'],
+                    'chap-authentication-initiator-password': None})
+            else:
+                raise XMSError(OBJ_NOT_FOUND)
+            return 201, {'links': [{'rel': 'self', 'href':
+                                    'http://%s/api/json/types/%s/%d'
+                                    % (self.address, object_type,
+                                       obj['index'])}]}
+        raise XMSError("Unsupported request", 405)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _XMSRequestHandler(BaseHTTPRequestHandler):
+    """
+    Hands requests to ``simulator``.
+    """
+    simulator = None
+
+    # Keep connections alive like the real XMS does.
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are written separately, without delaying the body.
+    disable_nagle_algorithm = True
+
+    def _credentials(self):
+        header = self.headers.getheader('Authorization')
+        if not header or not header.startswith('Basic '):
+            return None
+        user, _, password = base64.b64decode(header[6:]).partition(':')
+        return user, password
+
+    def _answer(self, method):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = None
+        if length:
+            body = json.loads(self.rfile.read(length))
+        status, answer = self.simulator.handle(
+            method, self.path, self._credentials(), body)
+        content = "" if answer is None else json.dumps(answer)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._answer('GET')
+
+    def do_POST(self):
+        self._answer('POST')
+
+    def do_PUT(self):
+        self._answer('PUT')
+
+    def do_DELETE(self):
+        self._answer('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SimulatedISCSIDriver(XtremIOiSCSIDriver):
+    """
+    The iSCSI side of a node without iSCSI: LUNs are mapped on the
+    simulated XMS, but no SCSI devices show up. The LUNs the node would
+    scan, remove and rescan are recorded in ``luns``.
+    """
+    def __init__(self, mgmt, compute_instance_id, initiator):
+        XtremIOiSCSIDriver.__init__(self, mgmt, compute_instance_id)
+        self._connector['initiator'] = initiator
+        self.topology = scsi.ScsiTopology(FilePath("/nonexistent"))
+        self.luns = []
+
+    def scan_lun(self, lun, wwid):
+        self.luns.append(('scan', lun, wwid))
+        return []
+
+    def remove_lun(self, lun, wwid):
+        self.luns.append(('remove', lun, wwid))
+
+    def rescan_lun(self, lun, wwid):
+        self.luns.append(('rescan', lun, wwid))
+
+
+class SimulatedNodeBlockDeviceAPI(EMCXtremIOBlockDeviceAPI):
+    """
+    The driver of a node without iSCSI or multipathing, talking to a
+    simulated XMS.
+    """
+    def _initialize_setup(self):
+        self.data = SimulatedISCSIDriver(
+            self.mgmt, self._compute_instance_id,
+            "iqn.1994-05.com.redhat:" + str(self._compute_instance_id))
+        return EMCXtremIOBlockDeviceAPI._initialize_setup(self)
+
+    def check_multipath(self):
+        return False
+
+
+def simulated_node_api(simulator, cluster_id, compute_instance_id=u"node1",
+                       **kwargs):
+    """
+    :param XMSSimulator simulator: The running simulator
+    :param cluster_id: The Flocker cluster id
+    :param compute_instance_id: The name of the node
+    :return SimulatedNodeBlockDeviceAPI: A driver talking to the
+        simulator.
+    """
+    return SimulatedNodeBlockDeviceAPI(
+        configuration=simulator.configuration(),
+        cluster_id=cluster_id, compute_instance_id=compute_instance_id,
+        allocation_unit=1, **kwargs)
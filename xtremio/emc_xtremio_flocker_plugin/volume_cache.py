@@ -0,0 +1,92 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+A cache of the state of the volumes of a cluster, so listing the volumes
+need not fetch each of them from the XMS.
+"""
+
+import threading
+import time
+
+# Seconds a volume's cached state is trusted
+DEFAULT_VOLUME_CACHE_TTL = 30
+
+
+class VolumeStateCache(object):
+    """
+    ``BlockDeviceVolume`` instances by blockdevice id. Entries are
+    replaced by every listing and by every call that changes a volume,
+    and expire ``ttl`` seconds after that, so changes made by other nodes
+    are seen within ``ttl`` seconds. Only listings read it, calls that
+    change a volume fetch its state from the XMS.
+    """
+
+    def __init__(self, ttl=DEFAULT_VOLUME_CACHE_TTL, clock=time.time):
+        """
+        :param ttl: Seconds an entry is fresh
+        :param clock: A function returning the current time in seconds
+        """
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._volumes = {}
+        self._lock = threading.Lock()
+
+    def get(self, blockdevice_id):
+        """
+        :param blockdevice_id: Volume id
+        :return: The cached ``BlockDeviceVolume``, ``None`` if unknown or
+            expired
+        """
+        with self._lock:
+            volume, written = self._volumes.get(unicode(blockdevice_id),
+                                                (None, None))
+            if volume is not None and self.clock() < written + self.ttl:
+                self.hits += 1
+                return volume
+            self.misses += 1
+            return None
+
+    def put(self, volume):
+        """
+        Write the new state of a volume through to the cache.
+
+        :param volume: A ``BlockDeviceVolume``
+        """
+        with self._lock:
+            self._volumes[unicode(volume.blockdevice_id)] = (
+                volume, self.clock())
+
+    def remove(self, blockdevice_id):
+        """
+        Forget a volume, e.g. once it has been destroyed.
+
+        :param blockdevice_id: Volume id
+        """
+        with self._lock:
+            self._volumes.pop(unicode(blockdevice_id), None)
+
+    def seed(self, volumes, listed_at):
+        """
+        Replace the cache with the volumes of a full listing. Volumes
+        written since the listing started are kept as written. Fresh
+        entries the listing found unchanged keep their age, as the
+        listing may have taken them from the cache.
+
+        :param volumes: Every ``BlockDeviceVolume`` of the cluster
+        :param listed_at: When the listing started, see ``clock``
+        """
+        with self._lock:
+            entries = {}
+            for volume in volumes:
+                blockdevice_id = unicode(volume.blockdevice_id)
+                entry = self._volumes.get(blockdevice_id)
+                if (entry is None or entry[0] != volume or
+                        entry[1] + self.ttl <= listed_at):
+                    entry = (volume, listed_at)
+                entries[blockdevice_id] = entry
+            entries.update((blockdevice_id, entry) for blockdevice_id, entry
+                           in self._volumes.items() if entry[1] >= listed_at)
+            self._volumes = entries
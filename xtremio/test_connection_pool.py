@@ -0,0 +1,148 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``emc_xtremio_flocker_plugin.connection_pool``.
+"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import httplib
+import socket
+import threading
+import time
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from emc_xtremio_flocker_plugin.connection_pool import HTTPSConnectionPool
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _Handler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0
+        self.drop_connections = False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Answers every request with an empty JSON object over kept-alive
+    connections.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active,
+                                         self.server.active)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.active -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write("{}")
+        # Close without telling the client, like an idle timeout.
+        self.close_connection = self.server.drop_connections
+
+    do_DELETE = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPSConnectionPoolTests(SynchronousTestCase):
+    """
+    Tests for ``HTTPSConnectionPool``.
+    """
+    def setUp(self):
+        self.server = _Server()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def pool(self, **kwargs):
+        pool = HTTPSConnectionPool(
+            '127.0.0.1:%d' % (self.server.server_address[1],),
+            secure=False, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_kept_alive(self):
+        """
+        Successive requests reuse one connection.
+        """
+        pool = self.pool()
+        answers = [pool.request('GET', '/api/json/types/volumes')
+                   for _ in range(5)]
+        self.assertEqual(
+            (answers[-1], self.server.connections),
+            ((200, 'OK', '{}'), 1))
+
+    def test_pool_size(self):
+        """
+        No more than ``pool_size`` requests run at once, over no more
+        than ``pool_size`` connections.
+        """
+        self.server.delay = 0.05
+        pool = self.pool(pool_size=2)
+        threads = [threading.Thread(target=pool.request,
+                                    args=('GET', '/api/json/types/volumes'))
+                   for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((self.server.max_active, self.server.connections),
+                         (2, 2))
+
+    def test_read_timeout(self):
+        """
+        A request the server does not answer within ``read_timeout``
+        fails with ``socket.timeout``.
+        """
+        self.server.delay = 1
+        pool = self.pool(read_timeout=0.1)
+        self.assertRaises(socket.timeout, pool.request,
+                          'GET', '/api/json/types/volumes')
+
+    def test_closed_connection(self):
+        """
+        A kept-alive connection closed by the server is replaced.
+        """
+        self.server.drop_connections = True
+        pool = self.pool()
+        pool.request('GET', '/api/json/types/volumes')
+        self.assertEqual(
+            (pool.request('GET', '/api/json/types/volumes'),
+             self.server.connections),
+            ((200, 'OK', '{}'), 2))
+
+    def test_closed_connection_not_resent(self):
+        """
+        A request that is not idempotent is not made again after the
+        kept-alive connection it was sent on turned out to be closed.
+        """
+        self.server.drop_connections = True
+        pool = self.pool()
+        pool.request('GET', '/api/json/types/volumes')
+        self.assertRaises((httplib.HTTPException, socket.error),
+                          pool.request, 'DELETE',
+                          '/api/json/types/volumes?name=vol1')
+        self.assertEqual(self.server.connections, 1)
@@ -0,0 +1,375 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``emc_xtremio_flocker_plugin.scsi``.
+"""
+
+from subprocess import CalledProcessError
+
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SynchronousTestCase
+
+from emc_xtremio_flocker_plugin.scsi import (
+    ScsiTopology, ScsiDevice, parse_uevent, scan_lun, remove_lun,
+    rescan_lun, wait_for_lun, multipath_device, wait_for_multipath,
+    DeviceTimeout
+)
+
+# The identifiers of volumes of two arrays
+WWID = "naa.514f0c5461400172"
+OTHER_WWID = "naa.514f0c5461400299"
+
+
+class FakeSysfs(object):
+    """
+    A directory laid out like the SCSI parts of sysfs.
+    """
+    def __init__(self, path):
+        self.root = FilePath(path)
+        self.dev = self.root.child('dev')
+        self.dev.makedirs()
+
+    def add_host(self, host):
+        scsi_host = self.root.descendant(['class', 'scsi_host',
+                                          'host%d' % (host,)])
+        scsi_host.makedirs()
+        scsi_host.child('scan').setContent("")
+        return scsi_host.child('scan')
+
+    def add_device(self, address, vendor, block=None, wwid=None):
+        name = '%d:%d:%d:%d' % address
+        device = self.root.descendant(['class', 'scsi_device', name,
+                                       'device'])
+        device.makedirs()
+        device.child('vendor').setContent(vendor + "  ")
+        if wwid is not None:
+            device.child('wwid').setContent(wwid + "\n")
+        if block is not None:
+            self.add_block(device, name, block)
+        return device
+
+    def add_block(self, device, name, block):
+        device.descendant(['block', block]).makedirs()
+        self.root.descendant(['block', block, 'device', 'scsi_device',
+                              name]).makedirs()
+        self.dev.child(block).setContent("")
+
+    def add_dm(self, dm, uuid, name, slaves):
+        path = self.root.descendant(['block', dm])
+        path.child('dm').makedirs()
+        path.descendant(['dm', 'uuid']).setContent(uuid + "\n")
+        path.descendant(['dm', 'name']).setContent(name + "\n")
+        for slave in slaves:
+            path.descendant(['slaves', slave]).makedirs()
+
+
+class ScsiTopologyTests(SynchronousTestCase):
+    """
+    Tests for ``ScsiTopology``.
+    """
+    def setUp(self):
+        self.sysfs = FakeSysfs(self.mktemp())
+        self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd",
+                              "naa.514f0c5461400172")
+        self.sysfs.add_device((2, 0, 0, 3), "ATA", "sda")
+        self.topology = ScsiTopology(self.sysfs.root)
+
+    def test_devices(self):
+        """
+        The XtremIO devices of a LUN are found, with their block device
+        and identifier.
+        """
+        self.assertEqual(
+            self.topology.devices(3),
+            [ScsiDevice((9, 0, 0, 3), "sdd", "naa.514f0c5461400172")])
+
+    def test_several_arrays(self):
+        """
+        The devices of the same LUN on several arrays and channels are
+        all found, and the SCSI hosts of their targets.
+        """
+        self.sysfs.add_device((10, 1, 0, 3), "XtremIO", "sde",
+                              "naa.514f0c5461400299")
+        self.assertEqual(
+            ([device.block for device in self.topology.devices(3)],
+             self.topology.hosts()),
+            (["sdd", "sde"], [9, 10]))
+
+    def test_in_memory(self):
+        """
+        Once read, lookups do not read sysfs again.
+        """
+        self.topology.devices(3)
+        self.sysfs.root.remove()
+        self.assertEqual(self.topology.targets(), [(9, 0, 0)])
+
+    def test_uevents(self):
+        """
+        The index is updated from the uevents of SCSI devices and disks.
+        """
+        self.topology.refresh()
+        device = self.sysfs.add_device((9, 0, 0, 4), "XtremIO")
+        self.topology.handle_uevent(parse_uevent(
+            "add@/devices/platform/host9/session1/target9:0:0/9:0:0:4/"
+            "scsi_device/9:0:0:4\0ACTION=add\0DEVPATH=/devices/platform/"
+            "host9/session1/target9:0:0/9:0:0:4/scsi_device/9:0:0:4\0"
+            "SUBSYSTEM=scsi_device\0SEQNUM=2001\0"))
+        before = self.topology.devices(4)
+        self.sysfs.add_block(device, '9:0:0:4', 'sde')
+        self.topology.handle_uevent({
+            'ACTION': 'add', 'SUBSYSTEM': 'block', 'DEVTYPE': 'disk',
+            'DEVPATH': '/devices/platform/host9/session1/target9:0:0/'
+                       '9:0:0:4/block/sde'})
+        self.assertEqual(
+            (before, self.topology.devices(4)),
+            ([ScsiDevice((9, 0, 0, 4), None, None)],
+             [ScsiDevice((9, 0, 0, 4), "sde", None)]))
+
+    def test_remove_uevent(self):
+        """
+        A removed SCSI device is dropped from the index.
+        """
+        self.topology.refresh()
+        self.topology.handle_uevent({
+            'ACTION': 'remove', 'SUBSYSTEM': 'scsi_device',
+            'DEVPATH': '/devices/platform/host9/session1/target9:0:0/'
+                       '9:0:0:3/scsi_device/9:0:0:3'})
+        self.sysfs.root.descendant(['class', 'scsi_device']).remove()
+        self.assertEqual(self.topology.devices(3), [])
+
+
+class ScanTests(SynchronousTestCase):
+    """
+    Tests for scanning, removing and rescanning single LUNs.
+    """
+    def setUp(self):
+        self.sysfs = FakeSysfs(self.mktemp())
+        self.topology = ScsiTopology(self.sysfs.root)
+        self.scans = [self.sysfs.add_host(9), self.sysfs.add_host(10),
+                      self.sysfs.add_host(2)]
+        # LUN 0 of two XtremIO targets, and a disk of another vendor
+        self.sysfs.add_device((9, 0, 0, 0), "XtremIO", "sdb")
+        self.sysfs.add_device((10, 0, 1, 0), "XtremIO", "sdc")
+        self.sysfs.add_device((2, 0, 0, 0), "ATA", "sda")
+
+    def test_scan(self):
+        """
+        The LUN is scanned for on every XtremIO target only.
+        """
+        scan_lun(self.topology, 3)
+        self.assertEqual([scan.getContent() for scan in self.scans],
+                         ["0 0 3", "0 1 3", ""])
+
+    def test_remove(self):
+        """
+        Only the devices of the LUN are removed.
+        """
+        paths = [self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd", WWID),
+                 self.sysfs.add_device((10, 0, 1, 3), "XtremIO", "sde", WWID)]
+        remove_lun(self.topology, 3, WWID)
+        self.assertEqual(
+            [path.child('delete').exists() for path in paths] +
+            [self.sysfs.root.descendant(
+                ['class', 'scsi_device', '9:0:0:0', 'device',
+                 'delete']).exists()],
+            [True, True, False])
+
+    def test_flush_before_remove(self):
+        """
+        The multipath map over the devices of the LUN is flushed before
+        any of them is removed.
+        """
+        paths = [self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd", WWID),
+                 self.sysfs.add_device((10, 0, 1, 3), "XtremIO", "sde", WWID)]
+        self.sysfs.add_dm('dm-0', 'LVM-Yx0aBc', 'vg-root', ['sda'])
+        self.sysfs.add_dm('dm-1', 'mpath-3514f0c5461400172',
+                          '3514f0c5461400172', ['sdd', 'sde'])
+        commands = []
+
+        def run(command):
+            commands.append(
+                (command, [path.child('delete').exists() for path in paths]))
+            self.sysfs.root.descendant(['block', 'dm-1']).remove()
+        remove_lun(self.topology, 3, WWID, run=run)
+        self.assertEqual(
+            (commands, [path.child('delete').exists() for path in paths]),
+            ([(["multipath", "-f", "3514f0c5461400172"], [False, False])],
+             [True, True]))
+
+    def test_flush_failed(self):
+        """
+        The devices of the LUN are kept when its multipath map could not
+        be flushed.
+        """
+        path = self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd", WWID)
+        self.sysfs.add_dm('dm-1', 'mpath-3514f0c5461400172',
+                          '3514f0c5461400172', ['sdd'])
+
+        def run(command):
+            raise CalledProcessError(1, command)
+        self.assertRaises(CalledProcessError, remove_lun, self.topology, 3,
+                          WWID, run=run)
+        self.assertFalse(path.child('delete').exists())
+
+    def lingering_map(self):
+        """
+        Add the devices of a LUN, under a multipath map that goes away a
+        second after being flushed.
+
+        :return: The sysfs directories of the devices.
+        """
+        self.now = 0
+        self.sysfs.add_dm('dm-1', 'mpath-3514f0c5461400172',
+                          '3514f0c5461400172', ['sdd', 'sde'])
+        return [self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd", WWID),
+                self.sysfs.add_device((10, 0, 1, 3), "XtremIO", "sde", WWID)]
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.now == 1:
+            self.sysfs.root.descendant(['block', 'dm-1']).remove()
+
+    def remove(self, timeout):
+        remove_lun(self.topology, 3, WWID, run=lambda command: None,
+                   timeout=timeout, interval=0.5, sleep=self.sleep,
+                   clock=lambda: self.now)
+
+    def test_wait_for_flushed_map(self):
+        """
+        The devices of the LUN are removed once the flushed multipath
+        map is gone.
+        """
+        paths = self.lingering_map()
+        self.remove(timeout=10)
+        self.assertEqual(
+            (self.now, [path.child('delete').exists() for path in paths]),
+            (1, [True, True]))
+
+    def test_flushed_map_timeout(self):
+        """
+        ``DeviceTimeout`` is raised, and the devices are kept, when the
+        flushed multipath map does not go away in time.
+        """
+        paths = self.lingering_map()
+        self.assertRaises(DeviceTimeout, self.remove, timeout=0.5)
+        self.assertEqual([path.child('delete').exists() for path in paths],
+                         [False, False])
+        self.assertEqual([path.child('delete').exists() for path in paths],
+                         [False, False])
+
+    def test_rescan(self):
+        """
+        The capacity of the devices of the LUN is read again.
+        """
+        path = self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd", WWID)
+        rescan_lun(self.topology, 3, WWID)
+        self.assertEqual(path.child('rescan').getContent(), "1")
+
+    def test_shared_lun(self):
+        """
+        Of two arrays using the same LUN number, only the devices of the
+        volume of the given identifier are removed or rescanned.
+        """
+        path = self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd", WWID)
+        other = self.sysfs.add_device((10, 0, 1, 3), "XtremIO", "sde",
+                                      OTHER_WWID.upper())
+        self.sysfs.add_dm('dm-1', 'mpath-3514f0c5461400299',
+                          '3514f0c5461400299', ['sde'])
+        commands = []
+        rescan_lun(self.topology, 3, WWID)
+        remove_lun(self.topology, 3, WWID, run=commands.append)
+        self.assertEqual(
+            ([(p.child('rescan').exists(), p.child('delete').exists())
+              for p in (path, other)], commands),
+            ([(True, True), (False, False)], []))
+
+
+class WaitForLunTests(SynchronousTestCase):
+    """
+    Tests for ``wait_for_lun``.
+    """
+    def setUp(self):
+        self.sysfs = FakeSysfs(self.mktemp())
+        self.topology = ScsiTopology(self.sysfs.root)
+        self.now = 0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if len(self.sleeps) == 2:
+            self.sysfs.add_device((9, 0, 0, 3), "XtremIO", "sdd", WWID)
+
+    def wait(self, **kwargs):
+        return wait_for_lun(self.topology, 3, WWID, self.sysfs.dev,
+                            interval=1, sleep=self.sleep,
+                            clock=lambda: self.now, **kwargs)
+
+    def test_appears(self):
+        """
+        The block devices of the LUN are returned once they appear.
+        """
+        self.assertEqual((self.wait(), self.sleeps), (["sdd"], [1, 1]))
+
+    def test_other_array(self):
+        """
+        The devices of the same LUN number on another array are not
+        taken for those of the volume.
+        """
+        self.sysfs.add_device((10, 0, 1, 3), "XtremIO", "sde", OTHER_WWID)
+        self.assertEqual((self.wait(), self.sleeps), (["sdd"], [1, 1]))
+
+    def test_timeout(self):
+        """
+        ``DeviceTimeout`` is raised when the LUN does not appear in time.
+        """
+        self.assertRaises(DeviceTimeout, self.wait, timeout=1)
+
+
+class MultipathTests(SynchronousTestCase):
+    """
+    Tests for ``multipath_device`` and ``wait_for_multipath``.
+    """
+    def setUp(self):
+        self.sysfs = FakeSysfs(self.mktemp())
+        self.topology = ScsiTopology(self.sysfs.root)
+        self.mapper = self.sysfs.dev.child('mapper')
+        self.mapper.makedirs()
+        # An LVM volume over another disk
+        self.sysfs.add_dm('dm-0', 'LVM-Yx0aBc', 'vg-root', ['sda'])
+
+    def test_map(self):
+        """
+        The multipath map over any of the paths is found.
+        """
+        self.sysfs.add_dm('dm-1', 'mpath-3514f0c5461400172',
+                          '3514f0c5461400172', ['sdd', 'sde'])
+        self.assertEqual(
+            (multipath_device(self.topology, ['sde']),
+             multipath_device(self.topology, ['sda'])),
+            ('3514f0c5461400172', None))
+
+    def test_wait(self):
+        """
+        ``wait_for_multipath`` returns the device node of the map once
+        multipathd set it up.
+        """
+        self.sysfs.add_dm('dm-1', 'mpath-3514f0c5461400172',
+                          '3514f0c5461400172', ['sdd'])
+        self.mapper.child('3514f0c5461400172').setContent("")
+        self.assertEqual(
+            wait_for_multipath(self.topology, ['sdd'], self.mapper),
+            self.mapper.child('3514f0c5461400172').path)
+
+    def test_timeout(self):
+        """
+        ``DeviceTimeout`` is raised when there is no map in time.
+        """
+        now = [0]
+
+        def sleep(seconds):
+            now[0] += seconds
+        self.assertRaises(DeviceTimeout, wait_for_multipath, self.topology,
+                          ['sdd'], self.mapper, timeout=1, interval=1,
+                          sleep=sleep, clock=lambda: now[0])
@@ -0,0 +1,406 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``emc_xtremio_flocker_plugin.simulator``, and for the driver
+running against it.
+"""
+
+from uuid import uuid4
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from flocker.node.agents.blockdevice import (
+    AlreadyAttachedVolume, UnattachedVolume, UnknownVolume
+)
+
+from emc_xtremio_flocker_plugin.emc_xtremio_blockdevice import (
+    XtremIOMgmt, ArrayConfiguration, DeviceExceptionObjNotFound,
+    InvalidVolumeMetadata, VolumeBackendAPIException
+)
+from emc_xtremio_flocker_plugin.simulator import (
+    XMSInventory, XMSSimulator, simulated_node_api, VOL_OBJ_NAME_NOT_UNIQUE
+)
+
+GiB = 1024 * 1024 * 1024
+TiB = 1024 * GiB
+
+
+class XMSSimulatorTests(SynchronousTestCase):
+    """
+    Tests for ``XMSSimulator``.
+    """
+    def setUp(self):
+        self.inventory = XMSInventory()
+        self.inventory.add_folder('/Volume/cluster')
+        self.simulator = XMSSimulator(self.inventory, page_size=2)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.mgmt = XtremIOMgmt(self.simulator.configuration())
+        self.addCleanup(self.mgmt.pool.close)
+
+    def create_volume(self, name):
+        self.mgmt.request('volumes', 'POST', {
+            'vol-name': name, 'vol-size': '8m',
+            'parent-folder-id': '/Volume/cluster'})
+
+    def test_unauthorized(self):
+        """
+        Requests with other credentials are refused.
+        """
+        mgmt = XtremIOMgmt(ArrayConfiguration(
+            'admin', 'forged', self.simulator.address, secure=False))
+        self.addCleanup(mgmt.pool.close)
+        self.assertRaises(VolumeBackendAPIException, mgmt.request,
+                          'clusters', idx=1)
+
+    def test_create_volume(self):
+        """
+        A created volume can be fetched by name and is listed in its
+        folder.
+        """
+        self.create_volume('vol1')
+        volume = self.mgmt.request('volumes', name='vol1')['content']
+        folder = self.mgmt.request('volume-folders',
+                                   name='/Volume/cluster')['content']
+        self.assertEqual(
+            (volume['vol-size'], volume['num-of-lun-mappings'],
+             [item[1] for item in folder['direct-list']]),
+            ('8192', 0, ['vol1']))
+
+    def test_obj_not_found(self):
+        """
+        Unknown objects are answered with the XMS's ``obj_not_found``.
+        """
+        self.assertRaises(DeviceExceptionObjNotFound, self.mgmt.request,
+                          'volumes', name='vol1')
+
+    def test_name_not_unique(self):
+        """
+        A second volume of the same name is refused.
+        """
+        self.create_volume('vol1')
+        self.assertRaises(InvalidVolumeMetadata, self.create_volume, 'vol1')
+
+    def test_injected_error(self):
+        """
+        An injected error answers the next matching request only.
+        """
+        self.simulator.inject_error('POST', 'volumes',
+                                    VOL_OBJ_NAME_NOT_UNIQUE)
+        self.assertRaises(InvalidVolumeMetadata, self.create_volume, 'vol1')
+        self.create_volume('vol1')
+
+    def test_lun_maps(self):
+        """
+        Mapping a volume gives it a LUN, and the lun map is named after
+        the indexes of the volume, initiator group and target group.
+        """
+        self.create_volume('vol1')
+        self.mgmt.request('initiator-groups', 'POST', {'ig-name': 'node1'})
+        self.mgmt.request('lun-maps', 'POST', {'ig-id': 'node1',
+                                               'vol-id': 'vol1'})
+        mapping = self.mgmt.request('volumes',
+                                    name='vol1')['content']['lun-mapping-list']
+        volume = self.inventory.get('volumes', 'vol1')
+        ig = self.inventory.get('initiator-groups', 'node1')
+        self.mgmt.request('lun-maps', 'DELETE', name='%d_%d_1' % (
+            volume['index'], ig['index']))
+        self.assertEqual(
+            ([(m[0][1], m[2]) for m in mapping],
+             volume['num-of-lun-mappings']),
+            ([('node1', 1)], 0))
+
+    def test_bulk_pages(self):
+        """
+        Bulk queries are answered with pages of the requested properties.
+        """
+        for name in ('vol1', 'vol2', 'vol3'):
+            self.create_volume(name)
+        before = self.simulator.request_count()
+        volumes = self.mgmt.request_full('volumes', ['name', 'vol-size'])
+        self.assertEqual(
+            (volumes, self.simulator.request_count() - before),
+            ([{'name': name, 'vol-size': '8192'}
+              for name in ('vol1', 'vol2', 'vol3')], 2))
+
+
+class SimulatedDriverTests(SynchronousTestCase):
+    """
+    Tests for ``EMCXtremIOBlockDeviceAPI`` against the simulator.
+    """
+    def setUp(self):
+        self.inventory = XMSInventory()
+        self.simulator = XMSSimulator(self.inventory)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.api = simulated_node_api(self.simulator, uuid4())
+        self.addCleanup(self.api.mgmt.pool.close)
+
+    def test_attach_detach(self):
+        """
+        An attached volume is listed as attached to the node, and no
+        longer once detached.
+        """
+        volume = self.api.create_volume(uuid4(), GiB)
+        self.api.attach_volume(volume.blockdevice_id, u"node1")
+        attached = [v.attached_to for v in self.api.list_volumes()]
+        self.api.detach_volume(volume.blockdevice_id)
+        self.assertEqual(
+            (attached, [v.attached_to for v in self.api.list_volumes()]),
+            ([u"node1"], [None]))
+
+    def test_detach_requests(self):
+        """
+        Detaching a volume whose state is cached fetches its LUN and
+        deletes the lun map, once the indexes are known.
+        """
+        first = self.api.create_volume(uuid4(), GiB)
+        second = self.api.create_volume(uuid4(), GiB)
+        for volume in (first, second):
+            self.api.attach_volume(volume.blockdevice_id, u"node1")
+        self.api.detach_volume(first.blockdevice_id)
+        before = self.simulator.requests.copy()
+        self.api.detach_volume(second.blockdevice_id)
+        self.assertEqual(
+            dict((key, count - before.get(key, 0)) for key, count
+                 in self.simulator.requests.items()
+                 if count != before.get(key, 0)),
+            {'GET volumes': 1, 'DELETE lun-maps': 1})
+
+    def test_attached_elsewhere(self):
+        """
+        Attaching a volume another node attached since its state was
+        cached raises ``AlreadyAttachedVolume`` without mapping it again.
+        """
+        volume = self.api.create_volume(uuid4(), GiB)
+        other = simulated_node_api(self.simulator, self.api._cluster_id,
+                                   u"node2")
+        self.addCleanup(other.mgmt.pool.close)
+        other.attach_volume(volume.blockdevice_id, u"node2")
+        self.assertRaises(AlreadyAttachedVolume, self.api.attach_volume,
+                          volume.blockdevice_id, u"node1")
+        self.assertEqual(len(self.inventory.objects['lun-maps']), 1)
+
+    def test_detached_elsewhere(self):
+        """
+        Detaching a volume unmapped on the XMS since its state was cached
+        raises ``UnattachedVolume``.
+        """
+        volume = self.api.create_volume(uuid4(), GiB)
+        self.api.attach_volume(volume.blockdevice_id, u"node1")
+        self.api.data.destroy_lun_map(volume.blockdevice_id, u"node1")
+        self.assertRaises(UnattachedVolume, self.api.detach_volume,
+                          volume.blockdevice_id)
+
+    def test_listing_from_cache(self):
+        """
+        Without bulk queries, volumes whose cached state is fresh are
+        listed without fetching them, until their entry expires.
+        """
+        now = [1000]
+        self.api.volume_cache.clock = lambda: now[0]
+        self.api._bulk_listing = False
+        volume = self.api.create_volume(uuid4(), GiB)
+        counts = []
+        for _ in range(3):
+            before = self.simulator.requests.get('GET volumes', 0)
+            listed = self.api.list_volumes()
+            counts.append(self.simulator.requests.get('GET volumes', 0)
+                          - before)
+            now[0] += self.api.volume_cache.ttl // 2 + 1
+        self.assertEqual((listed, counts), ([volume], [0, 0, 1]))
+
+    def bulk_queries(self, error, status_code):
+        """
+        List the volumes twice, the first bulk query being answered with
+        an error.
+
+        :return: The volumes listed each time, and the number of bulk
+            queries answered without error.
+        """
+        volume = self.api.create_volume(uuid4(), GiB)
+        self.simulator.inject_error('GET', 'volumes', error, status_code)
+        listed = (self.api.list_volumes(), self.api.list_volumes())
+        before = self.simulator.requests.get('GET v2 volumes', 0)
+        self.api.list_volumes()
+        return (listed, self.simulator.requests.get('GET v2 volumes', 0)
+                - before), volume
+
+    def test_bulk_query_failed(self):
+        """
+        Volumes are listed one by one when a bulk query fails, and with
+        bulk queries again on the next listing.
+        """
+        result, volume = self.bulk_queries("Internal error", 500)
+        self.assertEqual(result, (([volume], [volume]), 1))
+
+    def test_bulk_query_unsupported(self):
+        """
+        Volumes are always listed one by one once the XMS refused a bulk
+        query.
+        """
+        result, volume = self.bulk_queries("Unsupported bulk query", 400)
+        self.assertEqual(result, (([volume], [volume]), 0))
+
+    def test_create_without_folder(self):
+        """
+        The volume folder is created again when it was removed since the
+        driver started.
+        """
+        self.inventory.remove('volume-folders', XtremIOMgmt.BASE_PATH +
+                              str(self.api._cluster_id))
+        volume = self.api.create_volume(uuid4(), GiB)
+        self.assertEqual(self.api.list_volumes(), [volume])
+
+    def test_unknown_volume(self):
+        """
+        Attaching an unknown volume raises ``UnknownVolume``.
+        """
+        self.assertRaises(UnknownVolume, self.api.attach_volume,
+                          u"unknown", u"node1")
+
+    def test_clone(self):
+        """
+        A clone is a snapshot of the cloned volume in the cluster's volume
+        folder, of its size and named after its dataset, created with a
+        single request once the cloned volume's state is fetched.
+        """
+        source = self.api.create_volume(uuid4(), GiB)
+        self.api.attach_volume(source.blockdevice_id, u"node1")
+        dataset_id = uuid4()
+        before = self.simulator.request_count()
+        clone = self.api.clone_volume(source.blockdevice_id, dataset_id)
+        snapshot = self.inventory.get('volumes', clone.blockdevice_id)
+        self.assertEqual(
+            (clone, self.simulator.request_count() - before,
+             snapshot['ancestor-vol-id'][1], snapshot['parent-folder-id'],
+             set(self.api.list_volumes())),
+            (source.set(attached_to=None, dataset_id=dataset_id,
+                        blockdevice_id=u"block-%s" % (dataset_id,)), 2,
+             source.blockdevice_id,
+             XtremIOMgmt.BASE_PATH + str(self.api._cluster_id),
+             {source.set(attached_to=u"node1"), clone}))
+
+    def test_clone_without_folder(self):
+        """
+        The volume folder is created again when it was removed since the
+        driver started.
+        """
+        source = self.api.create_volume(uuid4(), GiB)
+        self.inventory.get('volumes', source.blockdevice_id)[
+            'parent-folder-id'] = '/Volume/other'
+        self.inventory.remove('volume-folders', XtremIOMgmt.BASE_PATH +
+                              str(self.api._cluster_id))
+        clone = self.api.clone_volume(source.blockdevice_id, uuid4())
+        self.assertEqual(self.api.list_volumes(), [clone])
+
+    def test_clone_unknown_volume(self):
+        """
+        Cloning a volume destroyed since its state was cached raises
+        ``UnknownVolume``.
+        """
+        source = self.api.create_volume(uuid4(), GiB)
+        self.inventory.remove('volumes', source.blockdevice_id)
+        self.assertRaises(UnknownVolume, self.api.clone_volume,
+                          source.blockdevice_id, uuid4())
+
+
+class MultiClusterTests(SynchronousTestCase):
+    """
+    Tests for ``EMCXtremIOBlockDeviceAPI`` against a simulated XMS managing
+    several clusters.
+    """
+    def setUp(self):
+        # xbrick1 has more free physical capacity, xbrick2 holds more
+        # data once reduced
+        self.xbrick1 = XMSInventory(name='xbrick1', capacity_kb=TiB // 1024)
+        self.xbrick2 = XMSInventory(name='xbrick2', capacity_kb=TiB // 1024,
+                                    data_reduction_ratio=3.0)
+        self.xbrick2.cluster['ud-ssd-space-in-use'] = str(TiB // 2048)
+        self.simulator = XMSSimulator(self.xbrick1)
+        self.simulator.add_cluster(self.xbrick2)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.cluster_id = uuid4()
+        self.api = self.node_api()
+
+    def node_api(self):
+        api = simulated_node_api(self.simulator, self.cluster_id)
+        self.addCleanup(api.mgmt.pool.close)
+        return api
+
+    def test_setup(self):
+        """
+        The volume folder and the node's initiator group are created on
+        each cluster.
+        """
+        folder = XtremIOMgmt.BASE_PATH + str(self.cluster_id)
+        self.assertEqual(
+            [(folder in xbrick.objects['volume-folders'],
+              u"node1" in xbrick.objects['initiator-groups'])
+             for xbrick in (self.xbrick1, self.xbrick2)],
+            [(True, True), (True, True)])
+
+    def test_placement(self):
+        """
+        A volume is created on the cluster with the most free physical
+        capacity times data reduction ratio.
+        """
+        volume = self.api.create_volume(uuid4(), GiB)
+        self.assertEqual(
+            (volume.blockdevice_id in self.xbrick1.objects['volumes'],
+             volume.blockdevice_id in self.xbrick2.objects['volumes']),
+            (False, True))
+
+    def test_routing(self):
+        """
+        A node that did not create a volume finds its cluster, and maps
+        and unmaps it there.
+        """
+        volume = self.api.create_volume(uuid4(), GiB)
+        api = self.node_api()
+        api.attach_volume(volume.blockdevice_id, u"node1")
+        lun_maps = list(self.xbrick2.objects['lun-maps'])
+        attached = api.list_volumes()
+        api.detach_volume(volume.blockdevice_id)
+        api.destroy_volume(volume.blockdevice_id)
+        self.assertEqual(
+            (len(lun_maps), attached, self.api.list_volumes()),
+            (1, [volume.set(attached_to=u"node1")], []))
+
+    def test_same_lun(self):
+        """
+        Volumes of two clusters mapped with the same LUN number are
+        scanned, resized and removed by their own identifiers.
+        """
+        first = self.api.create_volume(uuid4(), GiB)
+        self.xbrick2.cluster['ud-ssd-space-in-use'] = self.xbrick2.cluster[
+            'ud-ssd-space']
+        second = self.api.create_volume(uuid4(), GiB)
+        for volume in (first, second):
+            self.api.attach_volume(volume.blockdevice_id, u"node1")
+        luns = [lun_map['lun'] for xbrick in (self.xbrick1, self.xbrick2)
+                for lun_map in xbrick.objects['lun-maps'].values()]
+        self.api.resize_volume(second.blockdevice_id, 2 * GiB)
+        self.api.detach_volume(first.blockdevice_id)
+        wwids = [u"naa." + xbrick.get('volumes', volume.blockdevice_id)[
+            'naa-name'] for xbrick, volume in ((self.xbrick2, first),
+                                               (self.xbrick1, second))]
+        self.assertEqual(
+            (luns, self.api.data.luns),
+            ([1, 1], [('scan', 1, wwids[0]), ('scan', 1, wwids[1]),
+                      ('rescan', 1, wwids[1]), ('remove', 1, wwids[0])]))
+
+    def test_list_volumes(self):
+        """
+        The volumes of every cluster are listed.
+        """
+        first = self.api.create_volume(uuid4(), GiB)
+        self.xbrick2.cluster['ud-ssd-space-in-use'] = self.xbrick2.cluster[
+            'ud-ssd-space']
+        second = self.api.create_volume(uuid4(), GiB)
+        self.assertEqual(
+            (set(self.api.list_volumes()),
+             second.blockdevice_id in self.xbrick1.objects['volumes']),
+            (set([first, second]), True))
@@ -0,0 +1,86 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``emc_xtremio_flocker_plugin.volume_cache``.
+"""
+
+from uuid import uuid4
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from flocker.node.agents.blockdevice import BlockDeviceVolume
+
+from emc_xtremio_flocker_plugin.volume_cache import VolumeStateCache
+
+
+def volume(blockdevice_id, attached_to=None):
+    return BlockDeviceVolume(blockdevice_id=blockdevice_id, size=1048576,
+                             attached_to=attached_to, dataset_id=uuid4())
+
+
+class VolumeStateCacheTests(SynchronousTestCase):
+    """
+    Tests for ``VolumeStateCache``.
+    """
+    def setUp(self):
+        self.now = 100
+        self.cache = VolumeStateCache(ttl=30, clock=lambda: self.now)
+
+    def test_hits_and_misses(self):
+        """
+        A volume written to the cache is returned until it expires, and
+        lookups are counted.
+        """
+        vol1 = volume(u"vol1")
+        self.cache.put(vol1)
+        fresh = self.cache.get(u"vol1")
+        unknown = self.cache.get(u"vol2")
+        self.now += 30
+        expired = self.cache.get(u"vol1")
+        self.assertEqual(
+            (fresh, unknown, expired, self.cache.hits, self.cache.misses),
+            (vol1, None, None, 1, 2))
+
+    def test_remove(self):
+        """
+        A removed volume is no longer returned.
+        """
+        self.cache.put(volume(u"vol1"))
+        self.cache.remove(u"vol1")
+        self.assertIdentical(self.cache.get(u"vol1"), None)
+
+    def test_seed(self):
+        """
+        A listing replaces the cached volumes, except those written since
+        it started.
+        """
+        self.cache.put(volume(u"gone"))
+        self.now += 1
+        listed_at = self.now
+        self.now += 1
+        attached = volume(u"vol2", attached_to=u"node1")
+        self.cache.put(attached)
+        vol1 = volume(u"vol1")
+        self.cache.seed([vol1, volume(u"vol2")], listed_at)
+        self.assertEqual(
+            [self.cache.get(blockdevice_id)
+             for blockdevice_id in (u"vol1", u"vol2", u"gone")],
+            [vol1, attached, None])
+
+    def test_seed_keeps_age(self):
+        """
+        A fresh entry a listing finds unchanged still expires as written,
+        changed ones are replaced.
+        """
+        vol1, vol2 = volume(u"vol1"), volume(u"vol2")
+        self.cache.put(vol1)
+        self.cache.put(vol2)
+        self.now += 20
+        attached = vol2.set(attached_to=u"node1")
+        self.cache.seed([vol1, attached], self.now)
+        self.now += 10
+        self.assertEqual(
+            [self.cache.get(blockdevice_id)
+             for blockdevice_id in (u"vol1", u"vol2")],
+            [None, attached])
@@ -0,0 +1,79 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``emc_xtremio_flocker_plugin.emc_xtremio_blockdevice.XtremIOiSCSIDriver``.
+"""
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from flocker.node.agents.blockdevice import UnknownVolume
+
+from emc_xtremio_flocker_plugin.emc_xtremio_blockdevice import (
+    XtremIOiSCSIDriver, DeviceExceptionObjNotFound
+)
+
+
+class FakeMgmt(object):
+    """
+    Answers ``XtremIOMgmt.request`` from a ``dict`` of objects by type and
+    name, and records the requests.
+    """
+    def __init__(self, objects):
+        self.objects = objects
+        self.requests = []
+
+    def request(self, object_type='volumes', request_typ='GET', data=None,
+                name=None, idx=None, cluster=None):
+        self.requests.append((request_typ, object_type, name))
+        objects = self.objects.get(object_type, {})
+        if name not in objects:
+            raise DeviceExceptionObjNotFound(name)
+        if request_typ == 'DELETE':
+            del objects[name]
+            return {}
+        return {'content': objects[name]}
+
+
+class DestroyLunMapTests(SynchronousTestCase):
+    """
+    Tests for ``XtremIOiSCSIDriver.destroy_lun_map``.
+    """
+    def setUp(self):
+        self.mgmt = FakeMgmt({
+            'volumes': {'vol1': {'index': 11}, 'vol2': {'index': 12}},
+            'initiator-groups': {'node1': {'index': 2}},
+            'target-groups': {'Default': {'index': 1}},
+            'lun-maps': {'11_2_1': {}, '12_2_1': {}},
+        })
+        self.driver = XtremIOiSCSIDriver(self.mgmt, 'node1')
+
+    def test_cached(self):
+        """
+        Once the indexes are known, destroying a lun map of a volume whose
+        details were seen is a single request.
+        """
+        self.driver.destroy_lun_map('vol1', 'node1')
+        self.driver.cache_volume('vol2', self.mgmt.objects['volumes']['vol2'])
+        self.mgmt.requests = []
+        self.driver.destroy_lun_map('vol2', 'node1')
+        self.assertEqual(
+            (self.mgmt.requests, self.mgmt.objects['lun-maps']),
+            ([('DELETE', 'lun-maps', '12_2_1')], {}))
+
+    def test_outdated(self):
+        """
+        A cached index that no longer names the lun map is looked up again.
+        """
+        self.driver.destroy_lun_map('vol1', 'node1')
+        self.mgmt.objects['initiator-groups']['node1'] = {'index': 5}
+        self.mgmt.objects['lun-maps'] = {'12_5_1': {}}
+        self.driver.destroy_lun_map('vol2', 'node1')
+        self.assertEqual(self.mgmt.objects['lun-maps'], {})
+
+    def test_unknown(self):
+        """
+        ``UnknownVolume`` is raised when the lun map does not exist.
+        """
+        self.assertRaises(UnknownVolume, self.driver.destroy_lun_map,
+                          u'vol3', 'node1')
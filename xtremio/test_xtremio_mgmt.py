@@ -0,0 +1,71 @@
+# Copyright 2015 EMC Corporation
+# See LICENSE file for details.
+
+"""
+Tests for ``emc_xtremio_flocker_plugin.emc_xtremio_blockdevice.XtremIOMgmt``.
+"""
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from emc_xtremio_flocker_plugin.emc_xtremio_blockdevice import (
+    XtremIOMgmt, ArrayConfiguration, VolumeBackendAPIException
+)
+
+
+class RequestFullTests(SynchronousTestCase):
+    """
+    Tests for ``XtremIOMgmt.request_full``.
+    """
+    def setUp(self):
+        self.mgmt = XtremIOMgmt(ArrayConfiguration('admin', 'secret', 'xms'))
+        self.pages = {
+            '/api/json/v2/types/volumes?full=1&prop=name&prop=vol-size': {
+                'volumes': [{'name': 'a', 'vol-size': '1024'}],
+                'links': [{'rel': 'next', 'href': 'https://xms/api/json/v2/'
+                           'types/volumes?full=1&prop=name&prop=vol-size'
+                           '&from-index=1'}]},
+            '/api/json/v2/types/volumes?full=1&prop=name&prop=vol-size'
+            '&from-index=1': {
+                'volumes': [{'name': 'b', 'vol-size': '2048'}],
+                'links': [{'rel': 'self', 'href': 'https://xms/api/json/v2/'
+                           'types/volumes'}]},
+        }
+        self.urls = []
+
+        def send(request_typ, url, body, object_type, key):
+            self.urls.append((request_typ, url))
+            return self.pages[url]
+        self.patch(self.mgmt, '_send', send)
+
+    def test_pages(self):
+        """
+        The objects of every page are returned, one request per page.
+        """
+        self.assertEqual(
+            (self.mgmt.request_full('volumes', ['name', 'vol-size']),
+             len(self.urls)),
+            ([{'name': 'a', 'vol-size': '1024'},
+              {'name': 'b', 'vol-size': '2048'}], 2))
+
+
+class SendTests(SynchronousTestCase):
+    """
+    Tests for the error handling of ``XtremIOMgmt.request``.
+    """
+    def setUp(self):
+        self.mgmt = XtremIOMgmt(ArrayConfiguration('admin', 'secret', 'xms'))
+
+    def answer(self, status, reason, body):
+        self.patch(self.mgmt.pool, 'request',
+                   lambda method, path, body_, headers:
+                   (status, reason, body))
+
+    def test_error_not_json(self):
+        """
+        An error answer that is not JSON raises
+        ``VolumeBackendAPIException`` carrying the body.
+        """
+        self.answer(400, 'Bad Request', '<html>Bad Request</html>')
+        error = self.assertRaises(VolumeBackendAPIException,
+                                  self.mgmt.request, 'volumes')
+        self.assertIn('<html>Bad Request</html>', str(error))